@@ -8,6 +8,12 @@ const courseSchema = new mongoose.Schema({
   eligibility: String,
 });
 
+// Shape written by crawler/migrate.py: [{ name: "BTech", required: "10+2 with PCM" }]
+const eligibilitySchema = new mongoose.Schema({
+  name: String,
+  required: { type: String },
+}, { _id: false });
+
 const placementSchema = new mongoose.Schema({
   average_salary: Number,
   highest_salary: Number,
@@ -40,18 +46,7 @@ const institutionSchema = new mongoose.Schema({
   },
 
   courses_offered: [courseSchema],
-  eligibility_criteria: {
-    BTech: String,
-    MBA: String,
-    MBBS: String,
-    BBA: String,
-    BCA: String,
-    MTech: String,
-    LLB: String,
-    BSc: String,
-    MSc: String,
-    BCom: String,
-  },
+  eligibility_criteria: [eligibilitySchema],
 
   acceptance_exams: [String],
   top_recruiters: [String],
@@ -59,10 +54,18 @@ const institutionSchema = new mongoose.Schema({
   placements: placementSchema,
 
   image_url: String,
+  // Written by crawler/image_updater.py alongside a resized image_url
+  image_thumb_url: String,
+  image_source_url: String,
   rating: Number,
   field_taught: [String],
 
+  // Written by crawler/lead_counters.py from recent applications
+  demand: Number,
   score: Number,
+
+  // Prefix terms written by crawler/search_index.py; queried, never returned
+  search_terms: { type: [String], select: false },
 }, { timestamps: true });
 
 export default mongoose.model("Institution", institutionSchema);
@@ -0,0 +1,123 @@
+import argparse
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import zstandard
+
+DEFAULT_ROOT = 'archive'
+
+
+# Content-addressed store of fetched pages: zstd-compressed HTML under objects/<sha256[:2]>/<sha256>.zst,
+# plus a SQLite index of every (url, hash, fetch time)
+class PageArchive:
+    def __init__(self, root=DEFAULT_ROOT, level=3):
+        self.root = root
+        self.level = level
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(root, 'index.sqlite3'), check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS pages (url TEXT NOT NULL, hash TEXT NOT NULL, fetched_at REAL NOT NULL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS pages_url ON pages (url, fetched_at)')
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def _path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], digest + '.zst')
+
+    def put(self, url, html, fetched_at=None):
+        raw = html.encode('utf-8') if isinstance(html, str) else html
+        digest = hashlib.sha256(raw).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # A unique temp file per call: threads storing the same page at once must not share one
+            fd, tmp = tempfile.mkstemp(prefix=f'.{digest}.', suffix='.tmp', dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(zstandard.ZstdCompressor(level=self.level).compress(raw))
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        with self._lock:
+            self._db.execute('INSERT INTO pages (url, hash, fetched_at) VALUES (?, ?, ?)',
+                             (url, digest, fetched_at if fetched_at is not None else time.time()))
+            self._db.commit()
+        return digest
+
+    def get(self, digest):
+        return read_object(self.root, digest)
+
+    def latest(self, url):
+        """Return ``(hash, fetched_at)`` of the most recent fetch of ``url``, or ``None``."""
+        return self._db.execute('SELECT hash, fetched_at FROM pages WHERE url = ? ORDER BY fetched_at DESC LIMIT 1',
+                                (url,)).fetchone()
+
+    def latest_pages(self):
+        """Yield ``(url, hash, fetched_at)`` for the most recent fetch of every URL."""
+        yield from self._db.execute(
+            'SELECT url, hash, MAX(fetched_at) FROM pages GROUP BY url ORDER BY url')
+
+    def counts(self):
+        """Return ``(urls, fetches, distinct_pages)``."""
+        return self._db.execute('SELECT COUNT(DISTINCT url), COUNT(*), COUNT(DISTINCT hash) FROM pages').fetchone()
+
+    def close(self):
+        self._db.close()
+
+
+def read_object(root, digest):
+    with open(os.path.join(root, 'objects', digest[:2], digest + '.zst'), 'rb') as f:
+        return zstandard.ZstdDecompressor().decompress(f.read()).decode('utf-8')
+
+
+def _reparse_one(job):
+    from fetcher import parse_with_embedded
+
+    root, url, digest, fetched_at = job
+    try:
+        data = parse_with_embedded(read_object(root, digest))
+    except Exception as e:
+        print(f"Error re-parsing {url} ({digest}): {e}")
+        return None
+    data['url'] = url
+    return data
+
+
+# Re-run extraction over the latest archived copy of every URL across all cores
+def reparse(root=DEFAULT_ROOT, workers=None, chunksize=32):
+    archive = PageArchive(root)
+    jobs = [(root, url, digest, fetched_at) for url, digest, fetched_at in archive.latest_pages()]
+    archive.close()
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = [data for data in executor.map(_reparse_one, jobs, chunksize=chunksize) if data]
+    elapsed = time.perf_counter() - started
+    print(f"Re-parsed {len(results)}/{len(jobs)} archived pages in {elapsed:.1f}s")
+    return results
+
+
+if __name__ == '__main__':
+    from main import save_to_json
+
+    parser = argparse.ArgumentParser(description='Raw page archive')
+    parser.add_argument('--root', default=DEFAULT_ROOT)
+    commands = parser.add_subparsers(dest='command', required=True)
+    reparse_cmd = commands.add_parser('reparse', help='re-run extraction over every archived page')
+    reparse_cmd.add_argument('--workers', type=int, default=None, help='processes (default: all cores)')
+    reparse_cmd.add_argument('--output', default='institution_data.json')
+    commands.add_parser('stats', help='show archive size')
+    args = parser.parse_args()
+
+    if args.command == 'reparse':
+        save_to_json(reparse(args.root, args.workers), args.output)
+    else:
+        archive = PageArchive(args.root)
+        urls, fetches, distinct = archive.counts()
+        archive.close()
+        print(f"{urls} URLs, {fetches} fetches, {distinct} distinct pages")
@@ -0,0 +1,395 @@
+import argparse
+import functools
+import glob
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import get_context
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(HERE, 'fixtures')
+RESULTS_DIR = os.path.join(HERE, 'bench_results')
+
+# Metrics where a lower value is better; every other metric is a throughput
+LOWER_IS_BETTER = ('peak_rss_mb', 'seconds')
+DEFAULT_THRESHOLD = 0.10
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+# Serve `directory` on an ephemeral localhost port from a background thread
+class FixtureServer:
+    def __init__(self, directory=FIXTURES_DIR):
+        handler = functools.partial(_QuietHandler, directory=directory)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _best_of(repeat, run):
+    # Best of `repeat` timed runs; the fastest run has the least scheduler noise in it
+    return min(run() for _ in range(repeat))
+
+
+def _fixture_pages():
+    pages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.html'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            pages.append((os.path.basename(path), f.read()))
+    return pages
+
+
+def bench_extract(pages=300, repeat=3):
+    """Extraction alone: main.parse_institution and the HTTP path's parse_with_embedded."""
+    from fetcher import parse_with_embedded
+    from main import parse_institution
+
+    html = [page for _, page in _fixture_pages()]
+    html = [html[n % len(html)] for n in range(pages)]
+
+    def timed(parse):
+        def run():
+            started = time.perf_counter()
+            for page in html:
+                parse(page)
+            return time.perf_counter() - started
+        return _best_of(repeat, run)
+
+    return {
+        'parse_institution_pages_per_sec': round(pages / timed(parse_institution), 1),
+        'parse_with_embedded_pages_per_sec': round(pages / timed(parse_with_embedded), 1),
+    }
+
+
+def bench_crawl(pages=300, workers=8, repeat=3):
+    """Fetch and parse fixture pages from a local HTTP server, sequentially and with ``workers`` threads."""
+    from fetcher import Fetcher, parse_with_embedded
+
+    names = [name for name, _ in _fixture_pages()]
+    with FixtureServer() as server, Fetcher(max_connections=workers) as fetcher:
+        # A query string per page keeps the URLs distinct, as in a real crawl
+        urls = [f'{server.url}{names[n % len(names)]}?page={n}' for n in range(pages)]
+
+        def scrape(url):
+            html = fetcher.fetch_http(url)
+            if html is None:
+                raise RuntimeError(f'fixture server returned no page for {url}')
+            return parse_with_embedded(html)
+
+        def sequential():
+            started = time.perf_counter()
+            for url in urls:
+                scrape(url)
+            return time.perf_counter() - started
+
+        def threaded():
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(scrape, urls))
+            return time.perf_counter() - started
+
+        return {
+            'sequential_pages_per_sec': round(pages / _best_of(repeat, sequential), 1),
+            'threaded_pages_per_sec': round(pages / _best_of(repeat, threaded), 1),
+        }
+
+
+def bench_browser(pages=20):
+    """scrape_shiksha_institution itself against the fixture server; needs Chrome, so it is opt-in."""
+    from main import DriverPool, fetch_page_source, parse_institution
+
+    names = [name for name, _ in _fixture_pages()]
+    with FixtureServer() as server, DriverPool(size=1) as pool:
+        urls = [f'{server.url}{names[n % len(names)]}?page={n}' for n in range(pages)]
+        started = time.perf_counter()
+        for url in urls:
+            with pool.driver() as driver:
+                parse_institution(fetch_page_source(driver, url))
+        elapsed = time.perf_counter() - started
+    return {'pages_per_sec': round(pages / elapsed, 2)}
+
+
+def _generated(records, seed=0):
+    from dummy import build_pools, generate_institution_data
+
+    rng = random.Random(seed)
+    pools = build_pools(seed)
+    return [generate_institution_data(rng, pools) for _ in range(records)]
+
+
+def bench_generate(records=20000, repeat=3):
+    from dummy import build_pools, generate_institution_data
+
+    pools = build_pools(0)
+
+    def run():
+        rng = random.Random(0)
+        started = time.perf_counter()
+        for _ in range(records):
+            generate_institution_data(rng, pools)
+        return time.perf_counter() - started
+
+    return {'records_per_sec': round(records / _best_of(repeat, run))}
+
+
+def bench_score(records=50000, repeat=3):
+    from scoring import score, score_batch
+
+    docs = _generated(records)
+
+    def timed(run_once):
+        def run():
+            started = time.perf_counter()
+            run_once()
+            return time.perf_counter() - started
+        return _best_of(repeat, run)
+
+    return {
+        'batch_records_per_sec': round(records / timed(lambda: score_batch(docs))),
+        'scalar_records_per_sec': round(records / timed(lambda: [score(doc) for doc in docs])),
+    }
+
+
+def bench_load(records=20000, batch_size=1000, mongo_uri=None, write_records=2000):
+    """dinserter.py loading: building the upserts (validation, score, search terms) for ``records``
+    records, then bulk_import end to end into a fresh database.
+
+    The import goes to a local mongod at ``mongo_uri`` with all ``records``; without one it uses
+    mongomock, whose upserts scan the whole collection, so only ``write_records`` are written
+    and the write numbers are only comparable with other mongomock runs.
+    """
+    import dinserter
+    from records import batched
+
+    if mongo_uri:
+        from pymongo import MongoClient
+
+        dinserter._client = MongoClient(mongo_uri)
+        backend = 'mongod'
+        write_records = records
+    else:
+        try:
+            import mongomock
+        except ImportError:
+            raise RuntimeError('the load benchmark needs --mongo-uri or the mongomock package')
+        dinserter._client = mongomock.MongoClient()
+        backend = 'mongomock'
+
+    docs = _generated(records)
+    started = time.perf_counter()
+    for n, batch in enumerate(batched(docs, batch_size)):
+        dinserter._build_batch(batch, n * batch_size)
+    build = time.perf_counter() - started
+
+    db_name = f'bench_{os.getpid()}'
+    docs = docs[:write_records]
+    # bulk_import checkpoints into the working directory; keep that out of the tree
+    cwd = os.getcwd()
+    os.chdir(tempfile.gettempdir())
+    try:
+        insert = dinserter.bulk_import(docs, 'bench', batch_size=batch_size, db_name=db_name, resume=False)
+        reload = dinserter.bulk_import(docs, 'bench', batch_size=batch_size, db_name=db_name, resume=False)
+    finally:
+        os.chdir(cwd)
+        dinserter.get_client().drop_database(db_name)
+        dinserter.get_client().close()
+    return {
+        'backend': backend,
+        'build_records_per_sec': round(records / build),
+        'insert_records_per_sec': insert['records_per_second'],
+        # Re-importing the same records exercises the matched, unchanged path of the upserts
+        'reload_records_per_sec': reload['records_per_second'],
+    }
+
+
+def bench_images(images=20, records=2000, size=(2400, 1600), workers=None):
+    """image_updater.py against a local server: ``records`` records sharing ``images`` generated
+    JPEGs, plus dead links; a second pass is answered from the URL cache."""
+    from PIL import Image
+
+    import image_updater
+
+    with tempfile.TemporaryDirectory() as tmp:
+        served = os.path.join(tmp, 'served')
+        os.makedirs(served)
+        rng = random.Random(0)
+        for n in range(images):
+            # Noise keeps the JPEGs photo-sized (a flat colour compresses to nothing)
+            image = Image.effect_noise(size, 64).convert('RGB')
+            image.paste((rng.randrange(256), rng.randrange(256), rng.randrange(256)), (0, 0, size[0] // 2, size[1] // 2))
+            image.save(os.path.join(served, f'{n}.jpg'), quality=90)
+        with open(os.path.join(served, 'page.html'), 'w') as f:
+            f.write('<html></html>')
+
+        store = image_updater.ImageStore(os.path.join(tmp, 'store'))
+        with FixtureServer(served) as server:
+            names = [f'{n}.jpg' for n in range(images)] + ['missing.jpg', 'page.html']
+            urls = [server.url + rng.choice(names) for _ in range(records)]
+            started = time.perf_counter()
+            results, failed, stats = image_updater.process(urls, store, workers=workers)
+            first = time.perf_counter() - started
+            started = time.perf_counter()
+            _, _, cached = image_updater.process(urls, store, workers=workers)
+            second = time.perf_counter() - started
+        variant_bytes = sum(os.path.getsize(store.variant_path(r['hash'], 'thumb')) for r in results.values() if r['hash'])
+        store.close()
+    if stats['valid'] != images or stats['broken'] != 2 or failed or cached['requested']:
+        raise RuntimeError(f'unexpected image results: {stats}, second pass {cached}')
+    return {
+        'records_per_sec': round(records / first, 1),
+        'cached_records_per_sec': round(records / second, 1),
+        'original_kb': round(stats['downloaded_bytes'] / images / 1024, 1),
+        'thumb_kb': round(variant_bytes / images / 1024, 1),
+    }
+
+
+BENCHMARKS = {
+    'extract': bench_extract,
+    'crawl': bench_crawl,
+    'generate': bench_generate,
+    'score': bench_score,
+    'load': bench_load,
+    'images': bench_images,
+    'browser': bench_browser,
+}
+DEFAULT_BENCHMARKS = ('extract', 'crawl', 'generate', 'score', 'load', 'images')
+
+
+def _run_one(name, params):
+    # Runs in a fresh process so ru_maxrss is this benchmark's peak alone
+    started = time.perf_counter()
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            result = BENCHMARKS[name](**params)
+        finally:
+            sys.stdout = stdout
+    result['seconds'] = round(time.perf_counter() - started, 2)
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result['peak_rss_mb'] = round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(names=DEFAULT_BENCHMARKS, params=None):
+    params = params or {}
+    results = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'params': params,
+        'benchmarks': {},
+    }
+    for name in names:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+            try:
+                result = executor.submit(_run_one, name, params.get(name, {})).result()
+            except Exception as e:
+                result = {'error': f'{type(e).__name__}: {e}'}
+        results['benchmarks'][name] = result
+        print(f"{name}: {result}")
+    return results
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """(benchmark, metric, baseline value, current value, relative change) for every metric that got
+    worse by more than ``threshold``. Benchmarks run with different parameters are not compared."""
+    regressions = []
+    for name, metrics in current['benchmarks'].items():
+        if current['params'].get(name) != baseline.get('params', {}).get(name):
+            print(f"Not comparing {name}: parameters differ from the baseline")
+            continue
+        before = baseline.get('benchmarks', {}).get(name, {})
+        for metric, value in metrics.items():
+            old = before.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            change = (value - old) / old
+            worse = change > threshold if metric in LOWER_IS_BETTER else change < -threshold
+            if worse:
+                regressions.append((name, metric, old, value, round(change, 3)))
+    return regressions
+
+
+def latest_result(directory=RESULTS_DIR, exclude=None):
+    paths = sorted(path for path in glob.glob(os.path.join(directory, '*.json')) if path != exclude)
+    return paths[-1] if paths else None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline benchmarks for extraction, crawling, generation, scoring and loading')
+    parser.add_argument('benchmarks', nargs='*',
+                        help=f"any of {', '.join(BENCHMARKS)} (default: {' '.join(DEFAULT_BENCHMARKS)}); "
+                             "'browser' needs Chrome")
+    parser.add_argument('--records', type=int, default=20000, help='records for generate, score and load')
+    parser.add_argument('--pages', type=int, default=300, help='pages for extract and crawl')
+    parser.add_argument('--mongo-uri', help='load into this mongod instead of mongomock')
+    parser.add_argument('--output', help=f'result file (default: {RESULTS_DIR}/<timestamp>-<commit>.json)')
+    parser.add_argument('--baseline', help='result file to compare against (default: the latest in bench_results/)')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='relative change flagged as a regression')
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    params = {
+        'extract': {'pages': args.pages},
+        'crawl': {'pages': args.pages},
+        'generate': {'records': args.records},
+        'score': {'records': args.records},
+        'load': {'records': args.records, 'mongo_uri': args.mongo_uri},
+        'images': {},
+    }
+    results = run(args.benchmarks or DEFAULT_BENCHMARKS, params)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = results['timestamp'].replace(':', '').replace('-', '')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{results['commit'] or 'nocommit'}.json")
+    baseline_path = args.baseline or latest_result(exclude=os.path.abspath(output))
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        print(f"Compared with {baseline_path} ({baseline.get('commit')})")
+        for name, metric, old, new, change in regressions:
+            print(f"REGRESSION {name}.{metric}: {old} -> {new} ({change:+.1%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%}")
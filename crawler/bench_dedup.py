@@ -0,0 +1,111 @@
+import argparse
+import random
+import time
+
+from dedup import acronym, find_clusters, load_keys, normalize_city, normalize_name
+from dummy import build_pools, generate_institution_data
+
+
+# Variants seen in scraped and hand-entered names
+def _punctuation(name, rng):
+    return name.replace('-', ' ').replace(',', '') if rng.random() < 0.5 else name.replace(' and ', ' & ')
+
+
+def _abbreviate(name, rng):
+    return name.replace('University', rng.choice(['Univ.', 'Univ', 'UNIVERSITY']))
+
+
+def _typo(name, rng):
+    i = rng.randrange(1, len(name) - 2)
+    return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+
+
+def _acronym(name, rng):
+    return acronym(normalize_name(name)).upper()
+
+
+def _article(name, rng):
+    return 'The ' + name.lower()
+
+
+VARIANTS = (_punctuation, _abbreviate, _typo, _acronym, _article)
+
+
+def make_dataset(count, duplicate_rate=0.1, seed=0):
+    """``count`` generated institutions plus near-duplicates of a ``duplicate_rate`` share of them.
+
+    Returns (records, truth) where truth[n] is the base record a record was derived from.
+    """
+    rng = random.Random(seed)
+    pools = build_pools(seed)
+    records, truth = [], []
+    for n in range(count):
+        records.append(generate_institution_data(rng, pools))
+        truth.append(n)
+    for n in rng.sample(range(count), int(count * duplicate_rate)):
+        variant = dict(records[n])
+        variant['name'] = rng.choice(VARIANTS)(records[n]['name'], rng)
+        if rng.random() < 0.5:
+            variant['contact_info'] = dict(variant['contact_info'], website='Not found')
+        records.append(variant)
+        truth.append(n)
+
+    # The generator reuses names, so some base records already share a normalized name and
+    # city; no matcher can tell those apart, so count them as one entity
+    entity = {}
+    for n in range(count):
+        key = (tuple(normalize_name(records[n]['name'])), normalize_city(records[n]['location']['city']))
+        entity.setdefault(key, n)
+    base = [entity[(tuple(normalize_name(records[n]['name'])), normalize_city(records[n]['location']['city']))]
+            for n in range(count)]
+    return records, [base[n] for n in truth]
+
+
+def _pairs(groups):
+    pairs = set()
+    for members in groups:
+        members = sorted(members)
+        pairs.update((members[x], members[y]) for x in range(len(members)) for y in range(x + 1, len(members)))
+    return pairs
+
+
+def run(count=100000, duplicate_rate=0.1, seed=0):
+    started = time.perf_counter()
+    records, truth = make_dataset(count, duplicate_rate, seed)
+    generated = time.perf_counter() - started
+
+    started = time.perf_counter()
+    keys = load_keys(records)
+    normalized = time.perf_counter() - started
+    clusters, stats = find_clusters(keys)
+
+    expected = {}
+    for n, entity in enumerate(truth):
+        expected.setdefault(entity, []).append(n)
+    true_pairs = _pairs(members for members in expected.values() if len(members) > 1)
+    found_pairs = _pairs(cluster['members'] for cluster in clusters)
+    hits = len(true_pairs & found_pairs)
+
+    return {
+        'records': len(records),
+        'generate_seconds': round(generated, 2),
+        'normalize_seconds': round(normalized, 2),
+        'candidate_seconds': stats['candidate_seconds'],
+        'dedup_seconds': stats['seconds'],
+        'records_per_second': round(len(records) / (normalized + stats['seconds'])),
+        'candidate_pairs': stats['candidate_pairs'],
+        'clusters': stats['clusters'],
+        'oversized_buckets': stats['oversized_buckets'],
+        'precision': round(hits / len(found_pairs), 4) if found_pairs else 1.0,
+        'recall': round(hits / len(true_pairs), 4) if true_pairs else 1.0,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark MinHash/LSH dedup on synthetic institutions from dummy.py')
+    parser.add_argument('--count', type=int, default=100000, help='base records before duplicates are added')
+    parser.add_argument('--duplicate-rate', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    for key, value in run(args.count, args.duplicate_rate, args.seed).items():
+        print(f"{key}: {value}")
@@ -0,0 +1,73 @@
+import argparse
+import glob
+import os
+import time
+
+from bs4 import BeautifulSoup
+
+from extractor import extract_institution
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', '*.html')
+
+
+# The original per-field BeautifulSoup extraction from main.py, kept as the baseline
+def parse_institution_bs4(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    institution_data = {}
+
+    def text_of(selector):
+        elem = soup.select_one(selector)
+        return elem.text.strip() if elem else 'Not found'
+
+    institution_data['institution_type'] = text_of('.institute-type-class')
+    institution_data['entrance_exams'] = text_of('.entrance-exams-class')
+    website_elem = soup.select_one('.official-website-class a')
+    institution_data['official_website'] = website_elem['href'] if website_elem else 'Not found'
+    institution_data['admission_process'] = text_of('.admission-process-class')
+    institution_data['required_documents'] = text_of('.required-documents-class')
+    institution_data['course_fee_structure'] = text_of('.course-fee-class')
+    institution_data['placements'] = {
+        'average_salary': text_of('.avg-salary-class'),
+        'highest_salary': text_of('.highest-salary-class'),
+        'placement_rate': text_of('.placement-rate-class'),
+    }
+    institution_data['top_recruiters'] = text_of('.top-recruiters-class')
+    return institution_data
+
+
+def time_parser(parse, pages, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            parse(html)
+    elapsed = time.perf_counter() - started
+    return len(pages) * repeat / elapsed
+
+
+def run(pattern=FIXTURES, repeat=20):
+    paths = sorted(glob.glob(pattern))
+    pages = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            pages.append(f.read())
+
+    for path, html in zip(paths, pages):
+        if parse_institution_bs4(html) != extract_institution(html):
+            raise AssertionError(f'Extractors disagree on {path}')
+
+    results = {
+        'pages': len(pages),
+        'bs4_html_parser_pages_per_sec': round(time_parser(parse_institution_bs4, pages, repeat), 1),
+        'compiled_lxml_pages_per_sec': round(time_parser(extract_institution, pages, repeat), 1),
+    }
+    results['speedup'] = round(results['compiled_lxml_pages_per_sec'] / results['bs4_html_parser_pages_per_sec'], 1)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare BeautifulSoup and compiled lxml extraction on saved pages')
+    parser.add_argument('--fixtures', default=FIXTURES, help='glob of saved HTML pages')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    for key, value in run(args.fixtures, args.repeat).items():
+        print(f"{key}: {value}")
@@ -0,0 +1,167 @@
+import argparse
+import hashlib
+import sqlite3
+import threading
+import time
+
+import httpx
+from fake_useragent import UserAgent
+
+from fetcher import parse_with_embedded
+from main import load_urls
+from records import write_records
+
+DEFAULT_DB = 'crawl_state.sqlite3'
+
+
+# Per-URL validators and content hash from the last successful fetch
+class CrawlState:
+    def __init__(self, path=DEFAULT_DB):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('''CREATE TABLE IF NOT EXISTS crawl_state (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            content_hash TEXT,
+            fetched_at REAL,
+            changed_at REAL
+        )''')
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        """Return ``(etag, last_modified, content_hash)`` for ``url`` or ``None`` if it was never fetched."""
+        with self._lock:
+            return self._db.execute('SELECT etag, last_modified, content_hash FROM crawl_state WHERE url = ?',
+                                    (url,)).fetchone()
+
+    def touch(self, url):
+        with self._lock:
+            self._db.execute('UPDATE crawl_state SET fetched_at = ? WHERE url = ?', (time.time(), url))
+            self._db.commit()
+
+    def update(self, url, etag, last_modified, content_hash, changed):
+        now = time.time()
+        with self._lock:
+            self._db.execute('''INSERT INTO crawl_state (url, etag, last_modified, content_hash, fetched_at, changed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    content_hash = excluded.content_hash,
+                    fetched_at = excluded.fetched_at,
+                    changed_at = CASE WHEN ? THEN excluded.changed_at ELSE crawl_state.changed_at END''',
+                             (url, etag, last_modified, content_hash, now, now, changed))
+            self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+
+def conditional_headers(previous):
+    headers = {}
+    if previous:
+        etag, last_modified, _ = previous
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+    return headers
+
+
+# Re-fetch URLs with conditional requests and parse only pages whose content changed.
+# The validators of a changed page are held in ``pending`` until ``commit`` is called after its
+# record is written, so a failed parse or an interrupted run fetches the page again next time.
+class Recrawler:
+    def __init__(self, state, client=None, archive=None, parse=parse_with_embedded):
+        self.state = state
+        self.pending = {}
+        self.archive = archive
+        self.parse = parse
+        self._owns_client = client is None
+        self.client = client or httpx.Client(follow_redirects=True, timeout=15.0,
+                                             headers={'User-Agent': UserAgent().random})
+        self.stats = {'not_modified': 0, 'unchanged': 0, 'changed': 0, 'new': 0, 'errors': 0}
+
+    def recrawl_one(self, url):
+        """Return the parsed institution if ``url`` is new or changed, otherwise ``None``."""
+        previous = self.state.get(url)
+        try:
+            response = self.client.get(url, headers=conditional_headers(previous))
+        except httpx.HTTPError as e:
+            print(f"Error fetching {url}: {e}")
+            self.stats['errors'] += 1
+            return None
+
+        if response.status_code == 304:
+            self.stats['not_modified'] += 1
+            self.state.touch(url)
+            return None
+        if response.status_code != 200:
+            print(f"Unexpected status {response.status_code} for {url}")
+            self.stats['errors'] += 1
+            return None
+
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        changed = previous is None or previous[2] != content_hash
+        if not changed:
+            self.state.update(url, etag, last_modified, content_hash, changed)
+            self.stats['unchanged'] += 1
+            return None
+
+        if self.archive is not None:
+            self.archive.put(url, response.text)
+        try:
+            data = self.parse(response.text)
+        except Exception as e:
+            print(f"Error parsing {url}: {e}")
+            self.stats['errors'] += 1
+            return None
+        data['url'] = url
+        self.stats['new' if previous is None else 'changed'] += 1
+        self.pending[url] = (etag, last_modified, content_hash)
+        return data
+
+    def commit(self, urls=None):
+        """Save the validators of ``urls`` (default: every pending URL) once their records are written."""
+        for url in list(self.pending) if urls is None else urls:
+            etag, last_modified, content_hash = self.pending.pop(url)
+            self.state.update(url, etag, last_modified, content_hash, True)
+
+    def recrawl(self, urls):
+        for url in urls:
+            data = self.recrawl_one(url)
+            if data is not None:
+                yield data
+
+    def close(self):
+        if self._owns_client:
+            self.client.close()
+
+
+if __name__ == '__main__':
+    from archive import PageArchive
+
+    parser = argparse.ArgumentParser(description='Re-crawl URLs and keep only institutions whose page changed')
+    parser.add_argument('urls', nargs='*')
+    parser.add_argument('--url-file')
+    parser.add_argument('--state', default=DEFAULT_DB, help='SQLite crawl-state database')
+    parser.add_argument('--archive', help='store changed pages in this archive directory')
+    parser.add_argument('--output', default='changed_institutions.json')
+    args = parser.parse_args()
+
+    urls = list(args.urls) + (load_urls(args.url_file) if args.url_file else [])
+    state = CrawlState(args.state)
+    recrawler = Recrawler(state, archive=PageArchive(args.archive) if args.archive else None)
+    started = time.perf_counter()
+    try:
+        # write_records raises instead of leaving a partial file, so validators are only saved for written records
+        written = write_records(recrawler.recrawl(urls), args.output, indent=4)
+        recrawler.commit()
+        print(f"Re-crawled {len(urls)} URLs in {time.perf_counter() - started:.1f}s, wrote {written} to {args.output}: "
+              f"{recrawler.stats}")
+    finally:
+        recrawler.close()
+        state.close()
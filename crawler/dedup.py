@@ -0,0 +1,402 @@
+import argparse
+import json
+import time
+import zlib
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from records import read_records, write_records
+from search_index import tokenize
+
+NUM_PERM = 64
+BANDS = 16
+# Pairs scoring at least this are merged
+MERGE_THRESHOLD = 0.7
+# 3-grams in more than this share of names ("uni", "ver", "col") carry little identity; they are
+# left out of LSH banding and weigh little in scoring
+COMMON_GRAM_SHARE = 0.01
+# Buckets larger than this are almost always one very common name; they are reported, not paired
+MAX_BUCKET = 200
+
+_PRIME = 4294967311  # smallest prime above 2**32
+
+ABBREVIATIONS = {
+    'univ': 'university', 'uni': 'university', 'inst': 'institute', 'instt': 'institute',
+    'tech': 'technology', 'technol': 'technology', 'engg': 'engineering', 'engr': 'engineering',
+    'coll': 'college', 'clg': 'college', 'mgmt': 'management', 'sci': 'science', 'natl': 'national',
+    'intl': 'international', 'govt': 'government', 'dept': 'department', 'st': 'saint',
+}
+STOPWORDS = {'the', 'of', 'and', 'for', 'in', 'at', 'a', 'an'}
+
+
+def normalize_name(name):
+    """Tokens with punctuation, case, accents, stopwords and common abbreviations normalized."""
+    tokens = [ABBREVIATIONS.get(token, token) for token in tokenize(name)]
+    return [token for token in tokens if token not in STOPWORDS]
+
+
+def acronym(tokens):
+    return ''.join(token[0] for token in tokens)
+
+
+def name_text(tokens):
+    """Text that is shingled: runs of initials are joined, so "R. V. College" and "RV College" agree."""
+    words, initials = [], ''
+    for token in tokens:
+        if len(token) == 1:
+            initials += token
+            continue
+        if initials:
+            words.append(initials)
+            initials = ''
+        words.append(token)
+    if initials:
+        words.append(initials)
+    return ' '.join(words)
+
+
+def normalize_city(city):
+    return ' '.join(tokenize(city))
+
+
+def website_domain(url):
+    if not isinstance(url, str) or '.' not in url:
+        return ''
+    if '://' not in url:
+        url = '//' + url
+    try:
+        host = urlsplit(url.strip()).hostname or ''
+    except ValueError:
+        return ''
+    return host[4:] if host.startswith('www.') else host
+
+
+def _field(doc, *paths):
+    for path in paths:
+        value = doc
+        for part in path.split('.'):
+            value = value.get(part) if isinstance(value, dict) else None
+        if isinstance(value, str) and value.strip() and value != 'Not found':
+            return value
+    return None
+
+
+def _completeness(doc):
+    # Non-empty leaves; the most complete record of a cluster is kept as canonical
+    if isinstance(doc, dict):
+        return sum(_completeness(value) for value in doc.values())
+    if isinstance(doc, list):
+        return sum(_completeness(value) for value in doc)
+    return int(doc not in (None, '', 'Not found'))
+
+
+class Keys:
+    """The normalized fields dedup needs, one row per input record; the records themselves are not kept."""
+
+    def __init__(self):
+        self.ids = []
+        self.names = []
+        self.tokens = []
+        self.cities = []
+        self.domains = []
+        self.completeness = []
+
+    def add(self, doc, record_id):
+        self.ids.append(record_id)
+        self.names.append(doc.get('name'))
+        self.tokens.append(normalize_name(doc.get('name')))
+        self.cities.append(normalize_city(_field(doc, 'location.city')))
+        self.domains.append(website_domain(_field(doc, 'contact_info.website', 'official_website')))
+        self.completeness.append(_completeness(doc))
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def shingle_arrays(texts, chunk=50000):
+    """Distinct character 3-grams of every text as (grams, owner), sorted by owner then gram.
+
+    Normalized names are ASCII, so each 3-gram packs exactly into a 24-bit integer and
+    never needs hashing.
+    """
+    all_grams, all_owners = [], []
+    for start in range(0, len(texts), chunk):
+        part = [f' {text} '.encode('ascii') for text in texts[start:start + chunk]]
+        lengths = np.fromiter((len(p) for p in part), dtype=np.int64, count=len(part))
+        data = np.frombuffer(b''.join(part), dtype=np.uint8).astype(np.int64)
+        if len(data) < 3:
+            continue
+        grams = (data[:-2] << 16) | (data[1:-1] << 8) | data[2:]
+        owner = np.repeat(np.arange(start, start + len(part), dtype=np.int64), lengths)[:-2]
+        # Drop 3-grams that straddle two records
+        ends = np.cumsum(lengths)
+        keep = np.ones(len(grams), dtype=bool)
+        for offset in (1, 2):
+            cut = ends[:-1] - offset
+            keep[cut[cut >= 0]] = False
+        packed = np.unique((owner[keep] << 24) | grams[keep])
+        all_owners.append(packed >> 24)
+        all_grams.append(packed & 0xFFFFFF)
+    if not all_grams:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(all_grams), np.concatenate(all_owners)
+
+
+def signatures(grams, owner, n, num_perm=NUM_PERM, seed=1, chunk=200000):
+    """MinHash signatures (n x num_perm) from owner-sorted 3-grams; rows with no grams stay at p.
+
+    The permutations ``(a * x + b) mod p`` are applied to a chunk of 3-grams at once and
+    reduced per record with ``np.minimum.reduceat``.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.int64)
+    b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.int64)
+    sig = np.full((n, num_perm), _PRIME, dtype=np.int64)
+    start = 0
+    while start < len(grams):
+        # Extend the chunk to the end of its last record
+        end = min(start + chunk, len(grams))
+        end = np.searchsorted(owner, owner[end - 1], side='right')
+        hashed = (grams[start:end, None] * a + b) % _PRIME
+        rows, offsets = np.unique(owner[start:end], return_index=True)
+        sig[rows] = np.minimum.reduceat(hashed, offsets, axis=0)
+        start = end
+    return sig
+
+
+def _band_keys(sig, bands, salt):
+    rows = sig.shape[1] // bands
+    for band in range(bands):
+        h = salt.copy()
+        for column in sig[:, band * rows:(band + 1) * rows].T.astype(np.uint64):
+            h = (h * np.uint64(0x100000001B3)) ^ column
+        yield h
+
+
+def _bucket_pairs(keys, valid, pairs, oversized):
+    # Group equal keys by sorting; every pair inside a bucket is a candidate
+    index = np.flatnonzero(valid)
+    order = index[np.argsort(keys[index], kind='stable')]
+    bounds = np.flatnonzero(np.diff(keys[order])) + 1
+    starts = np.concatenate(([0], bounds))
+    sizes = np.diff(np.concatenate((starts, [len(order)])))
+    # Buckets of the same size are expanded together, one size at a time
+    for size in np.unique(sizes[sizes > 1]):
+        if size > MAX_BUCKET:
+            oversized.extend([int(size)] * int((sizes == size).sum()))
+            continue
+        members = np.sort(order[starts[sizes == size][:, None] + np.arange(size)], axis=1)
+        left, right = np.triu_indices(size, 1)
+        pairs.append((members[:, left] * np.int64(1 << 32) + members[:, right]).ravel())
+
+
+class Matcher:
+    """MinHash/LSH candidate generation and weighted scoring over a set of ``Keys``.
+
+    Names are compared as sets of character 3-grams weighted by inverse document
+    frequency, so the parts that identify an institution ("ramaiah") count for more than
+    "university" or "college". LSH bands only the uncommon 3-grams and salts every band with
+    the city, so candidates share a city. Acronyms ("MSRIT") and website domains add candidates
+    that 3-grams cannot find.
+    """
+
+    def __init__(self, keys, num_perm=NUM_PERM, bands=BANDS):
+        self.keys = keys
+        self.num_perm = num_perm
+        self.bands = bands
+        n = len(keys)
+        self.grams, self.owner = shingle_arrays([name_text(tokens) for tokens in keys.tokens])
+        self.offsets = np.searchsorted(self.owner, np.arange(n + 1))
+        _, inverse, df = np.unique(self.grams, return_inverse=True, return_counts=True)
+        gram_df = df[inverse]
+        self.weights = np.log((n + 1) / gram_df)
+        self.totals = np.bincount(self.owner, weights=self.weights, minlength=n)
+        common = gram_df > max(COMMON_GRAM_SHARE * n, 20)
+        # A name made only of common 3-grams keeps them all, or it could never match
+        rare = np.bincount(self.owner[~common], minlength=n)
+        self.lsh_mask = ~common | (rare[self.owner] == 0)
+        self.unique_acronyms = set()
+
+    def candidate_pairs(self):
+        """Sorted (i, j) index pairs worth scoring, and the sizes of buckets skipped as oversized."""
+        keys, n = self.keys, len(self.keys)
+        sig = signatures(self.grams[self.lsh_mask], self.owner[self.lsh_mask], n, self.num_perm)
+        city_hash = np.fromiter((zlib.crc32(city.encode()) for city in keys.cities), dtype=np.uint64, count=n)
+        salt = city_hash * np.uint64(0x9E3779B97F4A7C15)
+        has_name = np.diff(self.offsets) > 0
+
+        pairs, oversized = [], []
+        for band_key in _band_keys(sig, self.bands, salt):
+            _bucket_pairs(band_key, has_name, pairs, oversized)
+
+        # "MSRIT" and "M S Ramaiah Institute Technology" share almost no 3-grams; pair them
+        # only when one distinct full name in the city has that acronym
+        by_acronym = {}
+        for i, tokens in enumerate(keys.tokens):
+            if len(tokens) > 1:
+                by_acronym.setdefault((acronym(tokens), keys.cities[i]), []).append(i)
+        extra = []
+        for i, tokens in enumerate(keys.tokens):
+            if len(tokens) == 1 and len(tokens[0]) >= 3:
+                matches = by_acronym.get((tokens[0], keys.cities[i]), ())[:MAX_BUCKET]
+                if len({tuple(keys.tokens[j]) for j in matches}) == 1:
+                    for j in matches:
+                        pair = (min(i, j), max(i, j))
+                        self.unique_acronyms.add(pair)
+                        extra.append(pair)
+
+        by_domain = {}
+        for i, domain in enumerate(keys.domains):
+            if domain:
+                by_domain.setdefault((domain, keys.cities[i]), []).append(i)
+        for members in by_domain.values():
+            if 1 < len(members) <= MAX_BUCKET:
+                extra.extend((members[x], members[y]) for x in range(len(members)) for y in range(x + 1, len(members)))
+        if extra:
+            pairs.append(np.fromiter((i * (1 << 32) + j for i, j in extra), dtype=np.int64, count=len(extra)))
+
+        if not pairs:
+            return np.empty((0, 2), dtype=np.int64), oversized
+        packed = np.unique(np.concatenate(pairs))
+        return np.stack((packed >> 32, packed & 0xFFFFFFFF), axis=1), oversized
+
+    def _gather(self, rows):
+        # Flattened 3-gram positions of every row in ``rows``, and the pair index each belongs to
+        counts = self.offsets[rows + 1] - self.offsets[rows]
+        pair = np.repeat(np.arange(len(rows)), counts)
+        starts = np.cumsum(counts) - counts
+        return np.repeat(self.offsets[rows], counts) + np.arange(counts.sum()) - np.repeat(starts, counts), pair
+
+    def name_similarity(self, left, right):
+        """IDF-weighted Jaccard of the 3-grams of names ``left[k]`` and ``right[k]``, for every k.
+
+        Both names' (pair, 3-gram) keys are sorted together; a key that appears twice is a
+        3-gram the pair shares.
+        """
+        positions, pair = (np.concatenate(parts) for parts in zip(self._gather(left), self._gather(right)))
+        key = (pair << 24) | self.grams[positions]
+        order = np.argsort(key, kind='stable')
+        key, positions, pair = key[order], positions[order], pair[order]
+        dup = np.flatnonzero(key[1:] == key[:-1])
+        shared = np.bincount(pair[dup], weights=self.weights[positions[dup]], minlength=len(left))
+        union = self.totals[left] + self.totals[right] - shared
+        return np.divide(shared, union, out=np.zeros(len(left)), where=union > 0)
+
+    def similarity(self, pairs, chunk=200000):
+        """Name similarity (or an unambiguous acronym match) of each (i, j) in ``pairs``,
+        adjusted by website domain and city agreement."""
+        keys = self.keys
+        _, domains = np.unique(np.array(keys.domains, dtype=object).astype(str), return_inverse=True)
+        _, cities = np.unique(np.array(keys.cities, dtype=object).astype(str), return_inverse=True)
+        has_domain = np.array([bool(d) for d in keys.domains])
+        has_city = np.array([bool(c) for c in keys.cities])
+        acronym_keys = np.fromiter((i * (1 << 32) + j for i, j in self.unique_acronyms), dtype=np.int64,
+                                   count=len(self.unique_acronyms))
+
+        scores = np.empty(len(pairs))
+        for start in range(0, len(pairs), chunk):
+            left, right = pairs[start:start + chunk, 0], pairs[start:start + chunk, 1]
+            score = self.name_similarity(left, right)
+            score = np.where(np.isin(left * (1 << 32) + right, acronym_keys), np.maximum(score, 0.9), score)
+            both = has_domain[left] & has_domain[right]
+            score += np.where(both, np.where(domains[left] == domains[right], 0.1, -0.1), 0.0)
+            score -= np.where(has_city[left] & has_city[right] & (cities[left] != cities[right]), 0.3, 0.0)
+            scores[start:start + chunk] = np.clip(score, 0.0, 1.0)
+        return scores
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def find_clusters(keys, threshold=MERGE_THRESHOLD, num_perm=NUM_PERM, bands=BANDS):
+    """Scored merge clusters over ``keys``: a list of dicts with the canonical index and all members."""
+    started = time.perf_counter()
+    matcher = Matcher(keys, num_perm, bands)
+    pairs, oversized = matcher.candidate_pairs()
+    candidates_at = time.perf_counter()
+
+    scores = matcher.similarity(pairs)
+    merged = scores >= threshold
+    parent = list(range(len(keys)))
+    edges = {}
+    for (i, j), sim in zip(pairs[merged].tolist(), scores[merged].tolist()):
+        edges[(i, j)] = sim
+        root_i, root_j = _find(parent, i), _find(parent, j)
+        if root_i != root_j:
+            parent[root_j] = root_i
+
+    groups = {}
+    for (i, j), sim in edges.items():
+        members, weakest = groups.setdefault(_find(parent, i), (set(), [1.0]))
+        members.update((i, j))
+        weakest[0] = min(weakest[0], sim)
+    clusters = []
+    for members, weakest in groups.values():
+        members = sorted(members)
+        clusters.append({
+            'canonical': max(members, key=lambda m: (keys.completeness[m], -m)),
+            'members': members,
+            # Weakest merged link in the cluster
+            'similarity': round(weakest[0], 3),
+        })
+
+    stats = {
+        'records': len(keys),
+        'candidate_pairs': len(pairs),
+        'merged_pairs': len(edges),
+        'clusters': len(clusters),
+        'duplicates': sum(len(c['members']) - 1 for c in clusters),
+        'oversized_buckets': len(oversized),
+        'candidate_seconds': round(candidates_at - started, 3),
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+    return clusters, stats
+
+
+def load_keys(records):
+    keys = Keys()
+    for n, doc in enumerate(records):
+        keys.add(doc, doc.get('_id', n))
+    return keys
+
+
+def deduplicate(records, clusters):
+    """Drop every non-canonical cluster member from ``records`` (the same stream ``clusters`` came from)."""
+    dropped = {member for cluster in clusters for member in cluster['members'] if member != cluster['canonical']}
+    for n, doc in enumerate(records):
+        if n not in dropped:
+            yield doc
+
+
+def _cluster_report(keys, clusters):
+    for cluster in clusters:
+        yield {
+            'canonical': str(keys.ids[cluster['canonical']]),
+            'similarity': cluster['similarity'],
+            'members': [{'id': str(keys.ids[m]), 'name': keys.names[m], 'city': keys.cities[m],
+                         'domain': keys.domains[m]} for m in cluster['members']],
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Find near-duplicate institutions with MinHash/LSH')
+    parser.add_argument('source', help='.json array or .ndjson of institutions')
+    parser.add_argument('--clusters', default='clusters.ndjson', help='where to write merge clusters')
+    parser.add_argument('--output', help='also write the records with duplicates removed')
+    parser.add_argument('--threshold', type=float, default=MERGE_THRESHOLD)
+    parser.add_argument('--bands', type=int, default=BANDS)
+    parser.add_argument('--num-perm', type=int, default=NUM_PERM)
+    args = parser.parse_args()
+
+    keys = load_keys(read_records(args.source))
+    clusters, stats = find_clusters(keys, args.threshold, args.num_perm, args.bands)
+    write_records(_cluster_report(keys, clusters), args.clusters)
+    if args.output:
+        # Second streaming pass, so the full records are never all in memory
+        write_records(deduplicate(read_records(args.source), clusters), args.output)
+    print(json.dumps(stats, indent=2))
@@ -1,6 +1,13 @@
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, OperationFailure
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import ConnectionFailure, OperationFailure, BulkWriteError
 from dotenv import load_dotenv
+from models import Institution, ValidationError
+from records import batched, read_records
+from scoring import score
+from search_index import add_search_terms, ensure_search_indexes
+from top_lists import TopLists
+from itertools import islice
+import argparse
 import json
 import os
 import time
@@ -9,39 +16,223 @@ load_dotenv()
 
 MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
 
+DEFAULT_BATCH_SIZE = 1000
+# Rejected records printed per batch; the rest are only counted
+MAX_REPORTED_REJECTS = 10
+CHECKPOINT_FILE = '.dinserter_checkpoint.json'
+# Records whose upsert failed are appended here before the checkpoint moves past their batch;
+# replay them with `python dinserter.py dinserter_failed.ndjson`
+FAILED_FILE = 'dinserter_failed.ndjson'
+
+# Fields that identify an institution across re-imports
+NATURAL_KEY = ('name', 'location.city')
+
+_client = None
+
+
+# One pooled client per process; MongoClient is thread-safe and keeps its own connection pool
+def get_client():
+    global _client
+    if _client is None:
+        _client = MongoClient(MONGO_URI, maxPoolSize=int(os.getenv('MONGO_POOL_SIZE', '10')))
+    return _client
+
+
+def get_collection(db_name='shiksha_data', collection_name='institutions'):
+    return get_client()[db_name][collection_name]
+
+
+def _get_path(doc, dotted):
+    value = doc
+    for part in dotted.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def natural_key(doc):
+    return tuple(_get_path(doc, field) for field in NATURAL_KEY)
+
+
 def save_to_mongodb(data, db_name='shiksha_data', collection_name='institutions'):
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[db_name]
-        collection = db[collection_name]
-        result = collection.insert_one(data)
-        print(f"Data inserted with ID: {result.inserted_id}")
-        inserted_doc = collection.find_one({'_id': result.inserted_id})
-        print("Inserted document:")
-        print(json.dumps(inserted_doc, indent=4, default=str))
-    except ConnectionError as e:
+        collection = get_collection(db_name, collection_name)
+        data = Institution.from_dict(data).to_dict()
+        add_search_terms(data)
+        key_filter = dict(zip(NATURAL_KEY, natural_key(data)))
+        result = collection.update_one(key_filter, {'$set': data}, upsert=True)
+        if result.upserted_id is not None:
+            print(f"Data inserted with ID: {result.upserted_id}")
+        else:
+            print(f"Data updated for: {data.get('name')}")
+    except ValidationError as e:
+        print(f"Rejected {data.get('name') if isinstance(data, dict) else data!r}: {e}")
+    except ConnectionFailure as e:
         print(f"Error connecting to MongoDB: {e}")
     except OperationFailure as e:
         print(f"Error performing MongoDB operation: {e}")
     except Exception as e:
         print(f"Unexpected error: {e}")
-    finally:
-        client.close()
 
 
-# Sample data for M.S. Ramaiah Institute of Technology (MSRIT)
-with open('updated.json', 'r') as f:
-    set = {}
-    institutions_data = json.load(f)
-    for institution_data in institutions_data:
-        if institution_data['name'] in set:
-            print(f"Duplicate institution found: {institution_data['name']}")
+def ensure_indexes(collection):
+    # Upserts filter on the natural key, so it must be indexed or every write is a collection scan
+    collection.create_index([(field, 1) for field in NATURAL_KEY], name='natural_key')
+    ensure_search_indexes(collection)
+
+
+def _load_checkpoint(source, batch_size):
+    try:
+        with open(CHECKPOINT_FILE, 'r') as f:
+            checkpoint = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return 0
+    if checkpoint.get('source') != os.path.abspath(source) or checkpoint.get('batch_size') != batch_size:
+        return 0
+    return checkpoint.get('batches_done', 0)
+
+
+def _save_checkpoint(source, batch_size, batches_done):
+    tmp = CHECKPOINT_FILE + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'source': os.path.abspath(source), 'batch_size': batch_size, 'batches_done': batches_done}, f)
+    os.replace(tmp, CHECKPOINT_FILE)
+
+
+def _save_failed(failed_docs):
+    with open(FAILED_FILE, 'a', encoding='utf-8') as f:
+        for doc in failed_docs:
+            f.write(json.dumps(doc, ensure_ascii=False, default=str) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _clear_checkpoint():
+    try:
+        os.remove(CHECKPOINT_FILE)
+    except FileNotFoundError:
+        pass
+
+
+def _build_batch(records, first_record=0):
+    """Upserts and normalized documents for the valid ``records``, plus (record number, name, errors)
+    for each rejected one."""
+    # Collapse repeated keys inside a batch: two unordered upserts on the same key can race into two inserts
+    ops, docs, rejected = {}, [], []
+    for n, record in enumerate(records, first_record):
+        try:
+            record = Institution.from_dict(record).to_dict()
+        except ValidationError as e:
+            rejected.append((n, record.get('name') if isinstance(record, dict) else None, e.errors))
             continue
-        set[institution_data['name']] = True
-
-        institution_data['score'] = float(institution_data['placements']['average_salary']) * float(institution_data['placements']['placement_rate']) // 100 + (float(institution_data['rating']) // 2) * 1000
-        save_to_mongodb(institution_data)
-        time.sleep(.01)
-        print(f"Data for institution {institution_data['name']} saved successfully.\n")
-        print("-" * 50)
-        print("\n")
\ No newline at end of file
+        record['score'] = score(record)
+        add_search_terms(record)
+        key = natural_key(record)
+        ops[key] = UpdateOne(dict(zip(NATURAL_KEY, key)), {'$set': record}, upsert=True)
+        docs.append(record)
+    return list(ops.values()), docs, rejected
+
+
+def bulk_import(records, source, batch_size=DEFAULT_BATCH_SIZE, db_name='shiksha_data',
+                collection_name='institutions', resume=True, update_top_lists=True):
+    """Upsert ``records`` (any iterable) in unordered batches, checkpointing after every acknowledged batch.
+
+    With ``update_top_lists`` the top-K lists touched by the written records are refreshed at the end;
+    a resumed import rebuilds them instead, since the interrupted run's changes were never flushed.
+    """
+    collection = get_collection(db_name, collection_name)
+    ensure_indexes(collection)
+    top_lists = TopLists(collection) if update_top_lists else None
+
+    start_batch = _load_checkpoint(source, batch_size) if resume else 0
+    if start_batch:
+        print(f"Resuming {source} after batch {start_batch}")
+        if top_lists is not None:
+            # The interrupted run never flushed the lists its batches touched
+            top_lists.require_rebuild()
+
+    stats = {'records': 0, 'rejected': 0, 'failed': 0, 'upserted': 0, 'modified': 0, 'matched': 0}
+    started = time.perf_counter()
+    # Already-acknowledged batches are skipped without building them
+    records = islice(records, start_batch * batch_size, None)
+    for batch_no, batch in enumerate(batched(records, batch_size), start_batch):
+        ops, docs, rejected = _build_batch(batch, batch_no * batch_size)
+        for n, name, errors in rejected[:MAX_REPORTED_REJECTS]:
+            print(f"Rejected record {n} ({name}): " + '; '.join(f'{path}: {message}' for path, message in errors))
+        if len(rejected) > MAX_REPORTED_REJECTS:
+            print(f"... and {len(rejected) - MAX_REPORTED_REJECTS} more rejected in batch {batch_no}")
+        stats['rejected'] += len(rejected)
+        # The ops follow the first occurrence of each natural key and carry its last record, which is
+        # what this rebuilds; writeErrors point into it by index
+        op_docs = list({natural_key(doc): doc for doc in docs}.values())
+        failed = set()
+        try:
+            result = collection.bulk_write(ops, ordered=False) if ops else None
+        except BulkWriteError as e:
+            # Unordered batches still apply every op that did not fail; the failed records are saved
+            # for replay so the checkpoint can move on without losing them
+            write_errors = e.details['writeErrors']
+            failed = {error['index'] for error in write_errors}
+            _save_failed(op_docs[i] for i in sorted(failed))
+            stats['failed'] += len(write_errors)
+            print(f"Batch {batch_no} had {len(write_errors)} write errors, saved to {FAILED_FILE}: "
+                  f"{[error.get('errmsg') for error in write_errors[:3]]}")
+            stats['upserted'] += e.details['nUpserted']
+            stats['modified'] += e.details['nModified']
+            stats['matched'] += e.details['nMatched']
+            result = None
+        if result is not None:
+            stats['upserted'] += result.upserted_count
+            stats['modified'] += result.modified_count
+            stats['matched'] += result.matched_count
+        if top_lists is not None:
+            # Only records that were written can enter a list
+            top_lists.collect(doc for i, doc in enumerate(op_docs) if i not in failed)
+        stats['records'] += len(batch)
+        _save_checkpoint(source, batch_size, batch_no + 1)
+
+        elapsed = time.perf_counter() - started
+        print(f"Batch {batch_no}: {stats['records']} records, {stats['records'] / elapsed:.0f} records/s")
+
+    # Flushed before the checkpoint goes: if this fails, the resumed run sees the checkpoint and rebuilds
+    if top_lists is not None:
+        top_lists.flush()
+    _clear_checkpoint()
+    elapsed = time.perf_counter() - started
+    stats['seconds'] = round(elapsed, 3)
+    stats['records_per_second'] = round(stats['records'] / elapsed, 1) if elapsed else 0.0
+    print(f"Imported {stats['records']} records in {elapsed:.2f}s "
+          f"({stats['records_per_second']} records/s): {stats['upserted']} inserted, "
+          f"{stats['modified']} modified, {stats['matched'] - stats['modified']} unchanged, "
+          f"{stats['rejected']} rejected, {stats['failed']} failed"
+          f"{f' (replay with: python dinserter.py {FAILED_FILE})' if stats['failed'] else ''}")
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk upsert institutions into MongoDB')
+    parser.add_argument('source', nargs='?', default='updated.json', help='.json array or .ndjson')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--db', default='shiksha_data')
+    parser.add_argument('--collection', default='institutions')
+    parser.add_argument('--no-resume', action='store_true', help='ignore any saved checkpoint')
+    parser.add_argument('--no-top-lists', action='store_true', help='skip refreshing top_lists')
+    parser.add_argument('--dedup', action='store_true', help='merge near-duplicate institutions first (dedup.py)')
+    args = parser.parse_args()
+
+    records = read_records(args.source)
+    if args.dedup:
+        from dedup import deduplicate, find_clusters, load_keys
+
+        # One pass to cluster, then the import streams the file again without the duplicates
+        clusters, stats = find_clusters(load_keys(read_records(args.source)))
+        print(f"Dedup: dropping {stats['duplicates']} near-duplicates in {stats['clusters']} clusters")
+        records = deduplicate(records, clusters)
+
+    try:
+        bulk_import(records, args.source, batch_size=args.batch_size, db_name=args.db,
+                    collection_name=args.collection, resume=not args.no_resume,
+                    update_top_lists=not args.no_top_lists)
+    finally:
+        get_client().close()
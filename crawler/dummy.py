@@ -2,11 +2,14 @@ import random
 from faker import Faker
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure, OperationFailure
-from random import randint
 
+from concurrent.futures import ProcessPoolExecutor
+import argparse
 import time
 import json
+import shutil
 from dotenv import load_dotenv
+from scoring import score
 import os
 
 load_dotenv() 
@@ -54,54 +57,63 @@ recruiters  = ['TCS', 'Infosys', 'Wipro', 'Accenture', 'Cognizant', 'HCL', 'Amaz
 courses_type = [ 'engineering', 'management', 'medical', 'commerce', 'arts', 'science' ]
 
 # Function to generate random institution data
-def generate_institution_data():
+# Pass a seeded `rng` and precomputed `pools` (see build_pools) to skip per-record Faker calls
+def generate_institution_data(rng=random, pools=None):
     # Generate course and fee structure
 
-    image = random.choice(institution_images)
-    institution_name = fake.company() + ' University'  # Random institution name
-    institution_type = random.choice(institution_types)
+    image = rng.choice(institution_images)
+    institution_name = (rng.choice(pools['company']) if pools else fake.company()) + ' University'  # Random institution name
+    institution_type = rng.choice(institution_types)
     location = {
-        'city': random.choice(City),
-        'state': random.choice(States),
+        'city': rng.choice(City),
+        'state': rng.choice(States),
         'country': 'India',
-        'pincode': str(random.randint(100000, 999999))
+        'pincode': str(rng.randint(100000, 999999))
     }
-    established_year = random.randint(1950, 2023)  # Random year between 1950 and 2023
-    accreditation = random.choice(['NAAC A+', 'NAAC A', 'NBA Accredited', 'UGC Approved', 'AICTE Approved'])
-    total_students = random.randint(1000, 20000)  # Random number of students
+    established_year = rng.randint(1950, 2023)  # Random year between 1950 and 2023
+    accreditation = rng.choice(['NAAC A+', 'NAAC A', 'NBA Accredited', 'UGC Approved', 'AICTE Approved'])
+    total_students = rng.randint(1000, 20000)  # Random number of students
     admission_process = (
         f"The admission process at {institution_name} is merit-based and considers the following criteria:\n\n"
         "- Academic performance in 10+2 or equivalent examination\n"
-        f"- Valid entrance examination scores ({'/'.join(random.sample(entrance_exams, random.randint(2, 3)))})\n"
+        f"- Valid entrance examination scores ({'/'.join(rng.sample(entrance_exams, rng.randint(2, 3)))})\n"
         "- Counselling and seat allocation process\n"
         "- Document verification and fee payment\n"
     )
-    required_documents = (random.sample(document_types, random.randint(4, 7)))
-    contact_info = {
-        'email': fake.email(),
-        'phone': fake.phone_number(),
-        'address': fake.address(),
-        'website': fake.url()
-    }
+    required_documents = (rng.sample(document_types, rng.randint(4, 7)))
+    if pools:
+        contact_info = {
+            'email': rng.choice(pools['email']),
+            'phone': rng.choice(pools['phone']),
+            'address': rng.choice(pools['address']),
+            'website': rng.choice(pools['website'])
+        }
+    else:
+        contact_info = {
+            'email': fake.email(),
+            'phone': fake.phone_number(),
+            'address': fake.address(),
+            'website': fake.url()
+        }
 
-    taugth_courses = random.sample(courses, random.randint(3, 6))  # Randomly select 3 to 6 courses
+    taugth_courses = rng.sample(courses, rng.randint(3, 6))  # Randomly select 3 to 6 courses
 
-    courses_details = [ {'name': course, 'duration' : random.randint(4, 5), 'annual_fees' : randint(25000,35000)} for course in taugth_courses]
+    courses_details = [ {'name': course, 'duration' : rng.randint(4, 5), 'annual_fees' : rng.randint(25000,35000)} for course in taugth_courses]
 
     college_eligibility = [ {'course': course, 'eligibility': eligibility[course]} for course in taugth_courses ]
 
-    college_acceptance_exams = random.sample(acceptance_exams, random.randint(2, 4))
+    college_acceptance_exams = rng.sample(acceptance_exams, rng.randint(2, 4))
 
-    top_recruiters = random.sample(recruiters, 6) 
+    top_recruiters = rng.sample(recruiters, 6) 
     placements = {
-        'average_salary': round(random.uniform(3, 10), 1),  # Average salary in LPA
-        'highest_salary': round(random.uniform(15, 50), 1),  # Highest salary in LPA
-        'placement_rate': random.randint(70, 95)  # Placement rate in percentage
+        'average_salary': round(rng.uniform(3, 10), 1),  # Average salary in LPA
+        'highest_salary': round(rng.uniform(15, 50), 1),  # Highest salary in LPA
+        'placement_rate': rng.randint(70, 95)  # Placement rate in percentage
     }   
     
-    college_rating = round(random.uniform(1, 5), 1)  # Random rating between 1 and 5
+    college_rating = round(rng.uniform(1, 5), 1)  # Random rating between 1 and 5
 
-    courses_offered = random.sample(courses_type, random.randint(1, 3))  # Randomly select 1 to 3 course types
+    courses_offered = rng.sample(courses_type, rng.randint(1, 3))  # Randomly select 1 to 3 course types
     # Generate institution data
     institution_data = {
         'name': institution_name,
@@ -124,7 +136,7 @@ def generate_institution_data():
     }
 
 
-    institution_data['score'] = institution_data['placements']['average_salary'] * institution_data['placements']['placement_rate'] / 100 + institution_data['rating'] * 1000
+    institution_data['score'] = score(institution_data)
     
     return institution_data
 
@@ -157,16 +169,106 @@ def save_to_mongodb(data, db_name='shiksha_data', collection_name='institutions'
         # Close the MongoDB connection
         client.close()
 
+POOL_SIZE = 5000
+
+_pools = None
+
+
+# Precompute Faker values once; generated records draw from these pools
+def build_pools(seed=0, size=POOL_SIZE):
+    pool_fake = Faker('en_IN')
+    pool_fake.seed_instance(seed)
+    return {
+        'company': [pool_fake.company() for _ in range(size)],
+        'email': [pool_fake.email() for _ in range(size)],
+        'phone': [pool_fake.phone_number() for _ in range(size)],
+        'address': [pool_fake.address() for _ in range(size)],
+        'website': [pool_fake.url() for _ in range(size)],
+    }
+
+
+def _init_worker(seed, pool_size):
+    global _pools
+    _pools = build_pools(seed, pool_size)
+
+
+# Generate one shard: records depend only on (seed, shard), so output is reproducible
+# for any number of workers
+def _generate_shard(job):
+    seed, shard, count, part_path, mongo, batch_size = job
+    rng = random.Random(f'{seed}:{shard}')
+    if part_path:
+        with open(part_path, 'w', encoding='utf-8') as f:
+            for _ in range(count):
+                f.write(json.dumps(generate_institution_data(rng, _pools)))
+                f.write('\n')
+        return count
+
+    from search_index import add_search_terms
+
+    db_name, collection_name = mongo
+    client = MongoClient(MONGO_URI)
+    try:
+        collection = client[db_name][collection_name]
+        remaining = count
+        while remaining:
+            batch = [add_search_terms(generate_institution_data(rng, _pools)) for _ in range(min(batch_size, remaining))]
+            collection.insert_many(batch, ordered=False)
+            remaining -= len(batch)
+    finally:
+        client.close()
+    return count
+
+
+# Function to generate `total` institutions across a process pool, to NDJSON or MongoDB
+def generate(total, output=None, mongo=None, seed=0, shards=64, workers=None, batch_size=1000,
+             pool_size=POOL_SIZE):
+    workers = workers or os.cpu_count()
+    per_shard, extra = divmod(total, shards)
+    counts = [per_shard + (1 if i < extra else 0) for i in range(shards)]
+    parts = [f'{output}.part{i:05d}' if output else None for i in range(shards)]
+    jobs = [(seed, i, counts[i], parts[i], mongo, batch_size) for i in range(shards) if counts[i]]
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(seed, pool_size)) as executor:
+        generated = sum(executor.map(_generate_shard, jobs))
+
+    if output:
+        # Concatenate in shard order so the file is identical for any worker count
+        with open(output, 'wb') as out:
+            for part in parts:
+                if os.path.exists(part):
+                    with open(part, 'rb') as f:
+                        shutil.copyfileobj(f, out)
+                    os.remove(part)
+
+    elapsed = time.perf_counter() - started
+    print(f"Generated {generated} institutions in {elapsed:.1f}s ({generated / elapsed:.0f} records/s) "
+          f"with {workers} workers")
+    return generated
+
+
 # Main execution
 if __name__ == "__main__":
-    # Generate random institution data
-    print(generate_institution_data())
-    # print("Starting data generation and insertion into MongoDB...\n")
-    # for i in range(50):
-    #     print(f"Generating data for institution {i+1}...")
-    #     data = generate_institution_data()
-    #     save_to_mongodb(data)
-    #     time.sleep(.2)  # Sleep to avoid overwhelming the database with requests
-    #     print(f"Data for institution {i+1} saved successfully.\n")
-    #     print("-" * 50)
-    #     print("\n")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Generate synthetic institutions')
+    parser.add_argument('--count', type=int, help='generate this many records (default: print one)')
+    parser.add_argument('--output', help='NDJSON file to write')
+    parser.add_argument('--mongo', action='store_true', help='bulk insert into MongoDB instead')
+    parser.add_argument('--db', default='shiksha_data')
+    parser.add_argument('--collection', default='institutions')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, help='processes (default: all cores)')
+    parser.add_argument('--shards', type=int, default=64, help='work units; output depends on seed and shards only')
+    parser.add_argument('--batch-size', type=int, default=1000, help='documents per insert_many')
+    parser.add_argument('--pool-size', type=int, default=POOL_SIZE, help='precomputed Faker values per field')
+    args = parser.parse_args()
+
+    if args.count is None:
+        # Generate random institution data
+        print(generate_institution_data())
+    elif not args.output and not args.mongo:
+        parser.error('--count needs --output or --mongo')
+    else:
+        generate(args.count, output=args.output, mongo=(args.db, args.collection) if args.mongo else None,
+                 seed=args.seed, shards=args.shards, workers=args.workers, batch_size=args.batch_size,
+                 pool_size=args.pool_size)
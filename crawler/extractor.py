@@ -0,0 +1,110 @@
+import json
+
+from cssselect import GenericTranslator
+from lxml import etree, html as lxml_html
+
+from metrics import METRICS
+
+NOT_FOUND = 'Not found'
+
+
+# One institution field: where it lives in the page and how to turn it into a value.
+# `attr=None` reads the element's text; `required` fields decide whether a page is usable.
+class Field:
+    __slots__ = ('name', 'selector', 'attr', 'post', 'default', 'required')
+
+    def __init__(self, name, selector, attr=None, post=str.strip, default=NOT_FOUND, required=False):
+        self.name = name
+        self.selector = selector
+        self.attr = attr
+        self.post = post
+        self.default = default
+        self.required = required
+
+
+# Institution fields on a Shiksha page. Dotted names become nested dicts.
+INSTITUTION_SPEC = (
+    Field('institution_type', '.institute-type-class', required=True),  # Update selector
+    Field('entrance_exams', '.entrance-exams-class'),  # Update selector
+    Field('official_website', '.official-website-class a', attr='href', required=True),  # Update selector
+    Field('admission_process', '.admission-process-class', required=True),  # Update selector
+    Field('required_documents', '.required-documents-class'),  # Update selector
+    Field('course_fee_structure', '.course-fee-class'),  # Update selector
+    Field('placements.average_salary', '.avg-salary-class', required=True),  # Update selector
+    Field('placements.highest_salary', '.highest-salary-class'),  # Update selector
+    Field('placements.placement_rate', '.placement-rate-class'),  # Update selector
+    Field('top_recruiters', '.top-recruiters-class'),  # Update selector
+)
+
+# JSON-LD keys that map onto institution fields when the markup selectors miss
+JSON_LD_FIELDS = {
+    'url': 'official_website',
+}
+
+_JSON_LD = etree.XPath('//script[@type="application/ld+json"]/text()')
+
+
+class Extractor:
+    """A field spec compiled to XPath; the page is parsed once with lxml and every field read from that tree."""
+
+    def __init__(self, spec):
+        translator = GenericTranslator()
+        self.spec = tuple(spec)
+        self.required_fields = tuple(field.name for field in self.spec if field.required)
+        self.required_selectors = tuple(field.selector for field in self.spec if field.required)
+        self._compiled = []
+        for field in self.spec:
+            # `(...)[1]` keeps select_one semantics: first match in document order
+            xpath = etree.XPath(f'({translator.css_to_xpath(field.selector)})[1]')
+            self._compiled.append((field, field.name.split('.'), xpath))
+
+    @staticmethod
+    def parse(page):
+        if isinstance(page, (str, bytes)):
+            return lxml_html.fromstring(page)
+        return page
+
+    def __call__(self, page):
+        tree = self.parse(page)
+        data = {}
+        for field, path, xpath in self._compiled:
+            value = field.default
+            result = 'miss'
+            matches = xpath(tree)
+            if matches:
+                elem = matches[0]
+                raw = elem.get(field.attr) if field.attr else elem.text_content()
+                if raw is not None:
+                    try:
+                        value = field.post(raw) if field.post else raw
+                        result = 'hit'
+                    except (TypeError, ValueError):
+                        # The selector matched but the value could not be converted
+                        value = field.default
+                        result = 'error'
+            METRICS.inc('extract_fields_total', field=field.name, result=result)
+            target = data
+            for key in path[:-1]:
+                target = target.setdefault(key, {})
+            target[path[-1]] = value
+        return data
+
+
+def parse_embedded_json(page):
+    """Return institution fields found in ``<script type="application/ld+json">`` blocks."""
+    fields = {}
+    for text in _JSON_LD(Extractor.parse(page)):
+        try:
+            payload = json.loads(text)
+        except ValueError:
+            continue
+        for item in payload if isinstance(payload, list) else [payload]:
+            if not isinstance(item, dict):
+                continue
+            for key, field in JSON_LD_FIELDS.items():
+                if isinstance(item.get(key), str) and field not in fields:
+                    fields[field] = item[key]
+    return fields
+
+
+extract_institution = Extractor(INSTITUTION_SPEC)
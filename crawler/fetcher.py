@@ -0,0 +1,185 @@
+import argparse
+import time
+from collections import Counter
+
+import httpx
+from fake_useragent import UserAgent
+
+from archive import PageArchive
+from extractor import NOT_FOUND, Extractor, extract_institution, parse_embedded_json
+from main import DriverPool, fetch_page_lean, fetch_page_source, load_urls, save_to_json
+from metrics import METRICS, add_arguments, finish, profile_page, profiler_from_args
+
+try:
+    import h2  # noqa: F401  httpx only negotiates HTTP/2 when the h2 package is installed
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+# A page is only taken from the fast path when every one of these was extracted
+REQUIRED_FIELDS = extract_institution.required_fields
+
+
+def _get_path(data, dotted):
+    value = data
+    for part in dotted.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _found(value):
+    if isinstance(value, dict):
+        return all(_found(v) for v in value.values())
+    return value not in (None, '', NOT_FOUND)
+
+
+def missing_fields(data, required_fields=REQUIRED_FIELDS):
+    if data is None:
+        return list(required_fields)
+    return [field for field in required_fields if not _found(_get_path(data, field))]
+
+
+def parse_with_embedded(html):
+    with METRICS.time('parse'):
+        tree = Extractor.parse(html)
+        data = extract_institution(tree)
+        for field, value in parse_embedded_json(tree).items():
+            if not _found(data.get(field)):
+                data[field] = value
+    return data
+
+
+# Plain HTTP first, Selenium only for pages whose required fields are missing from the server HTML
+class Fetcher:
+    def __init__(self, required_fields=REQUIRED_FIELDS, driver_pool=None, timeout=15.0, max_connections=20,
+                 archive=None):
+        self.required_fields = tuple(required_fields)
+        self.archive = archive
+        self._driver_pool = driver_pool
+        self._owns_pool = driver_pool is None
+        self.client = httpx.Client(
+            http2=HTTP2,
+            timeout=timeout,
+            follow_redirects=True,
+            headers={'User-Agent': UserAgent().random},
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self.stats = {'http_pages': 0, 'browser_pages': 0, 'http_errors': 0, 'failed': 0}
+        self.field_hits = Counter()
+        self.field_misses = Counter()
+
+    @property
+    def driver_pool(self):
+        if self._driver_pool is None:
+            self._driver_pool = DriverPool(size=1, lean=True)
+        return self._driver_pool
+
+    def fetch_http(self, url):
+        try:
+            with METRICS.time('http_fetch'):
+                response = self.client.get(url)
+        except httpx.HTTPError as e:
+            print(f"HTTP fetch failed for {url}: {e}")
+            self.stats['http_errors'] += 1
+            return None
+        METRICS.inc('http_responses_total', status=response.status_code)
+        if response.status_code != 200:
+            self.stats['http_errors'] += 1
+            return None
+        return response.text
+
+    def fetch_browser(self, url):
+        with self.driver_pool.driver() as driver:
+            if self.driver_pool.lean:
+                return fetch_page_lean(driver, url, extract_institution.required_selectors)[0]
+            return fetch_page_source(driver, url)
+
+    def fetch(self, url):
+        """Return ``(data, source)`` where ``source`` is ``'http'``, ``'browser'`` or ``None`` on failure."""
+        html = self.fetch_http(url)
+        if html is not None:
+            if self.archive is not None:
+                self.archive.put(url, html)
+            try:
+                data = parse_with_embedded(html)
+            except Exception as e:
+                # An empty or unparseable body counts as every required field missing
+                print(f"Error parsing {url}: {e}")
+                data = None
+            missing = missing_fields(data, self.required_fields)
+            self.count_fields(missing)
+            if not missing:
+                self.stats['http_pages'] += 1
+                METRICS.inc('pages_total', source='http')
+                return data, 'http'
+
+        try:
+            html = self.fetch_browser(url)
+            if self.archive is not None:
+                self.archive.put(url, html)
+            data = parse_with_embedded(html)
+        except Exception as e:
+            print(f"Error scraping {url}: {e}")
+            self.stats['failed'] += 1
+            METRICS.inc('pages_total', source='failed')
+            return None, None
+        self.stats['browser_pages'] += 1
+        METRICS.inc('pages_total', source='browser')
+        return data, 'browser'
+
+    def count_fields(self, missing):
+        # Required fields after the JSON-LD fallback; extract_fields_total counts raw selector hits
+        for field in self.required_fields:
+            result = 'miss' if field in missing else 'hit'
+            (self.field_misses if field in missing else self.field_hits)[field] += 1
+            METRICS.inc('required_fields_total', field=field, result=result)
+
+    def report(self):
+        lines = [f"HTTP pages: {self.stats['http_pages']}, browser fallbacks: {self.stats['browser_pages']}, "
+                 f"HTTP errors: {self.stats['http_errors']}, failed: {self.stats['failed']}"]
+        for field in self.required_fields:
+            hits, misses = self.field_hits[field], self.field_misses[field]
+            total = hits + misses
+            rate = hits / total * 100 if total else 0.0
+            lines.append(f"  {field}: fast path {hits}/{total} ({rate:.0f}%)")
+        return '\n'.join(lines)
+
+    def close(self):
+        self.client.close()
+        if self._owns_pool and self._driver_pool is not None:
+            self._driver_pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='HTTP-first crawl with Selenium fallback')
+    parser.add_argument('urls', nargs='*')
+    parser.add_argument('--url-file')
+    parser.add_argument('--output', default='institution_data.json')
+    parser.add_argument('--archive', help='store every fetched page in this archive directory')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    urls = list(args.urls) + (load_urls(args.url_file) if args.url_file else [])
+    profiler = profiler_from_args(args)
+    results = []
+    started = time.perf_counter()
+    archive = PageArchive(args.archive) if args.archive else None
+    with Fetcher(archive=archive) as fetcher:
+        for url in urls:
+            with profile_page(profiler, url):
+                data, source = fetcher.fetch(url)
+            if data:
+                data['url'] = url
+                results.append(data)
+        print(fetcher.report())
+    print(f"Fetched {len(results)}/{len(urls)} pages in {time.perf_counter() - started:.1f}s")
+    save_to_json(results, args.output)
+    finish(args)
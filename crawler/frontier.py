@@ -0,0 +1,188 @@
+import argparse
+import json
+import re
+import sqlite3
+import time
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+from lxml import etree
+
+from extractor import Extractor
+
+DEFAULT_DB = 'frontier.sqlite3'
+
+PENDING, IN_FLIGHT, DONE, FAILED = 'pending', 'in_flight', 'done', 'failed'
+LISTING, INSTITUTION = 'listing', 'institution'
+
+ALLOWED_HOSTS = ('www.shiksha.com',)
+# Institution pages end in a numeric listing id, e.g. /university/siksha-o-anusandhan-university-soa-bhubaneswar-38098
+INSTITUTION_PATTERN = re.compile(r'^/(university|college)/[a-z0-9-]+-\d+/?$')
+# Category and ranking pages that link to institutions, e.g. /b-tech/colleges/b-tech-colleges-india
+LISTING_PATTERN = re.compile(r'^/[a-z0-9-]+/(colleges|ranking)(/[a-z0-9-]+)*/?$')
+# Only these query parameters change which institutions a listing shows
+KEPT_QUERY_PARAMS = ('pageNo',)
+
+_LINKS = etree.XPath('//a/@href')
+
+
+def canonicalize(url, base=None):
+    """Absolute, lower-case host, no fragment, no tracking parameters, no trailing slash."""
+    if base:
+        url = urljoin(base, url)
+    parts = urlsplit(url.strip())
+    if parts.scheme not in ('http', 'https'):
+        return None
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if k in KEPT_QUERY_PARAMS))
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit(('https', parts.netloc.lower(), path, query, ''))
+
+
+def classify(url):
+    parts = urlsplit(url)
+    if parts.netloc not in ALLOWED_HOSTS:
+        return None
+    if INSTITUTION_PATTERN.match(parts.path):
+        return INSTITUTION
+    if LISTING_PATTERN.match(parts.path):
+        return LISTING
+    return None
+
+
+def discover_links(html, base_url):
+    """Return ``(url, kind)`` for every crawlable link on a listing page."""
+    found = {}
+    for href in _LINKS(Extractor.parse(html)):
+        url = canonicalize(href, base_url)
+        if url and url not in found:
+            kind = classify(url)
+            if kind:
+                found[url] = kind
+    return list(found.items())
+
+
+# Durable queue of URLs; every state change is committed, so a killed crawl resumes where it stopped
+class Frontier:
+    def __init__(self, path=DEFAULT_DB, max_attempts=3):
+        self.max_attempts = max_attempts
+        self._db = sqlite3.connect(path)
+        self._db.execute('''CREATE TABLE IF NOT EXISTS frontier (
+            url TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            state TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            discovered_from TEXT,
+            error TEXT,
+            updated_at REAL
+        )''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS frontier_state ON frontier (state, kind)')
+        self._db.commit()
+
+    def recover(self):
+        """Return URLs left in flight by a killed crawl to the queue."""
+        with self._db:
+            cursor = self._db.execute('UPDATE frontier SET state = ? WHERE state = ?', (PENDING, IN_FLIGHT))
+        return cursor.rowcount
+
+    def add(self, urls, kind=None, discovered_from=None):
+        """Queue ``urls`` (or ``(url, kind)`` pairs); already-known URLs are ignored. Returns how many were new."""
+        rows = []
+        for item in urls:
+            if isinstance(item, tuple):
+                url, url_kind = item
+            else:
+                url = canonicalize(item)
+                url_kind = kind or (classify(url) if url else None)
+            if url and url_kind:
+                rows.append((url, url_kind, PENDING, discovered_from, time.time()))
+        with self._db:
+            before = self._db.total_changes
+            self._db.executemany('INSERT OR IGNORE INTO frontier (url, kind, state, discovered_from, updated_at) '
+                                 'VALUES (?, ?, ?, ?, ?)', rows)
+            return self._db.total_changes - before
+
+    def claim(self):
+        """Mark the next pending URL in flight and return ``(url, kind)``; listing pages go first."""
+        with self._db:
+            row = self._db.execute('SELECT url, kind FROM frontier WHERE state = ? '
+                                   'ORDER BY kind = ? DESC, rowid LIMIT 1', (PENDING, LISTING)).fetchone()
+            if row:
+                self._db.execute('UPDATE frontier SET state = ?, attempts = attempts + 1, updated_at = ? WHERE url = ?',
+                                 (IN_FLIGHT, time.time(), row[0]))
+        return row
+
+    def done(self, url):
+        with self._db:
+            self._db.execute('UPDATE frontier SET state = ?, error = NULL, updated_at = ? WHERE url = ?',
+                             (DONE, time.time(), url))
+
+    def fail(self, url, error):
+        with self._db:
+            self._db.execute('UPDATE frontier SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, '
+                             'error = ?, updated_at = ? WHERE url = ?',
+                             (self.max_attempts, FAILED, PENDING, str(error), time.time(), url))
+
+    def counts(self):
+        return dict(self._db.execute('SELECT state, COUNT(*) FROM frontier GROUP BY state').fetchall())
+
+    def close(self):
+        self._db.close()
+
+
+def run(frontier, fetcher, output, limit=None):
+    """Drain the frontier: listing pages feed it, institution pages are parsed and appended to ``output``."""
+    recovered = frontier.recover()
+    if recovered:
+        print(f"Recovered {recovered} in-flight URLs from the last run")
+    processed = 0
+    started = time.perf_counter()
+    with open(output, 'a', encoding='utf-8') as out:
+        while limit is None or processed < limit:
+            claimed = frontier.claim()
+            if claimed is None:
+                break
+            url, kind = claimed
+            processed += 1
+            try:
+                if kind == LISTING:
+                    html = fetcher.fetch_http(url)
+                    if html is None:
+                        raise RuntimeError('listing fetch failed')
+                    new = frontier.add(discover_links(html, url), discovered_from=url)
+                    print(f"{url}: {new} new links")
+                else:
+                    data, source = fetcher.fetch(url)
+                    if data is None:
+                        raise RuntimeError('institution fetch failed')
+                    data['url'] = url
+                    out.write(json.dumps(data, ensure_ascii=False) + '\n')
+                    out.flush()
+            except Exception as e:
+                print(f"Error crawling {url}: {e}")
+                frontier.fail(url, e)
+                continue
+            frontier.done(url)
+    print(f"Processed {processed} URLs in {time.perf_counter() - started:.1f}s: {frontier.counts()}")
+
+
+if __name__ == '__main__':
+    from fetcher import Fetcher
+    from main import load_urls
+
+    parser = argparse.ArgumentParser(description='Resumable crawl seeded from listing pages')
+    parser.add_argument('seeds', nargs='*', help='listing, category or institution URLs')
+    parser.add_argument('--seed-file')
+    parser.add_argument('--db', default=DEFAULT_DB, help='SQLite frontier database')
+    parser.add_argument('--output', default='institutions.ndjson', help='institutions are appended one JSON object per line')
+    parser.add_argument('--limit', type=int, help='stop after this many URLs')
+    args = parser.parse_args()
+
+    frontier = Frontier(args.db)
+    seeds = list(args.seeds) + (load_urls(args.seed_file) if args.seed_file else [])
+    if seeds:
+        # Seeds are taken as listing pages unless they look like institution pages
+        frontier.add([(canonicalize(url), classify(canonicalize(url)) or LISTING) for url in seeds])
+    try:
+        with Fetcher() as fetcher:
+            run(frontier, fetcher, args.output, args.limit)
+    finally:
+        frontier.close()
@@ -1,24 +1,347 @@
-import json
-
-# Step 1: Read JSON data from a file
-input_file = "universities_updated.json"  # Replace with your file name
-with open(input_file, "r", encoding="utf-8") as f:
-    data = json.load(f)
-
-# Loop through each entry and update image URL
-for idx, college in enumerate(data):
-    name = college["name"]
-    print(f"\n{idx + 1}. College: {name}")
-    print(f"Current image URL: {college['image_url']}")
-    new_url = input("Enter new image URL (or press Enter to keep current): ").strip()
-    
-    if new_url:
-        college["image_url"] = new_url
-        print("✅ Image URL updated.")
-    else:
-        print("⏭️ Skipped, image URL kept unchanged.")
-
-# Optional: Print the final updated JSON
-print(json.dumps(data, indent=2))
-with open("updated.json", "w") as f:
-    json.dump(data, f, indent=2)
+import argparse
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+
+import httpx
+from fake_useragent import UserAgent
+from PIL import Image, ImageOps
+from pymongo import ASCENDING, UpdateMany
+
+from records import read_records, write_records
+
+STORE_ROOT = 'image_store'
+
+# Variant name -> bounding box; every variant is WebP. `card` replaces image_url, `thumb` is for lists.
+VARIANTS = {'card': (960, 720), 'thumb': (320, 240)}
+WEBP_QUALITY = 80
+MAX_IMAGE_BYTES = 25 * 1024 * 1024
+# Servers that refuse HEAD are checked with GET straight away
+HEAD_UNSUPPORTED = {405, 501}
+# Responses that say nothing about the image itself; never cached, retried on the next run
+RETRY_STATUSES = {408, 425, 429}
+
+
+def is_transient(status):
+    # No status means a timeout or connection error
+    return status is None or status in RETRY_STATUSES or (status >= 500 and status not in HEAD_UNSUPPORTED)
+
+
+def variant_name(digest, name):
+    return f'variants/{digest[:2]}/{digest}-{name}.webp'
+
+
+def _atomic_write(path, raw):
+    # A unique temp file per call: threads of one process may write the same path at once
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f'.{os.path.basename(path)}.', suffix='.tmp', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(raw)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+# Originals addressed by SHA-256 under objects/, variants under variants/, and a SQLite cache
+# of every URL's last check so a URL shared by thousands of records is requested once
+class ImageStore:
+    def __init__(self, root=STORE_ROOT):
+        self.root = root
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(root, 'images.sqlite3'))
+        self._db.execute('CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, status INTEGER, content_type TEXT, '
+                         'hash TEXT, bytes INTEGER, error TEXT, checked_at REAL NOT NULL)')
+        self._db.commit()
+
+    def original_path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], digest)
+
+    def variant_path(self, digest, name):
+        return os.path.join(self.root, variant_name(digest, name))
+
+    def put(self, raw):
+        digest = hashlib.sha256(raw).hexdigest()
+        path = self.original_path(digest)
+        if not os.path.exists(path):
+            _atomic_write(path, raw)
+        return digest
+
+    def cached(self, url):
+        row = self._db.execute('SELECT url, status, content_type, hash, bytes, error FROM urls WHERE url = ?',
+                               (url,)).fetchone()
+        if row is None or is_transient(row[1]):
+            return None
+        return dict(zip(('url', 'status', 'content_type', 'hash', 'bytes', 'error'), row), cached=True)
+
+    def record(self, results):
+        self._db.executemany(
+            'INSERT OR REPLACE INTO urls (url, status, content_type, hash, bytes, error, checked_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(r['url'], r['status'], r['content_type'], r['hash'], r['bytes'], r['error'], time.time())
+             for r in results])
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+
+def _result(url, status=None, content_type=None, digest=None, size=None, error=None):
+    return {'url': url, 'status': status, 'content_type': content_type, 'hash': digest, 'bytes': size,
+            'error': error, 'cached': False, 'transient': digest is None and is_transient(status)}
+
+
+class ImageChecker:
+    """Check and download image URLs over one pooled async client, ``per_host`` requests per host at a time.
+
+    A URL is requested at most once per run, and not at all when the store already has a result
+    for it (unless ``recheck``). Valid images are downloaded into the store. Timeouts, connection
+    errors, 5xx and 429 responses are not cached, so the next run checks those URLs again.
+    """
+
+    def __init__(self, store, per_host=4, max_connections=32, timeout=20.0, recheck=False):
+        self.store = store
+        self.per_host = per_host
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.recheck = recheck
+        self._hosts = {}
+        self._tasks = {}
+        self.stats = {'requested': 0, 'cached': 0, 'valid': 0, 'broken': 0, 'transient': 0, 'downloaded_bytes': 0}
+
+    def _host(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.per_host)
+        return self._hosts[host]
+
+    async def _download(self, client, url):
+        async with client.stream('GET', url) as response:
+            content_type = response.headers.get('content-type', '').split(';')[0].strip()
+            if response.status_code != 200:
+                return _result(url, response.status_code, content_type, error=f'HTTP {response.status_code}')
+            if not content_type.startswith('image/'):
+                return _result(url, response.status_code, content_type, error='not an image')
+            chunks, size = [], 0
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if size > MAX_IMAGE_BYTES:
+                    return _result(url, response.status_code, content_type, error='too large')
+                chunks.append(chunk)
+        raw = b''.join(chunks)
+        self.stats['downloaded_bytes'] += size
+        return _result(url, response.status_code, content_type, self.store.put(raw), size)
+
+    async def _check(self, client, url):
+        async with self._host(url):
+            self.stats['requested'] += 1
+            try:
+                # HEAD rejects dead links and non-images without transferring the body
+                head = await client.head(url)
+                content_type = head.headers.get('content-type', '').split(';')[0].strip()
+                if head.status_code not in HEAD_UNSUPPORTED:
+                    if head.status_code != 200:
+                        return _result(url, head.status_code, content_type, error=f'HTTP {head.status_code}')
+                    if not content_type.startswith('image/'):
+                        return _result(url, head.status_code, content_type, error='not an image')
+                    length = head.headers.get('content-length')
+                    if length and length.isdigit() and int(length) > MAX_IMAGE_BYTES:
+                        return _result(url, head.status_code, content_type, error='too large')
+                return await self._download(client, url)
+            except httpx.HTTPError as e:
+                return _result(url, error=f'{type(e).__name__}: {e}')
+
+    def check(self, client, url):
+        # One task per URL, so concurrent records with the same image share a request
+        if url not in self._tasks:
+            self._tasks[url] = asyncio.ensure_future(self._check(client, url))
+        return self._tasks[url]
+
+    async def run(self, urls):
+        """Return ``{url: result}``; ``result['hash']`` is set for valid images."""
+        results, pending = {}, []
+        for url in dict.fromkeys(urls):
+            cached = None if self.recheck else self.store.cached(url)
+            if cached is not None:
+                self.stats['cached'] += 1
+                results[url] = cached
+            else:
+                pending.append(url)
+        checked = []
+        if pending:
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_connections)
+            async with httpx.AsyncClient(timeout=self.timeout, follow_redirects=True, limits=limits,
+                                         headers={'User-Agent': UserAgent().random}) as client:
+                checked = await asyncio.gather(*(self.check(client, url) for url in pending))
+            self.store.record([result for result in checked if not result['transient']])
+        results.update((result['url'], result) for result in checked)
+        for result in results.values():
+            self.stats['valid' if result['hash'] else 'transient' if result.get('transient') else 'broken'] += 1
+        return results
+
+
+def _make_variants(job):
+    # Runs in a worker process: decode the original once, write every missing variant
+    root, digest = job
+    missing = {name: box for name, box in VARIANTS.items()
+               if not os.path.exists(os.path.join(root, variant_name(digest, name)))}
+    if not missing:
+        return digest, None
+    try:
+        with Image.open(os.path.join(root, 'objects', digest[:2], digest)) as image:
+            # JPEG decoders can scale by 1/2..1/8 while decoding; ask for the largest box needed
+            image.draft('RGB', max(missing.values()))
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+            for name, box in sorted(missing.items(), key=lambda item: item[1], reverse=True):
+                variant = image.copy()
+                variant.thumbnail(box, Image.LANCZOS)
+                encoded = io.BytesIO()
+                variant.save(encoded, 'WEBP', quality=WEBP_QUALITY, method=4)
+                _atomic_write(os.path.join(root, variant_name(digest, name)), encoded.getvalue())
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        return digest, f'{type(e).__name__}: {e}'
+    return digest, None
+
+
+def build_variants(store, digests, workers=None):
+    """Write the missing variants of ``digests`` in a process pool; returns {digest: error} for failures."""
+    failed = {}
+    # Not forked: the caller may have threads running (a server, a heartbeat) that hold a lock
+    context = multiprocessing.get_context('forkserver')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        for digest, error in executor.map(_make_variants, [(store.root, d) for d in digests], chunksize=4):
+            if error:
+                failed[digest] = error
+    return failed
+
+
+def image_fields(results, failed, base_url, clear_broken=False):
+    """{source url: fields to set} from check results and variant failures."""
+    base_url = base_url.rstrip('/')
+    updates = {}
+    for url, result in results.items():
+        digest = result['hash']
+        if digest and digest not in failed:
+            updates[url] = {
+                'image_url': f'{base_url}/{variant_name(digest, "card")}',
+                'image_thumb_url': f'{base_url}/{variant_name(digest, "thumb")}',
+                'image_source_url': url,
+            }
+        elif clear_broken and not result.get('transient'):
+            # Only a definitive answer (404, not an image, ...) clears a record; an outage does not
+            updates[url] = {'image_url': None, 'image_thumb_url': None, 'image_source_url': url}
+    return updates
+
+
+def source_url(record):
+    # After a first run image_url points at the store; the original stays in image_source_url
+    return record.get('image_source_url') or record.get('image_url')
+
+
+def process(urls, store, per_host=4, max_connections=32, workers=None, recheck=False):
+    started = time.perf_counter()
+    checker = ImageChecker(store, per_host=per_host, max_connections=max_connections, recheck=recheck)
+    results = asyncio.run(checker.run(urls))
+    checked = time.perf_counter() - started
+    failed = build_variants(store, sorted({r['hash'] for r in results.values() if r['hash']}), workers)
+    for digest, error in list(failed.items())[:10]:
+        print(f"Could not resize {digest}: {error}")
+    stats = dict(checker.stats, urls=len(results), variant_failures=len(failed),
+                 check_seconds=round(checked, 2), seconds=round(time.perf_counter() - started, 2))
+    return results, failed, stats
+
+
+def ensure_image_indexes(collection):
+    # The two branches of update_collection's filter, so each UpdateMany is an index lookup
+    collection.create_index([('image_source_url', ASCENDING)], name='image_source_url')
+    collection.create_index([('image_url', ASCENDING)], name='image_url')
+
+
+def update_collection(collection, updates, batch_size=1000):
+    """One UpdateMany per source URL: records sharing an image are rewritten by a single operation."""
+    ensure_image_indexes(collection)
+    ops, modified = [], 0
+    for url, fields in updates.items():
+        query = {'$or': [{'image_source_url': url}, {'image_source_url': {'$exists': False}, 'image_url': url}]}
+        ops.append(UpdateMany(query, {'$set': fields}))
+        if len(ops) >= batch_size:
+            modified += collection.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        modified += collection.bulk_write(ops, ordered=False).modified_count
+    return modified
+
+
+def collection_urls(collection):
+    pipeline = [
+        {'$project': {'source': {'$ifNull': ['$image_source_url', '$image_url']}}},
+        {'$match': {'source': {'$type': 'string'}}},
+        {'$group': {'_id': '$source'}},
+    ]
+    return [doc['_id'] for doc in collection.aggregate(pipeline, allowDiskUse=True)]
+
+
+def apply_to_records(records, updates):
+    for record in records:
+        fields = updates.get(source_url(record))
+        if fields:
+            record.update(fields)
+        yield record
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate image URLs, store resized WebP variants and rewrite image_url")
+    parser.add_argument("source", nargs="?", default="universities_updated.json", help=".json array or .ndjson")
+    parser.add_argument("output", nargs="?", default="updated.json", help=".json array or .ndjson")
+    parser.add_argument("--mongo", action="store_true", help="update the institutions collection instead of files")
+    parser.add_argument("--db", default="shiksha_data")
+    parser.add_argument("--collection", default="institutions")
+    parser.add_argument("--base-url", default=os.getenv("IMAGE_BASE_URL"),
+                        help="public URL the store directory is served from (default: $IMAGE_BASE_URL)")
+    parser.add_argument("--store", default=STORE_ROOT)
+    parser.add_argument("--per-host", type=int, default=4, help="concurrent requests per host")
+    parser.add_argument("--connections", type=int, default=32, help="connection pool size")
+    parser.add_argument("--workers", type=int, help="resize processes (default: all cores)")
+    parser.add_argument("--recheck", action="store_true", help="ignore cached results from earlier runs")
+    parser.add_argument("--clear-broken", action="store_true", help="empty image_url of records whose image is broken")
+    parser.add_argument("--no-top-lists", action="store_true", help="skip rebuilding top_lists afterwards")
+    args = parser.parse_args()
+    if not args.base_url:
+        parser.error("--base-url or IMAGE_BASE_URL is required")
+
+    store = ImageStore(args.store)
+    try:
+        if args.mongo:
+            from dinserter import get_client, get_collection
+            from top_lists import TopLists
+
+            collection = get_collection(args.db, args.collection)
+            try:
+                results, failed, stats = process(collection_urls(collection), store, args.per_host,
+                                                 args.connections, args.workers, args.recheck)
+                updates = image_fields(results, failed, args.base_url, args.clear_broken)
+                stats['modified'] = update_collection(collection, updates)
+                if not args.no_top_lists and stats['modified']:
+                    # List entries carry image URLs
+                    TopLists(collection).rebuild()
+            finally:
+                get_client().close()
+        else:
+            urls = [url for url in map(source_url, read_records(args.source)) if isinstance(url, str)]
+            results, failed, stats = process(urls, store, args.per_host, args.connections, args.workers, args.recheck)
+            updates = image_fields(results, failed, args.base_url, args.clear_broken)
+            stats['written'] = write_records(apply_to_records(read_records(args.source), updates), args.output)
+    finally:
+        store.close()
+    print(", ".join(f"{key}: {value}" for key, value in stats.items()))
@@ -1,6 +1,8 @@
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure, OperationFailure
 from dotenv import load_dotenv
+from scoring import score
+from search_index import add_search_terms
 
 import json
 import os
@@ -19,7 +21,8 @@ def save_to_mongodb(data, db_name='shiksha_data', collection_name='institutions'
         db = client[db_name]
         collection = db[collection_name]
         
-        # Insert data
+        # Insert data, with the search terms the API's indexed search matches on
+        add_search_terms(data)
         result = collection.insert_one(data)
         print(f"Data inserted with ID: {result.inserted_id}")
         
@@ -128,7 +131,8 @@ if __name__ == "__main__":
             'website': website
         },
         'courses_offered': courses_offered,
-        'eligibility_criteria': college_eligibility,
+        'eligibility_criteria': [{'name': course['name'], 'required': course['eligibility']}
+                                 for course in courses_offered],
         'acceptance_exams': entrance_exams,
         'top_recruiters': top_recruiters,
         'placements': placements,
@@ -137,7 +141,7 @@ if __name__ == "__main__":
         'field_taught': field_taught
     }
 
-    institution_data['score'] = institution_data['placements']['average_salary'] * institution_data['placements']['placement_rate'] / 100 + institution_data['rating'] * 1000
+    institution_data['score'] = score(institution_data)
 
     print(institution_data)
 
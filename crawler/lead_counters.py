@@ -0,0 +1,320 @@
+import argparse
+import math
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import OperationFailure
+
+from top_lists import ALL_KEY, list_key
+
+COUNTERS = 'lead_counters'
+WATERMARKS = 'lead_watermarks'
+DEFAULT_BATCH_SIZE = 5000
+
+# Counter rows are per day plus one running total per key
+TOTAL = 'total'
+# Days roll over at midnight IST, when the traffic does
+TIMEZONE = timezone(timedelta(hours=5, minutes=30))
+
+# Every API instance mints its own ObjectIds, so a lead stamped a moment earlier can be committed after
+# a later one; catch-up stays this far behind the clock so the watermark never skips one
+SETTLE_SECONDS = 60
+
+# Applications within this many days make up an institution's `demand`
+DEMAND_DAYS = 30
+
+# Watermark document holding the change stream's resume token
+STREAM_STATE = '_change_stream'
+# ChangeStreamHistoryLost: the resume token has fallen off the oplog
+HISTORY_LOST = 286
+
+# Collection written by index.js -> (lead kind, {counter dimension: form field})
+SOURCES = {
+    'shiksha_applied_colleges': ('application', {'college': 'college_id'}),
+    'shiksha_data': ('counseling', {'course': 'interestedCourse'}),
+    'shiksha_responses': ('response', {'course': 'course', 'state': 'state', 'city': 'city'}),
+    'shiksha_contact': ('contact', {}),
+}
+
+
+def lead_day(object_id):
+    # The schemas have no timestamps; the ObjectId's creation second is the submission time
+    return object_id.generation_time.astimezone(TIMEZONE).strftime('%Y-%m-%d')
+
+
+def lead_keys(doc, dimensions):
+    """Counter keys a lead adds to: ``all`` plus ``college:<id>`` and the same
+    ``<course|city|state>:<normalized tokens>`` keys top_lists.py uses."""
+    keys = [ALL_KEY]
+    for dimension, field in dimensions.items():
+        value = doc.get(field)
+        if not isinstance(value, str) or not value.strip():
+            continue
+        if dimension == 'college':
+            keys.append(f'college:{value.strip()}')
+        else:
+            key = list_key(dimension, value)
+            if key:
+                keys.append(key)
+    return keys
+
+
+def count_leads(docs, kind, dimensions, increments=None):
+    """Add ``docs`` to ``increments``: {(key, day): Counter({kind: n})}, for the day and the total."""
+    increments = defaultdict(Counter) if increments is None else increments
+    for doc in docs:
+        day = lead_day(doc['_id'])
+        for key in lead_keys(doc, dimensions):
+            increments[key, day][kind] += 1
+            increments[key, TOTAL][kind] += 1
+    return increments
+
+
+def _counter_ops(increments, now):
+    ops = []
+    for (key, day), kinds in increments.items():
+        inc = {'count': sum(kinds.values())}
+        inc.update((f'kinds.{kind}', n) for kind, n in kinds.items())
+        ops.append(UpdateOne({'_id': f'{key}|{day}'},
+                             {'$inc': inc, '$set': {'updated_at': now}, '$setOnInsert': {'key': key, 'day': day}},
+                             upsert=True))
+    return ops
+
+
+def _supports_transactions(client):
+    # Transactions need a replica set or a sharded cluster; a standalone server (or mongomock) has neither
+    try:
+        hello = client.admin.command('hello')
+    except (OperationFailure, NotImplementedError):
+        return False
+    return 'setName' in hello or hello.get('msg') == 'isdbgrid'
+
+
+class LeadCounters:
+    """Materialized lead counters in ``lead_counters``, kept current from the raw form collections.
+
+    Each counter document is ``{_id: '<key>|<day>', key, day, count, kinds: {application, ...}}``
+    where ``day`` is ``YYYY-MM-DD`` or ``total``. ``catch_up`` reads each source past its
+    watermark in ``_id`` order; ``follow`` applies inserts from a change stream as they happen.
+    Counter increments and the new watermark are written in one transaction when the server
+    supports it; on a standalone server a crash between the two writes recounts that batch.
+    """
+
+    def __init__(self, db, batch_size=DEFAULT_BATCH_SIZE, settle_seconds=SETTLE_SECONDS):
+        self.db = db
+        self.counters = db[COUNTERS]
+        self.watermarks = db[WATERMARKS]
+        self.batch_size = batch_size
+        self.settle_seconds = settle_seconds
+        self.transactions = _supports_transactions(db.client)
+
+    def ensure_indexes(self):
+        self.counters.create_index([('key', ASCENDING), ('day', ASCENDING)], name='key_day')
+        # "Most applied-to colleges today" is one range of this index
+        self.counters.create_index([('day', ASCENDING), ('count', DESCENDING)], name='day_count')
+
+    def watermark(self, source):
+        doc = self.watermarks.find_one({'_id': source})
+        return doc['last_id'] if doc else None
+
+    def _write(self, increments, marks, stream_state, session=None):
+        now = datetime.now(timezone.utc)
+        ops = _counter_ops(increments, now)
+        if ops:
+            self.counters.bulk_write(ops, ordered=False, session=session)
+        # $max keeps a watermark from moving backwards when the stream delivers an older id
+        for source, last_id in marks.items():
+            self.watermarks.update_one({'_id': source}, {'$max': {'last_id': last_id}, '$set': {'updated_at': now}},
+                                       upsert=True, session=session)
+        if stream_state is not None:
+            self.watermarks.update_one({'_id': STREAM_STATE}, {'$set': {**stream_state, 'updated_at': now}},
+                                       upsert=True, session=session)
+
+    def _apply(self, increments, marks, stream_state=None):
+        if not self.transactions:
+            # Counters first: a crash before the watermark moves recounts, it never drops leads
+            self._write(increments, marks, stream_state)
+            return
+        with self.db.client.start_session() as session:
+            session.with_transaction(lambda s: self._write(increments, marks, stream_state, s))
+
+    def catch_up(self, sources=SOURCES, settle_seconds=None):
+        """Count every lead past each source's watermark, in batches; returns {source: leads counted}."""
+        settle = self.settle_seconds if settle_seconds is None else settle_seconds
+        upper = ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(seconds=settle))
+        counted = {}
+        for source in sources:
+            kind, dimensions = SOURCES[source]
+            projection = dict.fromkeys(dimensions.values(), 1)
+            last_id = self.watermark(source)
+            counted[source] = 0
+            while True:
+                query = {'_id': {'$lt': upper}}
+                if last_id is not None:
+                    query['_id']['$gt'] = last_id
+                batch = list(self.db[source].find(query, projection or {'_id': 1})
+                             .sort('_id', ASCENDING).limit(self.batch_size))
+                if not batch:
+                    break
+                last_id = batch[-1]['_id']
+                self._apply(count_leads(batch, kind, dimensions), {source: last_id})
+                counted[source] += len(batch)
+                if len(batch) < self.batch_size:
+                    break
+        return counted
+
+    def follow(self, idle_flush_seconds=1.0):
+        """Apply inserts into the source collections from a change stream until interrupted.
+
+        Needs a replica set (a single-node one is enough). Without a saved resume token the
+        backlog is counted by ``catch_up`` first. Events for leads at or below a source's
+        watermark were already counted and are skipped.
+        """
+        state = self.watermarks.find_one({'_id': STREAM_STATE}) or {}
+        token = state.get('resume_token')
+        pipeline = [{'$match': {'operationType': 'insert', 'ns.coll': {'$in': list(SOURCES)}}}]
+        try:
+            stream = self.db.watch(pipeline, resume_after=token, max_await_time_ms=int(idle_flush_seconds * 1000))
+        except OperationFailure as e:
+            if e.code != HISTORY_LOST:
+                raise
+            print('Resume token is no longer in the oplog; catching up from the watermarks')
+            self.watermarks.delete_one({'_id': STREAM_STATE})
+            return self.follow(idle_flush_seconds)
+        with stream:
+            if token is None:
+                # The stream is open, so nothing inserted from here on is missed while the backlog is read
+                print(f"Caught up: {self.catch_up(settle_seconds=0)}")
+            floors = {source: self.watermark(source) for source in SOURCES}
+            pending = defaultdict(list)
+            size = 0
+            while stream.alive:
+                change = stream.try_next()
+                if change is not None:
+                    source, doc = change['ns']['coll'], change['fullDocument']
+                    if floors[source] is None or doc['_id'] > floors[source]:
+                        pending[source].append(doc)
+                        size += 1
+                # Flush full batches, and whatever is pending once the stream goes quiet
+                if size >= self.batch_size or (change is None and size):
+                    self._flush_stream(pending, stream.resume_token)
+                    pending, size = defaultdict(list), 0
+
+    def _flush_stream(self, pending, resume_token):
+        increments = defaultdict(Counter)
+        marks = {}
+        for source, docs in pending.items():
+            kind, dimensions = SOURCES[source]
+            count_leads(docs, kind, dimensions, increments)
+            marks[source] = max(doc['_id'] for doc in docs)
+        self._apply(increments, marks, {'resume_token': resume_token})
+        print(f"Counted {sum(len(docs) for docs in pending.values())} leads from the change stream")
+
+    def counts(self, key, days=None):
+        """{day: count} for one counter key (e.g. ``college:<id>``, ``course:b tech``), newest first."""
+        query = {'key': key, 'day': {'$ne': TOTAL}}
+        cursor = self.counters.find(query, {'day': 1, 'count': 1}).sort('day', DESCENDING)
+        if days:
+            cursor = cursor.limit(days)
+        return {doc['day']: doc['count'] for doc in cursor}
+
+    def rebuild(self):
+        """Drop the counters and watermarks and count every lead again."""
+        self.counters.delete_many({})
+        self.watermarks.delete_many({})
+        return self.catch_up()
+
+
+def recent_applications(counters, days=DEMAND_DAYS, today=None):
+    """{college_id: applications} over the last ``days`` days, read from the counter rows."""
+    today = today or datetime.now(TIMEZONE).date()
+    first = (today - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    pipeline = [
+        {'$match': {'key': {'$regex': '^college:'}, 'day': {'$gte': first, '$ne': TOTAL}}},
+        {'$group': {'_id': '$key', 'applications': {'$sum': '$kinds.application'}}},
+    ]
+    return {doc['_id'].split(':', 1)[1]: doc['applications'] for doc in counters.aggregate(pipeline)}
+
+
+def refresh_demand(institutions, counters, days=DEMAND_DAYS):
+    """Set each institution's ``demand`` to log(1 + applications in the last ``days`` days).
+
+    Only documents whose value changes are written; returns their ``_id``s.
+    """
+    demand = {}
+    for college_id, applications in recent_applications(counters, days).items():
+        try:
+            demand[ObjectId(college_id)] = round(math.log1p(applications), 4)
+        except (InvalidId, TypeError):
+            continue
+    # Institutions whose applications all fell out of the window
+    stale = institutions.find({'demand': {'$gt': 0}, '_id': {'$nin': list(demand)}}, {'_id': 1})
+    changed = [doc['_id'] for doc in stale]
+    if changed:
+        institutions.update_many({'_id': {'$in': changed}}, {'$set': {'demand': 0.0}})
+    if demand:
+        cursor = institutions.find({'_id': {'$in': list(demand)}}, {'demand': 1})
+        current = {doc['_id']: doc.get('demand') for doc in cursor}
+        updated = [_id for _id, value in demand.items() if _id in current and current[_id] != value]
+        if updated:
+            institutions.bulk_write([UpdateOne({'_id': _id}, {'$set': {'demand': demand[_id]}}) for _id in updated],
+                                    ordered=False)
+        changed.extend(updated)
+    print(f"Demand updated on {len(changed)} institutions ({len(demand)} with applications in {days} days)")
+    return changed
+
+
+if __name__ == '__main__':
+    from dinserter import get_client
+
+    parser = argparse.ArgumentParser(description='Aggregate form submissions into per-college/course/day counters')
+    parser.add_argument('--db', default='shiksha_data')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--interval', type=float, help='repeat the catch-up every N seconds instead of once')
+    parser.add_argument('--follow', action='store_true',
+                        help='apply inserts from a change stream (needs a replica set)')
+    parser.add_argument('--rebuild', action='store_true', help='drop the counters and count every lead again')
+    parser.add_argument('--settle-seconds', type=float, default=SETTLE_SECONDS)
+    parser.add_argument('--demand', action='store_true', help="refresh institutions' demand, then rescore")
+    parser.add_argument('--demand-days', type=int, default=DEMAND_DAYS)
+    args = parser.parse_args()
+
+    db = get_client()[args.db]
+    lead_counters = LeadCounters(db, args.batch_size, args.settle_seconds)
+    lead_counters.ensure_indexes()
+
+    def refresh():
+        from scoring import DEFAULT_WEIGHTS, rescore
+        from top_lists import TopLists
+
+        if not refresh_demand(db['institutions'], lead_counters.counters, args.demand_days):
+            return
+        if not DEFAULT_WEIGHTS['demand']:
+            print("DEFAULT_WEIGHTS['demand'] is 0; scores are unchanged")
+            return
+        top_lists = TopLists(db['institutions'])
+        rescore(db['institutions'], on_change=top_lists.collect_ids)
+        top_lists.flush()
+
+    try:
+        if args.follow:
+            lead_counters.follow()
+        else:
+            while True:
+                started = time.perf_counter()
+                counted = lead_counters.rebuild() if args.rebuild else lead_counters.catch_up()
+                args.rebuild = False
+                print(f"Counted {sum(counted.values())} leads in {time.perf_counter() - started:.2f}s: {counted}")
+                if args.demand:
+                    refresh()
+                if not args.interval:
+                    break
+                time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        get_client().close()
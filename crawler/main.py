@@ -1,7 +1,13 @@
-```python
+import argparse
+import functools
 import json
+import queue
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
@@ -9,10 +15,30 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 from fake_useragent import UserAgent
-from bs4 import BeautifulSoup
+
+from extractor import extract_institution
+from metrics import METRICS, add_arguments, finish, profile_page, profiler_from_args
+
+
+# Resolve (and download if needed) the chromedriver binary once per process
+@functools.lru_cache(maxsize=None)
+def _driver_path():
+    return ChromeDriverManager().install()
+
+
+# URL patterns the lean profile blocks through Chrome DevTools
+BLOCKED_URL_PATTERNS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico',
+    '*.mp4', '*.webm', '*.mp3',
+    '*.woff', '*.woff2', '*.ttf', '*.otf',
+    '*googletagmanager.com*', '*google-analytics.com*', '*doubleclick.net*', '*googlesyndication.com*',
+    '*facebook.net*', '*hotjar.com*', '*clarity.ms*', '*moengage.com*',
+]
+
 
 # Function to set up Selenium WebDriver with anti-detection measures
-def setup_driver():
+# `lean=True` loads eagerly and skips images, media, fonts and known third-party scripts
+def setup_driver(lean=False):
     ua = UserAgent()
     chrome_options = Options()
     chrome_options.add_argument('--headless')  # Run in headless mode
@@ -21,111 +47,237 @@ def setup_driver():
     chrome_options.add_argument('--disable-dev-shm-usage')
     chrome_options.add_argument(f'user-agent={ua.random}')  # Random user agent
     chrome_options.add_argument('--window-size=1920,1080')
-    
+
     # Optional: Add proxy if needed (uncomment and configure)
     # chrome_options.add_argument('--proxy-server=http://your-proxy:port')
-    
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
+
+    if lean:
+        # Return from driver.get() at DOMContentLoaded instead of the full load event
+        chrome_options.page_load_strategy = 'eager'
+        chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+        # Performance log is read back for per-page transfer sizes
+        chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+    with METRICS.time('driver_startup'):
+        driver = webdriver.Chrome(service=Service(_driver_path()), options=chrome_options)
+        if lean:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
     return driver
 
-# Function to scrape institution details from Shiksha.com
-def scrape_shiksha_institution(url):
-    driver = None
-    try:
-        # Set up Selenium driver
-        driver = setup_driver()
+
+# Long-lived drivers shared by crawl workers; each driver is recycled after
+# `max_pages` pages or as soon as it raises a WebDriverException
+class DriverPool:
+    def __init__(self, size=4, max_pages=50, lean=False):
+        self.size = size
+        self.max_pages = max_pages
+        self.lean = lean
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+        self.recycled = 0
+
+    def _new_driver(self):
+        return {'driver': setup_driver(lean=self.lean), 'pages': 0}
+
+    def _take(self):
+        while True:
+            with self._lock:
+                try:
+                    return self._idle.get_nowait()
+                except queue.Empty:
+                    pass
+                if self._created < self.size:
+                    self._created += 1
+                    break
+            # Re-check capacity periodically: a discarded driver frees a slot without refilling the queue
+            try:
+                return self._idle.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        try:
+            return self._new_driver()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def _discard(self, slot):
+        METRICS.inc('driver_recycled_total')
+        try:
+            slot['driver'].quit()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+            self.recycled += 1
+
+    @contextmanager
+    def driver(self):
+        if self._closed:
+            raise RuntimeError('DriverPool is closed')
+        slot = self._take()
+        try:
+            yield slot['driver']
+        except TimeoutException:
+            # A slow page is not a broken browser
+            METRICS.inc('timeouts_total')
+            self._release(slot)
+            raise
+        except WebDriverException:
+            METRICS.inc('driver_errors_total')
+            self._discard(slot)
+            raise
+        except BaseException:
+            self._release(slot)
+            raise
+        self._release(slot)
+
+    def _release(self, slot):
+        slot['pages'] += 1
+        if self._closed or slot['pages'] >= self.max_pages:
+            self._discard(slot)
+        else:
+            self._idle.put(slot)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                slot = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(slot)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def fetch_page_source(driver, url):
+    with METRICS.time('driver_get'):
         driver.get(url)
-        
-        # Wait for the page to load (adjust timeout as needed)
+
+    # Wait for the page to load (adjust timeout as needed)
+    with METRICS.time('wait'):
         WebDriverWait(driver, 10).until(
             EC.presence_of_element_located((By.TAG_NAME, 'body'))
         )
-        
-        # Get page source and parse with BeautifulSoup for easier querying
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-        
-        # Initialize dictionary to store extracted data
-        institution_data = {}
-        
-        # Extract institution type (private/government)
-        try:
-            institution_type_elem = soup.select_one('.institute-type-class')  # Update selector
-            institution_data['institution_type'] = institution_type_elem.text.strip() if institution_type_elem else 'Not found'
-        except:
-            institution_data['institution_type'] = 'Not found'
-        
-        # Extract entrance exams
-        try:
-            exams_elem = soup.select_one('.entrance-exams-class')  # Update selector
-            institution_data['entrance_exams'] = exams_elem.text.strip() if exams_elem else 'Not found'
-        except:
-            institution_data['entrance_exams'] = 'Not found'
-        
-        # Extract official website
-        try:
-            website_elem = soup.select_one('.official-website-class a')  # Update selector
-            institution_data['official_website'] = website_elem['href'] if website_elem else 'Not found'
-        except:
-            institution_data['official_website'] = 'Not found'
-        
-        # Extract admission process
-        try:
-            admission_process_elem = soup.select_one('.admission-process-class')  # Update selector
-            institution_data['admission_process'] = admission_process_elem.text.strip() if admission_process_elem else 'Not found'
-        except:
-            institution_data['admission_process'] = 'Not found'
-        
-        # Extract required documents
-        try:
-            documents_elem = soup.select_one('.required-documents-class')  # Update selector
-            institution_data['required_documents'] = documents_elem.text.strip() if documents_elem else 'Not found'
-        except:
-            institution_data['required_documents'] = 'Not found'
-        
-        # Extract course and fee structure
-        try:
-            course_fee_elem = soup.select_one('.course-fee-class')  # Update selector
-            institution_data['course_fee_structure'] = course_fee_elem.text.strip() if course_fee_elem else 'Not found'
-        except:
-            institution_data['course_fee_structure'] = 'Not found'
-        
-        # Extract placement details (average, highest, rate)
-        try:
-            avg_salary_elem = soup.select_one('.avg-salary-class')  # Update selector
-            highest_salary_elem = soup.select_one('.highest-salary-class')  # Update selector
-            placement_rate_elem = soup.select_one('.placement-rate-class')  # Update selector
-            institution_data['placements'] = {
-                'average_salary': avg_salary_elem.text.strip() if avg_salary_elem else 'Not found',
-                'highest_salary': highest_salary_elem.text.strip() if highest_salary_elem else 'Not found',
-                'placement_rate': placement_rate_elem.text.strip() if placement_rate_elem else 'Not found'
-            }
-        except:
-            institution_data['placements'] = {
-                'average_salary': 'Not found',
-                'highest_salary': 'Not found',
-                'placement_rate': 'Not found'
-            }
-        
-        # Extract top recruiters
-        try:
-            recruiters_elem = soup.select_one('.top-recruiters-class')  # Update selector
-            institution_data['top_recruiters'] = recruiters_elem.text.strip() if recruiters_elem else 'Not found'
-        except:
-            institution_data['top_recruiters'] = 'Not found'
-        
-        return institution_data
-    
+    with METRICS.time('page_source'):
+        return driver.page_source
+
+
+def _bytes_transferred(driver):
+    # Draining the performance log also resets it for the next page
+    total = 0
+    for entry in driver.get_log('performance'):
+        message = json.loads(entry['message'])['message']
+        if message['method'] == 'Network.loadingFinished':
+            total += message['params'].get('encodedDataLength', 0)
+    return int(total)
+
+
+# Function to fetch a page with a lean driver, waiting only until the spec's required selectors exist
+# Returns (page_source, {'bytes': ..., 'time_to_data': ...}); time_to_data is None if the wait timed out
+def fetch_page_lean(driver, url, selectors=None, timeout=10):
+    selectors = extract_institution.required_selectors if selectors is None else selectors
+    started = time.perf_counter()
+    with METRICS.time('driver_get'):
+        driver.get(url)
+    waited = time.perf_counter()
+    try:
+        WebDriverWait(driver, timeout).until(
+            lambda d: all(d.find_elements(By.CSS_SELECTOR, selector) for selector in selectors)
+        )
+        time_to_data = round(time.perf_counter() - started, 3)
+    except TimeoutException:
+        # Some pages legitimately lack a field; parse whatever rendered
+        METRICS.inc('wait_timeouts_total')
+        time_to_data = None
+    METRICS.observe('stage_seconds', time.perf_counter() - waited, stage='wait')
+    with METRICS.time('page_source'):
+        html = driver.page_source
+    transferred = _bytes_transferred(driver)
+    METRICS.inc('page_bytes_total', transferred)
+    return html, {'bytes': transferred, 'time_to_data': time_to_data}
+
+
+# Function to extract institution details from a rendered Shiksha page
+# Fields and selectors are declared once in extractor.INSTITUTION_SPEC
+def parse_institution(html):
+    with METRICS.time('parse'):
+        return extract_institution(html)
+
+
+# Function to scrape institution details from Shiksha.com
+# Pass a pooled `driver` to reuse it; otherwise a throwaway driver is started and quit
+def scrape_shiksha_institution(url, driver=None):
+    owned = driver is None
+    try:
+        if owned:
+            driver = setup_driver()
+        data = parse_institution(fetch_page_source(driver, url))
+        METRICS.inc('pages_total', result='ok')
+        return data
+
     except Exception as e:
         print(f"Error scraping the page: {e}")
+        METRICS.inc('pages_total', result='error')
         return None
     finally:
-        if driver:
+        if owned and driver:
             driver.quit()
 
+
+def _scrape_pooled(pool, url, profiler=None):
+    try:
+        with profile_page(profiler, url), pool.driver() as driver:
+            if pool.lean:
+                html, page_stats = fetch_page_lean(driver, url)
+                print(f"{url}: {page_stats['bytes'] / 1024:.0f} KiB, time to data {page_stats['time_to_data']}s")
+            else:
+                html = fetch_page_source(driver, url)
+            data = parse_institution(html)
+    except Exception as e:
+        print(f"Error scraping {url}: {e}")
+        METRICS.inc('pages_total', result='error')
+        return None
+    METRICS.inc('pages_total', result='ok')
+    if data is not None:
+        data['url'] = url
+    return data
+
+
+# Function to crawl many URLs across a fixed-size pool of long-lived drivers
+# Pass a metrics.PageProfiler as `profiler` to profile a sample of pages
+def crawl(urls, workers=4, pages_per_driver=50, lean=False, profiler=None):
+    results = []
+    started = time.perf_counter()
+    with DriverPool(size=workers, max_pages=pages_per_driver, lean=lean) as pool:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for data in executor.map(lambda url: _scrape_pooled(pool, url, profiler), urls):
+                if data:
+                    results.append(data)
+        recycled = pool.recycled
+    elapsed = time.perf_counter() - started
+    print(f"Crawled {len(results)}/{len(urls)} pages in {elapsed:.1f}s "
+          f"({len(urls) / elapsed * 3600:.0f} pages/hour, {recycled} drivers recycled)")
+    return results
+
+
+def load_urls(filename):
+    with open(filename, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
 # Function to save data to JSON file
 def save_to_json(data, filename='institution_data.json'):
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
+        with METRICS.time('save'), open(filename, 'w', encoding='utf-8') as f:
             json.dump(data, f, indent=4)
         print(f"Data saved to {filename}")
     except Exception as e:
@@ -133,87 +285,38 @@ def save_to_json(data, filename='institution_data.json'):
 
 # Main execution
 if __name__ == "__main__":
-    # Example URL (replace with the specific institution's Shiksha page URL)
-    url = "https://www.shiksha.com/university/siksha-o-anusandhan-university-soa-bhubaneswar-38098"
-    
-    # Scrape the institution details
-    data = scrape_shiksha_institution(url)
-    
-    if data:
-        # Print the extracted data
-        print(json.dumps(data, indent=4))
-        
-        # Save to JSON file
-        save_to_json(data)
-    
-    # Add a delay to avoid overwhelming the server
-    time.sleep(2)
-```
-
-**How to Address the Access Denied Error:**
-1. **Random User Agents**: The script uses `fake_useragent` to rotate user agents, making it harder for the website to detect automation.
-2. **Headless Mode Tweaks**: Options like `--no-sandbox` and `--disable-dev-shm-usage` reduce detection in headless Chrome.
-3. **Proxies**: If the error persists, consider using a proxy service (uncomment the proxy line and configure with a service like Bright Data or ProxyMesh). This can bypass IP-based blocks.
-4. **CAPTCHA Handling**: If a CAPTCHA is present, Selenium cannot solve it automatically. You may need to:
-   - Use a CAPTCHA-solving service (e.g., 2Captcha) with API integration.
-   - Manually solve the CAPTCHA by running Selenium in non-headless mode (`chrome_options.add_argument('--headless')` removed) and interacting with the browser.
-5. **Rate Limiting**: The script includes a `time.sleep(2)` to avoid rapid requests. Increase this delay if needed.
-6. **Browser Fingerprinting**: Some websites detect automation via browser behavior. The script mimics a real browser, but advanced protections may require JavaScript execution tweaks or tools like `undetected-chromedriver` (`pip install undetected-chromedriver`).
-
-**Optimizing Performance:**
-- **Explicit Waits**: The script uses `WebDriverWait` to wait only until the page’s body is loaded, reducing wait time compared to parsing the entire page with BeautifulSoup alone.
-- **Targeted Parsing**: BeautifulSoup is used only on the rendered page source, focusing on specific selectors to minimize processing.
-- **Selector Updates**: Inspect the webpage (right-click > Inspect in Chrome) to find the correct class names or IDs for each data point (e.g., `.institute-type-class`). Update the `select_one` calls accordingly. For example, Shiksha might use classes like `.institute-details`, `.admission-info`, or `.placement-stats`.
-
-**Example JSON Output (Hypothetical for SOA University)**:
-```json
-{
-    "institution_type": "Private",
-    "entrance_exams": "SAAT, JEE Main, NEET, CAT/MAT",
-    "official_website": "https://www.soa.ac.in",
-    "admission_process": "Apply via SAAT, qualify entrance exam, document verification, fee payment",
-    "required_documents": "Not found",
-    "course_fee_structure": "B.Tech: INR 5.1-11 lakhs per annum, MBA: INR 1.8-9 lakhs per annum",
-    "placements": {
-        "average_salary": "INR 5 LPA",
-        "highest_salary": "INR 46 LPA",
-        "placement_rate": "90%"
-    },
-    "top_recruiters": "Accenture, Adani, Cognizant, TCS, Infosys, Wipro"
-}
-```
-
-**Steps to Run:**
-1. Install dependencies: `pip install selenium webdriver-manager user-agents beautifulsoup4`
-2. Replace the `url` variable with the specific Shiksha page URL if different.
-3. Inspect the target page’s HTML to update CSS selectors (e.g., `.institute-type-class`) to match the actual structure.
-4. Run the script: `python shiksha_scraper_selenium.py`.
-5. Check the console output and the generated `institution_data.json` file.
-
-**Troubleshooting the Access Denied Error:**
-- **Test in Non-Headless Mode**: Remove `--headless` from `chrome_options` to open a visible browser and check if a CAPTCHA or login page appears.
-- **Proxy Setup**: If IP blocking is suspected, use a proxy service. Example:
-  ```python
-  chrome_options.add_argument('--proxy-server=http://proxy-provider:port')
-  ```
-  Replace with credentials from a proxy provider.
-- **Advanced Anti-Detection**: Replace `webdriver.Chrome` with `undetected_chromedriver`:
-  ```python
-  import undetected_chromedriver as uc
-  driver = uc.Chrome(options=chrome_options)
-  ```
-  Install: `pip install undetected-chromedriver`.
-- **Manual Inspection**: If the error persists, visit the URL manually in a browser to check for CAPTCHAs, paywalls, or region-based restrictions.
-- **Alternative Sources**: If scraping fails, consider checking the institution’s official website (e.g., https://www.soa.ac.in) or contacting Shiksha support for API access.
-
-**Ethical Considerations:**
-- Check Shiksha’s terms of service (https://www.shiksha.com/terms-of-use) for scraping policies.
-- Avoid excessive requests by keeping the delay (`time.sleep(2)`) or increasing it.
-- If possible, explore official APIs or contact Shiksha for data access to avoid scraping.
-
-**Next Steps:**
-- If you provide the specific institution name or URL, I can help refine the selectors or test alternative approaches.
-- If the error persists, let me know the exact error message or behavior (e.g., CAPTCHA prompt), and I can suggest specific workarounds, such as CAPTCHA-solving services or alternative data sources.
-- If you want to scrape multiple institutions, I can modify the script to loop through a list of URLs.
-
-Let me know how it goes or if you need further tweaks!
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Scrape institution pages from Shiksha.com')
+    parser.add_argument('urls', nargs='*', help='institution page URLs')
+    parser.add_argument('--url-file', help='file with one URL per line')
+    parser.add_argument('--workers', type=int, default=4, help='number of long-lived browsers')
+    parser.add_argument('--pages-per-driver', type=int, default=50, help='recycle a browser after this many pages')
+    parser.add_argument('--lean', action='store_true', help='block heavy resources and wait only for required fields')
+    parser.add_argument('--output', default='institution_data.json')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    urls = list(args.urls)
+    if args.url_file:
+        urls += load_urls(args.url_file)
+
+    if not urls:
+        # Example URL (replace with the specific institution's Shiksha page URL)
+        url = "https://www.shiksha.com/university/siksha-o-anusandhan-university-soa-bhubaneswar-38098"
+
+        # Scrape the institution details
+        data = scrape_shiksha_institution(url)
+
+        if data:
+            # Print the extracted data
+            print(json.dumps(data, indent=4))
+
+            # Save to JSON file
+            save_to_json(data, args.output)
+
+        # Add a delay to avoid overwhelming the server
+        time.sleep(2)
+    else:
+        save_to_json(crawl(urls, workers=args.workers, pages_per_driver=args.pages_per_driver, lean=args.lean,
+                           profiler=profiler_from_args(args)),
+                     args.output)
+    finish(args)
@@ -0,0 +1,287 @@
+import cProfile
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+from records import atomic_writer
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+PREFIX = 'crawler'
+
+# Upper bounds in seconds; covers a parse (milliseconds) up to a browser start or a slow page load
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram, exported in Prometheus's cumulative ``le`` form."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        # Linear interpolation inside the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 4),
+            'mean': round(self.sum / self.count, 4) if self.count else 0.0,
+            'p50': round(self.quantile(0.5), 4),
+            'p95': round(self.quantile(0.95), 4),
+            'p99': round(self.quantile(0.99), 4),
+            'max': round(self.max, 4),
+        }
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+class Metrics:
+    """Thread-safe counters and stage-latency histograms for one crawl run.
+
+    ``time(stage)`` observes ``stage_seconds{stage=...}``; ``inc(name, **labels)`` bumps a
+    counter. ``write(prefix)`` exports ``<prefix>.prom`` (Prometheus text format, for the
+    node_exporter textfile collector or a push) and ``<prefix>.json`` (a summary with
+    percentiles per stage).
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counters = {}
+        self.histograms = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def time(self, stage):
+        """Time the block as ``stage``; a block that raises is also counted in ``errors_total``."""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.inc('errors_total', stage=stage, error=type(e).__name__)
+            raise
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - started, stage=stage)
+
+    def reset(self):
+        with self._lock:
+            self.counters, self.histograms = {}, {}
+            self.started = time.time()
+
+    def drain(self):
+        """Take everything recorded since the last drain; a worker process returns this to the
+        parent, which ``merge``s it, since each process has its own registry."""
+        with self._lock:
+            drained = self.counters, self.histograms
+            self.counters, self.histograms = {}, {}
+        return drained
+
+    def merge(self, drained):
+        counters, histograms = drained
+        with self._lock:
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, other in histograms.items():
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram(other.buckets)
+                histogram.merge(other)
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f'{PREFIX}_{name}'
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric}{_format_labels(labels)} {value}')
+        for (name, labels), histogram in histograms:
+            metric = f'{PREFIX}_{name}'
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f'# TYPE {metric} histogram')
+            cumulative = 0
+            for bound, n in zip(histogram.buckets, histogram.counts):
+                cumulative += n
+                lines.append(f'{metric}_bucket{_format_labels(labels, [("le", repr(float(bound)))])} {cumulative}')
+            lines.append(f'{metric}_bucket{_format_labels(labels, [("le", "+Inf")])} {histogram.count}')
+            lines.append(f'{metric}_sum{_format_labels(labels)} {histogram.sum}')
+            lines.append(f'{metric}_count{_format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+        result = {'started': self.started, 'seconds': round(time.time() - self.started, 3),
+                  'stages': {}, 'counters': {}}
+        for (name, labels), histogram in histograms:
+            label = ','.join(f'{key}={value}' for key, value in labels if key != 'stage')
+            stage = dict(labels).get('stage', name)
+            result['stages'][f'{stage}[{label}]' if label else stage] = histogram.summary()
+        for (name, labels), value in counters:
+            label = ','.join(f'{key}={value}' for key, value in labels)
+            result['counters'][f'{name}{{{label}}}' if label else name] = value
+        return result
+
+    def report(self):
+        """Stages ordered by total time, so the bottleneck is the first line."""
+        stages = sorted(self.summary()['stages'].items(), key=lambda item: item[1]['sum'], reverse=True)
+        lines = [f"{stage:>16}: {s['count']:>7} calls, {s['sum']:>9.2f}s total, "
+                 f"p50 {s['p50'] * 1000:.1f}ms, p95 {s['p95'] * 1000:.1f}ms, max {s['max'] * 1000:.1f}ms"
+                 for stage, s in stages]
+        return '\n'.join(lines)
+
+    def write(self, prefix):
+        """Write ``<prefix>.prom`` and ``<prefix>.json``; each file is replaced atomically."""
+        with atomic_writer(prefix + '.prom') as f:
+            f.write(self.to_prometheus())
+        with atomic_writer(prefix + '.json') as f:
+            json.dump(self.summary(), f, indent=2)
+        print(f"Metrics written to {prefix}.prom and {prefix}.json")
+
+
+# Process-wide registry the crawl modules report into
+METRICS = Metrics()
+
+
+class PageProfiler:
+    """Profile a random ``sample_rate`` share of pages into ``output_dir``.
+
+    ``engine='cprofile'`` writes ``<hash>.prof`` (open with ``snakeviz`` or ``pstats``);
+    ``engine='pyinstrument'`` writes an HTML flame view and needs the optional
+    ``pyinstrument`` package. Only one page is profiled at a time because Python allows a
+    single active profiler; pages arriving meanwhile are not sampled.
+    """
+
+    def __init__(self, sample_rate=0.01, output_dir='profiles', engine='cprofile'):
+        if engine == 'pyinstrument' and pyinstrument is None:
+            raise RuntimeError('pyinstrument is not installed: pip install pyinstrument')
+        if engine not in ('cprofile', 'pyinstrument'):
+            raise ValueError(f'unknown profiler engine: {engine}')
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self.engine = engine
+        self.profiled = 0
+        self._busy = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _path(self, url, suffix):
+        return os.path.join(self.output_dir, hashlib.sha1(url.encode('utf-8')).hexdigest()[:12] + suffix)
+
+    @contextmanager
+    def profile(self, url):
+        if random.random() >= self.sample_rate or not self._busy.acquire(blocking=False):
+            yield
+            return
+        try:
+            if self.engine == 'pyinstrument':
+                profiler = pyinstrument.Profiler()
+                profiler.start()
+                try:
+                    yield
+                finally:
+                    profiler.stop()
+                    with open(self._path(url, '.html'), 'w', encoding='utf-8') as f:
+                        f.write(profiler.output_html())
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    yield
+                finally:
+                    profiler.disable()
+                    profiler.dump_stats(self._path(url, '.prof'))
+            self.profiled += 1
+        finally:
+            self._busy.release()
+
+
+def profile_page(profiler, url):
+    # A no-op context when profiling is off
+    return profiler.profile(url) if profiler is not None else nullcontext()
+
+
+def add_arguments(parser):
+    """The ``--metrics``/``--profile-*`` options shared by the crawl CLIs."""
+    parser.add_argument('--metrics', help='write <prefix>.prom and <prefix>.json at the end of the run')
+    parser.add_argument('--profile-rate', type=float, default=0.0, help='share of pages to profile, e.g. 0.01')
+    parser.add_argument('--profile-dir', default='profiles')
+    parser.add_argument('--profiler', choices=('cprofile', 'pyinstrument'), default='cprofile')
+
+
+def profiler_from_args(args):
+    if not args.profile_rate:
+        return None
+    return PageProfiler(args.profile_rate, args.profile_dir, args.profiler)
+
+
+def finish(args):
+    print(METRICS.report())
+    if args.metrics:
+        METRICS.write(args.metrics)
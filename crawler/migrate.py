@@ -0,0 +1,187 @@
+import argparse
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, UpdateOne
+
+from dinserter import get_client
+from models import SCHEMA_TYPES, TYPE_ALIASES
+
+DEFAULT_BATCH_SIZE = 1000
+
+# A versioned change to every matching document. Give either `pipeline`, an aggregation
+# update pipeline run server-side with update_many, or `transform`, a function taking a
+# document and returning an update (or None) for changes a pipeline cannot express.
+class Migration:
+    def __init__(self, version, description, filter, pipeline=None, transform=None, projection=None):
+        if (pipeline is None) == (transform is None):
+            raise ValueError('A migration needs exactly one of pipeline or transform')
+        self.version = version
+        self.description = description
+        self.filter = filter
+        self.pipeline = pipeline
+        self.transform = transform
+        self.projection = projection
+
+
+def _to_double(path):
+    return {'$convert': {'input': f'${path}', 'to': 'double', 'onError': f'${path}', 'onNull': None}}
+
+
+def normalize_type(doc):
+    institution_type = TYPE_ALIASES.get(doc.get('type'), 'Other')
+    return {'$set': {'type': institution_type}}
+
+
+MIGRATIONS = [
+    Migration(
+        1, 'eligibility_criteria: {course: requirement} -> [{name, required}]',
+        # {$type: 'object'} alone also matches arrays of subdocuments, which $objectToArray rejects
+        {'eligibility_criteria': {'$type': 'object', '$not': {'$type': 'array'}}},
+        pipeline=[{'$set': {'eligibility_criteria': {'$map': {
+            'input': {'$objectToArray': '$eligibility_criteria'},
+            'as': 'kv',
+            'in': {'name': '$$kv.k', 'required': '$$kv.v'},
+        }}}}],
+    ),
+    Migration(
+        2, 'eligibility_criteria: [{course, eligibility}] -> [{name, required}]',
+        {'eligibility_criteria.course': {'$exists': True}},
+        pipeline=[{'$set': {'eligibility_criteria': {'$map': {
+            'input': '$eligibility_criteria',
+            'as': 'e',
+            'in': {'name': {'$ifNull': ['$$e.name', '$$e.course']},
+                   'required': {'$ifNull': ['$$e.required', '$$e.eligibility']}},
+        }}}}],
+    ),
+    Migration(
+        3, 'placements.*: numeric strings -> numbers',
+        {'$or': [{f'placements.{field}': {'$type': 'string'}}
+                 for field in ('average_salary', 'highest_salary', 'placement_rate')]},
+        pipeline=[{'$set': {f'placements.{field}': _to_double(f'placements.{field}')
+                            for field in ('average_salary', 'highest_salary', 'placement_rate')}}],
+    ),
+    Migration(
+        4, 'type: map free-form values onto the schema enum',
+        {'type': {'$nin': list(SCHEMA_TYPES)}},
+        transform=normalize_type,
+        projection={'type': 1},
+    ),
+]
+
+
+class MigrationRunner:
+    """Applies MIGRATIONS in version order directly to a collection.
+
+    Matching `_id`s are read in batches from one cursor; each batch is applied by a
+    worker thread as one server-side `update_many` (pipeline migrations) or one unordered
+    `bulk_write` (transform migrations). The highest `_id` below which every batch has
+    finished is saved in the `migrations` collection, so an interrupted run resumes there.
+    """
+
+    def __init__(self, db_name='shiksha_data', collection_name='institutions', batch_size=DEFAULT_BATCH_SIZE,
+                 workers=4, migrations=MIGRATIONS):
+        db = get_client()[db_name]
+        self.collection = db[collection_name]
+        self.progress = db['migrations']
+        self.batch_size = batch_size
+        self.workers = workers
+        self.migrations = sorted(migrations, key=lambda m: m.version)
+
+    def _progress_id(self, migration):
+        return f'{self.collection.name}:{migration.version}'
+
+    def status(self):
+        done = {doc['_id']: doc for doc in self.progress.find({'collection': self.collection.name})}
+        return [(m.version, m.description, done.get(self._progress_id(m), {}).get('state', 'pending'))
+                for m in self.migrations]
+
+    def _apply_batch(self, migration, ids):
+        if migration.pipeline is not None:
+            result = self.collection.update_many({'_id': {'$in': ids}, **migration.filter}, migration.pipeline)
+            return result.modified_count
+        ops = []
+        for doc in self.collection.find({'_id': {'$in': ids}, **migration.filter}, migration.projection):
+            update = migration.transform(doc)
+            if update:
+                ops.append(UpdateOne({'_id': doc['_id']}, update))
+        if not ops:
+            return 0
+        return self.collection.bulk_write(ops, ordered=False).modified_count
+
+    def _save(self, migration, **fields):
+        self.progress.update_one({'_id': self._progress_id(migration)},
+                                 {'$set': {'collection': self.collection.name, 'version': migration.version,
+                                           'description': migration.description, **fields}},
+                                 upsert=True)
+
+    def run_one(self, migration):
+        record = self.progress.find_one({'_id': self._progress_id(migration)}) or {}
+        if record.get('state') == 'done':
+            return None
+        last_id = record.get('last_id')
+        modified = record.get('modified', 0)
+        if last_id is not None:
+            print(f"Resuming migration {migration.version} after _id {last_id}")
+        self._save(migration, state='running', started_at=record.get('started_at') or datetime.now(timezone.utc))
+
+        query = dict(migration.filter)
+        if last_id is not None:
+            query = {'$and': [migration.filter, {'_id': {'$gt': last_id}}]}
+        cursor = self.collection.find(query, {'_id': 1}).sort('_id', ASCENDING).batch_size(self.batch_size)
+
+        started = time.perf_counter()
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            def drain(limit):
+                nonlocal modified
+                # Only advance the checkpoint past batches that finished in order
+                while pending and (len(pending) > limit or pending[0][1].done()):
+                    batch_last_id, future = pending.popleft()
+                    modified += future.result()
+                    self._save(migration, last_id=batch_last_id, modified=modified)
+
+            ids = []
+            for doc in cursor:
+                ids.append(doc['_id'])
+                if len(ids) >= self.batch_size:
+                    pending.append((ids[-1], executor.submit(self._apply_batch, migration, ids)))
+                    ids = []
+                    drain(self.workers * 2)
+            if ids:
+                pending.append((ids[-1], executor.submit(self._apply_batch, migration, ids)))
+            drain(0)
+
+        elapsed = time.perf_counter() - started
+        self._save(migration, state='done', modified=modified, finished_at=datetime.now(timezone.utc))
+        print(f"Migration {migration.version} ({migration.description}): {modified} documents in {elapsed:.2f}s")
+        return modified
+
+    def run(self, target=None):
+        for migration in self.migrations:
+            if target is not None and migration.version > target:
+                break
+            self.run_one(migration)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Apply versioned migrations to shiksha_data.institutions in place')
+    parser.add_argument('--db', default='shiksha_data')
+    parser.add_argument('--collection', default='institutions')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--to', type=int, dest='target', help='stop after this version')
+    parser.add_argument('--status', action='store_true', help='list migrations and their state')
+    args = parser.parse_args()
+
+    runner = MigrationRunner(args.db, args.collection, args.batch_size, args.workers)
+    try:
+        if args.status:
+            for version, description, state in runner.status():
+                print(f"{version:>4}  {state:<8} {description}")
+        else:
+            runner.run(args.target)
+    finally:
+        get_client().close()
@@ -0,0 +1,470 @@
+import argparse
+import json
+import math
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+import bson
+
+from records import atomic_writer, batched, is_ndjson, read_records, record_writer, write_records
+
+# Values of `type` allowed by colleges_schema.js
+SCHEMA_TYPES = ('Private', 'Government', 'Deemed University', 'Public University', 'Autonomous Institution', 'Other')
+
+TYPE_ALIASES = {
+    'State University': 'Public University',
+    'Central University': 'Public University',
+    'Private University': 'Private',
+    'Private Institution': 'Private',
+    'Private University Constituent College': 'Private',
+    'Private Deemed-to-be University': 'Deemed University',
+    'Private Autonomous Institution': 'Autonomous Institution',
+    'Statutory Autonomous': 'Autonomous Institution',
+    'Autonomous Body': 'Autonomous Institution',
+    'Public-Private Partnership': 'Other',
+}
+
+# Sentinel the scrapers write for a missing value
+NOT_FOUND = 'Not found'
+
+# Written by Mongoose or the loader; accepted on input and not part of the model
+IGNORED_FIELDS = {'createdAt', 'updatedAt', '__v', 'search_terms'}
+
+
+class ValidationError(ValueError):
+    """Every problem found in one record, as (path, message) pairs."""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(f'{path}: {message}' for path, message in errors))
+        self.errors = errors
+
+
+def _missing(value):
+    return value is None or value == NOT_FOUND or (isinstance(value, str) and not value.strip())
+
+
+# Coercers take (value, path, errors), return the normalized value or None, and append
+# (path, message) to errors instead of raising, so one pass reports every bad field
+
+def _text(value, path, errors):
+    if type(value) is str:
+        value = value.strip()
+        return value if value and value != NOT_FOUND else None
+    if value is None:
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # established_year and pincode are strings in the schema but often arrive as numbers
+        return str(int(value)) if float(value).is_integer() else str(value)
+    errors.append((path, f'expected text, got {type(value).__name__}'))
+    return None
+
+
+def _number(value, path, errors):
+    if _missing(value):
+        return None
+    if isinstance(value, bool):
+        errors.append((path, 'expected a number, got bool'))
+        return None
+    if isinstance(value, (int, float)):
+        return None if math.isnan(value) else float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.replace(',', '').strip())
+        except ValueError:
+            pass
+    errors.append((path, f'expected a number, got {value!r}'[:120]))
+    return None
+
+
+def _count(value, path, errors):
+    number = _number(value, path, errors)
+    if number is None:
+        return None
+    if number < 0 or not number.is_integer():
+        errors.append((path, f'expected a non-negative whole number, got {value!r}'))
+        return None
+    return int(number)
+
+
+def _ranged(low, high):
+    def coerce(value, path, errors):
+        number = _number(value, path, errors)
+        if number is not None and not low <= number <= high:
+            errors.append((path, f'{number:g} is outside {low}-{high}'))
+            return None
+        return number
+    coerce.bounds = (low, high)
+    return coerce
+
+
+def _text_list(value, path, errors):
+    if _missing(value):
+        return []
+    if isinstance(value, str):
+        # Hand-entered lists arrive comma-separated
+        value = value.split(',')
+    if not isinstance(value, list):
+        errors.append((path, f'expected a list, got {type(value).__name__}'))
+        return []
+    if all(type(item) is str for item in value):
+        return [item for item in map(str.strip, value) if item and item != NOT_FOUND]
+    items = (_text(item, f'{path}[{i}]', errors) for i, item in enumerate(value))
+    return [item for item in items if item]
+
+
+def _institution_type(value, path, errors):
+    value = _text(value, path, errors)
+    if value is None:
+        errors.append((path, 'required'))
+        return None
+    if value in SCHEMA_TYPES:
+        return value
+    # Same mapping as migration 4 in migrate.py
+    return TYPE_ALIASES.get(value, 'Other')
+
+
+def _nested(cls):
+    def coerce(value, path, errors):
+        if _missing(value):
+            return None
+        if not isinstance(value, dict):
+            errors.append((path, f'expected an object, got {type(value).__name__}'))
+            return None
+        return cls.decode(value, path + '.', errors)
+    coerce.struct = cls
+    return coerce
+
+
+def _list_of(cls):
+    def coerce(value, path, errors):
+        if _missing(value):
+            return []
+        if not isinstance(value, list):
+            errors.append((path, f'expected a list, got {type(value).__name__}'))
+            return []
+        items = []
+        for i, item in enumerate(value):
+            if not isinstance(item, dict):
+                errors.append((f'{path}[{i}]', f'expected an object, got {type(item).__name__}'))
+                continue
+            items.append(cls.decode(item, f'{path}[{i}].', errors))
+        return items
+    coerce.struct_list = cls
+    return coerce
+
+
+def _passthrough(value, path, errors):
+    return value
+
+
+def _compile(cls):
+    """Generate ``cls.decode`` and ``cls.to_dict`` as straight-line code, one block per field.
+
+    Values that already have the right type (a non-empty str, an in-range float) are
+    assigned inline; anything else goes through the field's coercer, which normalizes it
+    or records the error with its path.
+    """
+    namespace = {'NOT_FOUND': NOT_FOUND, 'cls': cls, 'known': cls._known}
+    decode = ['def decode(cls, doc, path, errors):', '    obj = cls.__new__(cls)', '    get = doc.get']
+    to_dict = ['def to_dict(self):', '    doc = {}']
+    for n, (name, coerce, keys) in enumerate(cls.FIELDS):
+        namespace[f'c{n}'] = coerce
+        decode.append(f'    v = get({keys[0]!r})')
+        for key in keys[1:]:
+            decode.append(f'    if v is None: v = get({key!r})')
+        slow = f'c{n}(v, path + {name!r}, errors)'
+        if coerce is _passthrough:
+            decode.append(f'    obj.{name} = v')
+        elif coerce is _text:
+            decode.append(f'    if type(v) is str and (t := v.strip()) and t != NOT_FOUND: obj.{name} = t')
+            decode.append(f'    else: obj.{name} = {slow}')
+        elif coerce is _number or hasattr(coerce, 'bounds'):
+            low, high = getattr(coerce, 'bounds', (-math.inf, math.inf))
+            decode.append(f'    if type(v) is float and {low!r} <= v <= {high!r}: obj.{name} = v')
+            decode.append(f'    elif type(v) is int and {low!r} <= v <= {high!r}: obj.{name} = float(v)')
+            decode.append(f'    else: obj.{name} = {slow}')
+        else:
+            decode.append(f'    obj.{name} = {slow}')
+
+        to_dict.append(f'    v = self.{name}')
+        if hasattr(coerce, 'struct'):
+            to_dict.append('    if v is not None:')
+            to_dict.append('        v = v.to_dict()')
+            to_dict.append(f'        if v: doc[{name!r}] = v')
+        elif hasattr(coerce, 'struct_list'):
+            to_dict.append(f'    if v: doc[{name!r}] = [item.to_dict() for item in v]')
+        else:
+            to_dict.append(f'    if v is not None and v != []: doc[{name!r}] = v')
+    decode.append('    if not doc.keys() <= known:')
+    decode.append('        errors.extend((path + key, "unknown field") for key in doc.keys() - known)')
+    decode.append('    return obj')
+    to_dict.append('    return doc')
+    namespace['inf'] = math.inf
+    exec('\n'.join(decode) + '\n\n' + '\n'.join(to_dict), namespace)
+    cls.decode = classmethod(namespace['decode'])
+    cls.to_dict = namespace['to_dict']
+
+
+def field_kind(coerce):
+    """How a field's values are stored: 'id', 'text', 'type', 'number', 'count', 'text_list',
+    'struct' or 'struct_list'; the nested class is on ``coerce.struct``/``coerce.struct_list``."""
+    if hasattr(coerce, 'struct'):
+        return 'struct'
+    if hasattr(coerce, 'struct_list'):
+        return 'struct_list'
+    if coerce is _number or hasattr(coerce, 'bounds'):
+        return 'number'
+    return {_passthrough: 'id', _text: 'text', _institution_type: 'type', _count: 'count',
+            _text_list: 'text_list'}[coerce]
+
+
+class Struct:
+    """Base for the record types: ``FIELDS`` is a tuple of (attribute, coercer, accepted input keys).
+
+    ``decode(doc, path, errors)`` and ``to_dict()`` are generated for each subclass by ``_compile``.
+    ``to_dict`` returns the document as stored in Mongo, with empty values left out.
+    """
+
+    __slots__ = ()
+    FIELDS = ()
+
+    def __init_subclass__(cls):
+        super().__init_subclass__()
+        cls._known = frozenset(key for _, _, keys in cls.FIELDS for key in keys) | IGNORED_FIELDS
+        _compile(cls)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, name) == getattr(other, name)
+                                                 for name, _, _ in self.FIELDS)
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name, _, _ in self.FIELDS)
+        return f'{type(self).__name__}({fields})'
+
+
+class Location(Struct):
+    __slots__ = ('city', 'state', 'country', 'pincode')
+    FIELDS = (
+        ('city', _text, ('city',)),
+        ('state', _text, ('state',)),
+        ('country', _text, ('country',)),
+        ('pincode', _text, ('pincode',)),
+    )
+
+
+class ContactInfo(Struct):
+    __slots__ = ('email', 'phone', 'address', 'website')
+    FIELDS = (
+        ('email', _text, ('email',)),
+        ('phone', _text, ('phone',)),
+        ('address', _text, ('address',)),
+        # One record in updated.json (and its copies) stores the website under `Fees`
+        ('website', _text, ('website', 'Fees')),
+    )
+
+
+class Course(Struct):
+    __slots__ = ('_id', 'name', 'duration', 'fee', 'eligibility')
+    FIELDS = (
+        ('_id', _passthrough, ('_id',)),
+        ('name', _text, ('name',)),
+        ('duration', _text, ('duration',)),
+        # dummy.py writes annual_fees
+        ('fee', _ranged(0, math.inf), ('fee', 'annual_fees')),
+        ('eligibility', _text, ('eligibility',)),
+    )
+
+
+class Eligibility(Struct):
+    __slots__ = ('name', 'required')
+    FIELDS = (
+        ('name', _text, ('name', 'course')),
+        ('required', _text, ('required', 'eligibility')),
+    )
+
+
+def _eligibility(value, path, errors):
+    # Older exports store {course: requirement}; see migrations 1 and 2 in migrate.py
+    if isinstance(value, dict):
+        value = [{'name': name, 'required': required} for name, required in value.items()]
+    return _eligibility_list(value, path, errors)
+
+
+_eligibility_list = _list_of(Eligibility)
+_eligibility.struct_list = Eligibility
+
+
+class Placements(Struct):
+    __slots__ = ('average_salary', 'highest_salary', 'placement_rate')
+    FIELDS = (
+        ('average_salary', _ranged(0, math.inf), ('average_salary',)),
+        ('highest_salary', _ranged(0, math.inf), ('highest_salary',)),
+        ('placement_rate', _ranged(0, 100), ('placement_rate',)),
+    )
+
+
+class Institution(Struct):
+    """One institution as colleges_schema.js stores it.
+
+    ``from_dict`` accepts the shapes the scripts and older exports produce: numeric strings,
+    ``'Not found'``, free-form ``type`` values, ``annual_fees`` and the old eligibility layouts.
+    It coerces them into the schema's types or raises ``ValidationError`` listing every bad field.
+    """
+
+    __slots__ = ('_id', 'name', 'type', 'location', 'established_year', 'accreditation', 'total_students',
+                 'admission_process', 'required_documents', 'contact_info', 'courses_offered',
+                 'eligibility_criteria', 'acceptance_exams', 'top_recruiters', 'placements', 'image_url',
+                 'image_thumb_url', 'image_source_url', 'rating', 'field_taught', 'demand', 'score')
+    FIELDS = (
+        ('_id', _passthrough, ('_id',)),
+        ('name', _text, ('name',)),
+        ('type', _institution_type, ('type',)),
+        ('location', _nested(Location), ('location',)),
+        ('established_year', _text, ('established_year',)),
+        ('accreditation', _text, ('accreditation',)),
+        ('total_students', _count, ('total_students',)),
+        ('admission_process', _text, ('admission_process',)),
+        # updated.json spells it required_documented_documents in places
+        ('required_documents', _text_list, ('required_documents', 'required_documented_documents')),
+        ('contact_info', _nested(ContactInfo), ('contact_info',)),
+        ('courses_offered', _list_of(Course), ('courses_offered',)),
+        ('eligibility_criteria', _eligibility, ('eligibility_criteria',)),
+        ('acceptance_exams', _text_list, ('acceptance_exams',)),
+        ('top_recruiters', _text_list, ('top_recruiters',)),
+        ('placements', _nested(Placements), ('placements',)),
+        ('image_url', _text, ('image_url',)),
+        # Written by image_updater.py: a list-size WebP variant and the original image_url
+        ('image_thumb_url', _text, ('image_thumb_url',)),
+        ('image_source_url', _text, ('image_source_url',)),
+        ('rating', _ranged(0, 10), ('rating',)),
+        ('field_taught', _text_list, ('field_taught',)),
+        # Written by lead_counters.py from recent applications
+        ('demand', _number, ('demand',)),
+        ('score', _number, ('score',)),
+    )
+
+    @classmethod
+    def from_dict(cls, doc):
+        if not isinstance(doc, dict):
+            raise ValidationError([('', f'expected an object, got {type(doc).__name__}')])
+        errors = []
+        obj = cls.decode(doc, '', errors)
+        if obj.name is None and not any(path == 'name' for path, _ in errors):
+            errors.append(('name', 'required'))
+        if errors:
+            raise ValidationError(errors)
+        return obj
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
+
+    @classmethod
+    def from_bson(cls, data):
+        return cls.from_dict(bson.decode(data))
+
+
+def normalize(doc):
+    """The Mongo-ready form of ``doc``; raises ValidationError."""
+    return Institution.from_dict(doc).to_dict()
+
+
+def validate_records(records):
+    """Yield (index, Institution or None, errors) for each record."""
+    for n, doc in enumerate(records):
+        try:
+            yield n, Institution.from_dict(doc), None
+        except ValidationError as e:
+            yield n, None, e.errors
+
+
+def _error_report(n, errors):
+    return {'record': n, 'errors': [{'path': path, 'message': message} for path, message in errors]}
+
+
+def _validate_chunk(job):
+    # Runs in a worker: NDJSON chunks arrive as raw lines and leave as serialized lines, so
+    # the parent process only moves text
+    start, items, raw = job
+    valid, rejected = [], []
+    for n, item in enumerate(items, start):
+        try:
+            institution = Institution.from_dict(json.loads(item) if raw else item)
+        except ValidationError as e:
+            rejected.append(_error_report(n, e.errors))
+            continue
+        except json.JSONDecodeError as e:
+            rejected.append(_error_report(n, [('', f'invalid JSON: {e}')]))
+            continue
+        doc = institution.to_dict()
+        valid.append(json.dumps(doc, ensure_ascii=False) + '\n' if raw else doc)
+    return valid, rejected
+
+
+def _ndjson_lines(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield line
+
+
+def _bounded_map(executor, fn, jobs, window):
+    # executor.map submits every job before yielding a result, which would read the whole file;
+    # keep at most ``window`` chunks in flight and yield results in order
+    pending = deque()
+    for job in jobs:
+        pending.append(executor.submit(fn, job))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def validate_file(source, output=None, errors_path='rejected.ndjson', workers=1, chunk_size=10000):
+    """Validate ``source`` and write the normalized valid records to ``output`` and a report
+    of every rejected record to ``errors_path``; chunks are validated by ``workers`` processes.
+    Both files are streamed, so memory stays at a few chunks whatever the size of ``source``."""
+    stats = {'valid': 0, 'rejected': 0}
+    started = time.perf_counter()
+    raw = is_ndjson(source) and (output is None or is_ndjson(output))
+    items = _ndjson_lines(source) if raw else read_records(source)
+    jobs = ((n * chunk_size, chunk, raw) for n, chunk in enumerate(batched(items, chunk_size)))
+
+    def valid(results, reject):
+        for chunk_valid, chunk_rejected in results:
+            stats['valid'] += len(chunk_valid)
+            stats['rejected'] += len(chunk_rejected)
+            for report in chunk_rejected:
+                reject(report)
+            yield from chunk_valid
+
+    with ProcessPoolExecutor(max_workers=workers) if workers > 1 else nullcontext() as executor, \
+            record_writer(errors_path) as reject:
+        results = _bounded_map(executor, _validate_chunk, jobs, workers * 2) if executor \
+            else map(_validate_chunk, jobs)
+        if output and raw:
+            with atomic_writer(output) as f:
+                f.writelines(valid(results, reject))
+        elif output:
+            write_records(valid(results, reject), output)
+        else:
+            deque(valid(results, reject), maxlen=0)
+
+    elapsed = time.perf_counter() - started
+    total = stats['valid'] + stats['rejected']
+    stats['seconds'] = round(elapsed, 3)
+    print(f"Validated {total} records in {elapsed:.2f}s ({total / elapsed:.0f} records/s): "
+          f"{stats['valid']} valid, {stats['rejected']} rejected (see {errors_path})")
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Validate and normalize institution records against colleges_schema.js')
+    parser.add_argument('source', help='.json array or .ndjson')
+    parser.add_argument('--output', help='write the normalized valid records here')
+    parser.add_argument('--errors', default='rejected.ndjson', help='per-record error report')
+    parser.add_argument('--workers', type=int, default=1, help='validate chunks in this many processes')
+    args = parser.parse_args()
+    validate_file(args.source, args.output, args.errors, args.workers)
@@ -0,0 +1,330 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from pymongo import ReplaceOne
+
+from archive import PageArchive
+from fetcher import REQUIRED_FIELDS, Fetcher, missing_fields, parse_with_embedded
+from main import DriverPool, load_urls
+from metrics import METRICS, add_arguments, finish
+
+_STOP = object()
+
+
+def _parse_record(page):
+    data = parse_with_embedded(page['html'])
+    data['url'] = page['url']
+    return {'url': page['url'], 'data': data, 'source': page['source'],
+            'missing': missing_fields(data, REQUIRED_FIELDS)}
+
+
+def parse_page(page):
+    # Runs in a parse worker process; the HTML is dropped so only the record travels back, with
+    # the parse timings and field counters the page added to this process's METRICS
+    try:
+        result = _parse_record(page)
+    except Exception as e:
+        result = {'url': page['url'], 'error': f'{type(e).__name__}: {e}'}
+    result['metrics'] = METRICS.drain()
+    return result
+
+
+class Stage:
+    """Threads taking items from a bounded inbox, applying ``handle`` and passing the result on.
+
+    ``route(result)`` picks the next stage (or None to drop the result). Because every inbox is
+    bounded, a slow stage fills its inbox and blocks the ``put`` of the stage before it, so the
+    whole pipeline runs at the pace of its slowest stage with a fixed number of items in flight.
+    """
+
+    def __init__(self, name, handle, workers=1, capacity=100):
+        self.name = name
+        self.handle = handle
+        self.workers = workers
+        self.capacity = capacity
+        self.inbox = queue.Queue(maxsize=capacity)
+        self.route = lambda result: None
+        self.processed = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.started = None
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def put(self, item):
+        self.inbox.put(item)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._threads = [threading.Thread(target=self._run, name=f'{self.name}-{i}', daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _forward(self, result):
+        target = self.route(result)
+        if target is not None:
+            waited = time.perf_counter()
+            target.put(result)
+            with self._lock:
+                self.blocked += time.perf_counter() - waited
+
+    def _run(self):
+        while True:
+            item = self.inbox.get()
+            if item is _STOP:
+                return
+            began = time.perf_counter()
+            try:
+                result = self.handle(item)
+            except Exception as e:
+                print(f"{self.name}: {e}")
+                with self._lock:
+                    self.errors += 1
+                continue
+            finally:
+                spent = time.perf_counter() - began
+                METRICS.observe('stage_seconds', spent, stage=f'pipeline_{self.name}')
+                with self._lock:
+                    self.busy += spent
+                    self.processed += 1
+            if result is not None:
+                self._forward(result)
+
+    def stop(self):
+        """Wait for everything already queued to be processed, then end the threads."""
+        for _ in self._threads:
+            self.inbox.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def snapshot(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        return {
+            'queue': self.inbox.qsize(),
+            'capacity': self.capacity,
+            'processed': self.processed,
+            'errors': self.errors,
+            'per_second': round(self.processed / elapsed, 1) if elapsed else 0.0,
+            # Share of worker time spent in handle(); near 100% marks the bottleneck
+            'utilization': round(self.busy / (elapsed * self.workers), 3) if elapsed else 0.0,
+            # Time spent waiting on a full downstream queue
+            'blocked_seconds': round(self.blocked, 2),
+        }
+
+
+class SinkStage(Stage):
+    """One thread buffering records and handing them to every ``writer(records)`` in batches of
+    ``batch_size``, or at least every ``flush_seconds``."""
+
+    def __init__(self, writers, batch_size=500, flush_seconds=5.0, capacity=1000):
+        super().__init__('sink', None, workers=1, capacity=capacity)
+        self.writers = writers
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.written = 0
+
+    def _flush(self, buffer):
+        if not buffer:
+            return
+        began = time.perf_counter()
+        for writer in self.writers:
+            try:
+                writer(buffer)
+            except Exception as e:
+                print(f"sink: {e}")
+                self.errors += 1
+        self.written += len(buffer)
+        spent = time.perf_counter() - began
+        METRICS.observe('stage_seconds', spent, stage='pipeline_write')
+        self.busy += spent
+        buffer.clear()
+
+    def _run(self):
+        buffer = []
+        last_flush = time.perf_counter()
+        while True:
+            try:
+                item = self.inbox.get(timeout=self.flush_seconds)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                self._flush(buffer)
+                return
+            if item is not None:
+                buffer.append(item['data'])
+                self.processed += 1
+            if len(buffer) >= self.batch_size or time.perf_counter() - last_flush >= self.flush_seconds:
+                self._flush(buffer)
+                last_flush = time.perf_counter()
+
+
+def ndjson_writer(path):
+    # Appended, like frontier.py, so an interrupted crawl keeps what it wrote
+    f = open(path, 'a', encoding='utf-8')
+
+    def write(records):
+        f.write(''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records))
+        f.flush()
+    write.close = f.close
+    return write
+
+
+def mongo_writer(collection):
+    # Same layout as work_queue.py's crawl_results: one document per URL
+    def write(records):
+        collection.bulk_write([ReplaceOne({'_id': record['url']}, {**record, '_id': record['url']}, upsert=True)
+                               for record in records], ordered=False)
+    return write
+
+
+class Pipeline:
+    """fetch (HTTP threads) -> parse (process pool) -> [browser fallback] -> sink, with bounded queues.
+
+    Pages whose HTTP response lacks a required field go to the browser stage when
+    ``browser_workers`` is set; otherwise their partial record is kept.
+    """
+
+    def __init__(self, writers, fetch_workers=8, parse_workers=None, browser_workers=0, queue_size=100,
+                 batch_size=500, archive=None, report_seconds=10.0):
+        self.parse_workers = parse_workers or os.cpu_count()
+        self.archive = archive
+        self.report_seconds = report_seconds
+        self.driver_pool = DriverPool(size=browser_workers, lean=True) if browser_workers else None
+        self.fetcher = Fetcher(driver_pool=self.driver_pool, max_connections=fetch_workers)
+        self.executor = None
+        self._lock = threading.Lock()
+
+        self.fetch = Stage('fetch', self._fetch, fetch_workers, queue_size)
+        # Two dispatch threads per process keep every parse worker busy while results are forwarded
+        self.parse = Stage('parse', self._parse, self.parse_workers * 2, queue_size)
+        self.browser = Stage('browser', self._browse, browser_workers, queue_size) if browser_workers else None
+        self.sink = SinkStage(writers, batch_size=batch_size, capacity=max(queue_size, batch_size * 2))
+        self.stages = [stage for stage in (self.fetch, self.parse, self.browser, self.sink) if stage]
+
+        self.fetch.route = lambda page: self.parse if page['html'] is not None else self.browser
+        self.parse.route = lambda page: self.browser if page['missing'] and self.browser else self.sink
+        if self.browser:
+            self.browser.route = lambda page: self.sink
+
+    def _fetch(self, url):
+        html = self.fetcher.fetch_http(url)
+        if html is None:
+            if self.browser:
+                return {'url': url, 'html': None, 'source': None}
+            with self._lock:
+                self.fetcher.stats['failed'] += 1
+            return None
+        if self.archive is not None:
+            self.archive.put(url, html)
+        return {'url': url, 'html': html, 'source': 'http'}
+
+    def _parse(self, page):
+        page = self.executor.submit(parse_page, page).result()
+        METRICS.merge(page.pop('metrics'))
+        if 'error' in page:
+            raise RuntimeError(f"{page['url']}: {page['error']}")
+        with self._lock:
+            self.fetcher.count_fields(page['missing'])
+            if not page['missing'] or not self.browser:
+                self.fetcher.stats['http_pages'] += 1
+        return page
+
+    def _browse(self, page):
+        try:
+            html = self.fetcher.fetch_browser(page['url'])
+        except Exception:
+            with self._lock:
+                self.fetcher.stats['failed'] += 1
+            raise
+        if self.archive is not None:
+            self.archive.put(page['url'], html)
+        with self._lock:
+            self.fetcher.stats['browser_pages'] += 1
+        return _parse_record({'url': page['url'], 'html': html, 'source': 'browser'})
+
+    def snapshot(self):
+        return {stage.name: stage.snapshot() for stage in self.stages}
+
+    def _report_loop(self, done):
+        while not done.wait(self.report_seconds):
+            print(' | '.join(f"{name} q={s['queue']}/{s['capacity']} {s['per_second']}/s "
+                             f"util={s['utilization']:.0%}" for name, s in self.snapshot().items()))
+
+    def run(self, urls):
+        """Crawl ``urls`` (any iterable, consumed lazily) and return the final per-stage snapshot."""
+        started = time.perf_counter()
+        done = threading.Event()
+        # Workers start from a forkserver, not a fork of this process: by the first submit the fetch threads
+        # are running, and a fork could copy a lock (METRICS, queues, logging) that one of them holds.
+        # Each worker therefore also starts with an empty METRICS of its own.
+        context = multiprocessing.get_context('forkserver')
+        with ProcessPoolExecutor(max_workers=self.parse_workers, mp_context=context) as self.executor:
+            for stage in reversed(self.stages):
+                stage.start()
+            reporter = threading.Thread(target=self._report_loop, args=(done,), daemon=True)
+            reporter.start()
+            try:
+                for url in urls:
+                    self.fetch.put(url)
+            finally:
+                # Drain in pipeline order so nothing is put into a stage after it stopped
+                for stage in self.stages:
+                    stage.stop()
+                done.set()
+        snapshot = self.snapshot()
+        elapsed = time.perf_counter() - started
+        print(f"Pipeline wrote {self.sink.written} records in {elapsed:.1f}s "
+              f"({self.sink.written / elapsed:.1f} pages/s)")
+        return snapshot
+
+    def close(self):
+        self.fetcher.close()
+        if self.driver_pool is not None:
+            self.driver_pool.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pipelined crawl: concurrent fetch, parse and write stages')
+    parser.add_argument('urls', nargs='*')
+    parser.add_argument('--url-file')
+    parser.add_argument('--output', default='institutions.ndjson', help='NDJSON file records are appended to')
+    parser.add_argument('--mongo', action='store_true', help='also upsert records into crawl_results')
+    parser.add_argument('--db', default='shiksha_data')
+    parser.add_argument('--collection', default='crawl_results')
+    parser.add_argument('--fetch-workers', type=int, default=8)
+    parser.add_argument('--parse-workers', type=int, help='parse processes (default: all cores)')
+    parser.add_argument('--browser-workers', type=int, default=0, help='browsers for pages HTTP cannot complete')
+    parser.add_argument('--queue-size', type=int, default=100, help='capacity of each stage queue')
+    parser.add_argument('--batch-size', type=int, default=500, help='records per sink write')
+    parser.add_argument('--archive', help='store every fetched page in this archive directory')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    urls = list(args.urls) + (load_urls(args.url_file) if args.url_file else [])
+    writers = [ndjson_writer(args.output)]
+    if args.mongo:
+        from dinserter import get_client, get_collection
+
+        writers.append(mongo_writer(get_collection(args.db, args.collection)))
+    archive = PageArchive(args.archive) if args.archive else None
+    pipeline = Pipeline(writers, args.fetch_workers, args.parse_workers, args.browser_workers, args.queue_size,
+                        args.batch_size, archive)
+    try:
+        print(json.dumps(pipeline.run(urls), indent=2))
+        print(pipeline.fetcher.report())
+        finish(args)
+    finally:
+        pipeline.close()
+        writers[0].close()
+        if archive is not None:
+            archive.close()
+        if args.mongo:
+            get_client().close()
@@ -0,0 +1,138 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from itertools import islice
+
+NDJSON_SUFFIXES = ('.ndjson', '.jsonl')
+
+_decoder = json.JSONDecoder()
+
+
+def is_ndjson(path):
+    return path.endswith(NDJSON_SUFFIXES)
+
+
+def _iter_json_array(f, chunk_size=1 << 16):
+    # Decode one array element at a time from a sliding buffer, so only the current record is held in memory
+    buf = ''
+    pos = 0
+    started = False
+    eof = False
+    while True:
+        while pos < len(buf) and buf[pos] in ' \t\r\n,':
+            pos += 1
+        if not started:
+            if pos < len(buf):
+                if buf[pos] != '[':
+                    raise ValueError('Expected a JSON array')
+                started = True
+                pos += 1
+                continue
+        elif pos < len(buf) and buf[pos] == ']':
+            return
+        elif pos < len(buf):
+            try:
+                record, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # A number at the buffer edge may be cut short ("-3" of "-3e2"); only trust a
+                # value once the delimiter after it has been read
+                if eof or (end < len(buf) and buf[end] in ' \t\r\n,]'):
+                    yield record
+                    pos = end
+                    continue
+        if eof:
+            if not started:
+                return
+            raise ValueError('Unterminated JSON array')
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+
+def read_records(path):
+    """Yield records from an NDJSON file or, incrementally, from a file holding one JSON array."""
+    with open(path, 'r', encoding='utf-8') as f:
+        if is_ndjson(path):
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f'{path}:{line_no}: {e}') from None
+        else:
+            yield from _iter_json_array(f)
+
+
+@contextmanager
+def atomic_writer(path):
+    """Open a temporary file next to ``path`` for writing; it replaces ``path`` only if the block succeeds."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+@contextmanager
+def record_writer(path, indent=2):
+    """Yield a ``write(record)`` function streaming to ``path`` (NDJSON or a JSON array, by
+    extension); like ``atomic_writer``, ``path`` is only replaced if the block succeeds."""
+    ndjson = is_ndjson(path)
+    count = 0
+    with atomic_writer(path) as f:
+        def write(record):
+            nonlocal count
+            if ndjson:
+                f.write(json.dumps(record, ensure_ascii=False))
+                f.write('\n')
+            else:
+                f.write(',\n' if count else '[\n')
+                f.write(json.dumps(record, indent=indent, ensure_ascii=False))
+            count += 1
+        yield write
+        if not ndjson:
+            f.write('\n]' if count else '[]')
+
+
+def write_records(records, path, indent=2):
+    """Stream ``records`` to ``path`` (NDJSON or a JSON array, by extension) and atomically replace it.
+
+    The target is only replaced once every record has been written, so a failure halfway
+    leaves the previous file intact. Returns the number of records written.
+    """
+    count = 0
+    with record_writer(path, indent) as write:
+        for record in records:
+            write(record)
+            count += 1
+    return count
+
+
+def pipe(records, *stages):
+    """Chain generator stages: ``pipe(read_records(p), convert, update)``."""
+    for stage in stages:
+        records = stage(records)
+    return records
+
+
+def batched(records, size):
+    iterator = iter(records)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,215 @@
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+import httpx
+from fake_useragent import UserAgent
+
+from archive import PageArchive
+from fetcher import parse_with_embedded
+from main import load_urls, save_to_json
+from metrics import METRICS, add_arguments, finish
+
+BLOCK_STATUSES = {403, 429, 503}
+BLOCK_MARKERS = ('Access Denied', 'Request unsuccessful')
+
+
+def is_blocked(status, text):
+    if status in BLOCK_STATUSES:
+        return True
+    head = text[:5000].lower()
+    return any(marker.lower() in head for marker in BLOCK_MARKERS)
+
+
+# Token bucket: `rate` requests per second on average, bursts of up to `burst`
+class TokenBucket:
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# Concurrency limit that grows by one after `limit` healthy responses and halves on a block (AIMD)
+class AdaptiveLimiter:
+    def __init__(self, initial=2, minimum=1, maximum=8):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self._healthy = 0
+        self._cond = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    async def on_success(self):
+        async with self._cond:
+            self._healthy += 1
+            if self._healthy >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self._healthy = 0
+                self._cond.notify_all()
+
+    async def on_block(self):
+        async with self._cond:
+            self.limit = max(self.minimum, self.limit // 2)
+            self._healthy = 0
+
+
+class HostState:
+    def __init__(self, rate, burst, initial, maximum):
+        self.bucket = TokenBucket(rate, burst)
+        self.limiter = AdaptiveLimiter(initial=initial, maximum=maximum)
+
+
+async def http_fetch(client, url):
+    response = await client.get(url)
+    return response.status_code, response.text, response.headers.get('Retry-After')
+
+
+# Async crawl scheduler: per-host AIMD concurrency, token-bucket rate limiting and
+# retries with exponential backoff and full jitter
+class Scheduler:
+    def __init__(self, fetch=None, rate=1.0, burst=2, initial_concurrency=2, max_concurrency=8,
+                 max_retries=4, base_delay=1.0, max_delay=60.0, archive=None):
+        self._fetch = fetch
+        self.archive = archive
+        self.rate = rate
+        self.burst = burst
+        self.initial_concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hosts = defaultdict(lambda: HostState(rate, burst, initial_concurrency, max_concurrency))
+        self.stats = Counter()
+
+    def backoff(self, attempt, retry_after=None):
+        if retry_after:
+            try:
+                return min(self.max_delay, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def fetch(self, url):
+        """Return the page text for ``url`` or ``None`` once retries are exhausted."""
+        host = self.hosts[urlsplit(url).netloc]
+        for attempt in range(self.max_retries + 1):
+            await host.bucket.acquire()
+            async with host.limiter:
+                try:
+                    with METRICS.time('http_fetch'):
+                        status, text, retry_after = await self._fetch(url)
+                except Exception as e:
+                    print(f"Error fetching {url}: {e}")
+                    status, text, retry_after = None, '', None
+                    self.stats['errors'] += 1
+                else:
+                    METRICS.inc('http_responses_total', status=status)
+            if status == 200 and not is_blocked(status, text):
+                await host.limiter.on_success()
+                self.stats['ok'] += 1
+                return text
+            if status is not None and is_blocked(status, text):
+                await host.limiter.on_block()
+                self.stats['blocked'] += 1
+                METRICS.inc('blocked_total')
+            elif status is not None:
+                self.stats[f'status_{status}'] += 1
+                if 400 <= status < 500:
+                    return None
+            if attempt < self.max_retries:
+                self.stats['retries'] += 1
+                METRICS.inc('retries_total')
+                await asyncio.sleep(self.backoff(attempt, retry_after))
+        self.stats['gave_up'] += 1
+        METRICS.inc('gave_up_total')
+        return None
+
+    async def run(self, urls, parse=parse_with_embedded):
+        """Fetch and parse ``urls``; ``stats`` afterwards describes this run only."""
+        self.stats = Counter()
+        loop = asyncio.get_running_loop()
+        owned_client = None
+        if self._fetch is None:
+            owned_client = httpx.AsyncClient(follow_redirects=True, timeout=15.0,
+                                             headers={'User-Agent': UserAgent().random})
+            self._fetch = lambda url: http_fetch(owned_client, url)
+
+        async def one(url):
+            text = await self.fetch(url)
+            if text is None:
+                return None
+            # Disk writes and parsing go to threads so they do not hold up the other fetches
+            if self.archive is not None:
+                await loop.run_in_executor(None, self.archive.put, url, text)
+            try:
+                data = await loop.run_in_executor(None, parse, text)
+            except Exception as e:
+                # One unparseable page must not discard the rest of the run
+                print(f"Error parsing {url}: {e}")
+                self.stats['parse_errors'] += 1
+                return None
+            data['url'] = url
+            return data
+
+        started = time.perf_counter()
+        try:
+            results = await asyncio.gather(*(one(url) for url in urls))
+        finally:
+            if owned_client is not None:
+                await owned_client.aclose()
+                self._fetch = None
+        elapsed = time.perf_counter() - started
+        self.stats['pages_per_minute'] = round(self.stats['ok'] / elapsed * 60) if elapsed else 0
+        return [r for r in results if r]
+
+    def report(self):
+        limits = ', '.join(f"{host}={state.limiter.limit}" for host, state in self.hosts.items())
+        return f"{dict(self.stats)}; concurrency per host: {limits}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rate-limited async crawl')
+    parser.add_argument('urls', nargs='*')
+    parser.add_argument('--url-file')
+    parser.add_argument('--rate', type=float, default=1.0, help='requests per second per host')
+    parser.add_argument('--max-concurrency', type=int, default=8, help='per-host concurrency ceiling')
+    parser.add_argument('--retries', type=int, default=4)
+    parser.add_argument('--output', default='institution_data.json')
+    parser.add_argument('--archive', help='store every fetched page in this archive directory')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    urls = list(args.urls) + (load_urls(args.url_file) if args.url_file else [])
+    scheduler = Scheduler(rate=args.rate, max_concurrency=args.max_concurrency, max_retries=args.retries,
+                          archive=PageArchive(args.archive) if args.archive else None)
+    results = asyncio.run(scheduler.run(urls))
+    print(scheduler.report())
+    save_to_json(results, args.output)
+    finish(args)
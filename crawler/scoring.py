@@ -0,0 +1,125 @@
+import argparse
+import math
+import time
+
+import numpy as np
+from pymongo import UpdateOne
+
+# score = salary_weight * average_salary * placement_rate / 100 + rating_weight * rating + demand_weight * demand
+# This is the ranking every /api/get-colleges sort uses; change weights here or with `python scoring.py --*-weight`.
+# `demand` is written by lead_counters.py (log of recent applications); its weight is off until set here.
+DEFAULT_WEIGHTS = {'salary': 1.0, 'rating': 1000.0, 'demand': 0.0}
+
+SCORE_PROJECTION = {'placements.average_salary': 1, 'placements.placement_rate': 1, 'rating': 1, 'demand': 1,
+                    'score': 1}
+
+
+_EMPTY = {}
+
+
+def _number(value):
+    # Scraped and hand-entered records carry numbers as strings ('450000') or 'Not found'
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _inputs(docs):
+    """(n, 4) float64 array of average_salary, placement_rate, rating and demand, NaN where missing.
+
+    The values are gathered in one pass and converted by NumPy in one call, which accepts numbers,
+    numeric strings and None; only a batch holding something else ('Not found') is converted value
+    by value.
+    """
+    rows = [(placements.get('average_salary'), placements.get('placement_rate'), doc.get('rating'), doc.get('demand'))
+            for doc in docs
+            for placements in (doc.get('placements') if isinstance(doc.get('placements'), dict) else _EMPTY,)]
+    try:
+        return np.array(rows, dtype=np.float64).reshape(len(rows), 4)
+    except (TypeError, ValueError):
+        return np.array([[_number(value) for value in row] for row in rows], dtype=np.float64).reshape(len(rows), 4)
+
+
+def weighted_score(salary, rate, rating, demand, weights=DEFAULT_WEIGHTS):
+    """The formula above, for floats or equal-length arrays; missing inputs must already be 0."""
+    return weights['salary'] * salary * rate / 100 + weights['rating'] * rating + weights.get('demand', 0.0) * demand
+
+
+def score_batch(docs, weights=DEFAULT_WEIGHTS):
+    """Scores for a list of institution documents as a float64 array; missing inputs count as 0."""
+    salary, rate, rating, demand = np.nan_to_num(_inputs(docs)).T
+    return weighted_score(salary, rate, rating, demand, weights)
+
+
+def score(doc, weights=DEFAULT_WEIGHTS):
+    """Scalar form of score_batch for single documents; same arithmetic, without the array overhead."""
+    placements = doc.get('placements') if isinstance(doc.get('placements'), dict) else {}
+    salary, rate, rating, demand = (0.0 if math.isnan(v) else v for v in (
+        _number(placements.get('average_salary')), _number(placements.get('placement_rate')), _number(doc.get('rating')),
+        _number(doc.get('demand'))))
+    return weighted_score(salary, rate, rating, demand, weights)
+
+
+def rescore(collection, batch_size=5000, weights=DEFAULT_WEIGHTS, dry_run=False, on_change=None):
+    """Recompute every score in batches and write back only the documents whose score changed.
+
+    ``on_change``, if given, is called with the ``_id``s of each batch's rewritten documents.
+    """
+    stats = {'scanned': 0, 'changed': 0}
+    started = time.perf_counter()
+    cursor = collection.find({}, SCORE_PROJECTION).batch_size(batch_size)
+    batch = []
+
+    def flush():
+        scores = score_batch(batch, weights)
+        current = np.fromiter((_number(doc.get('score')) for doc in batch), dtype=np.float64, count=len(batch))
+        changed = np.flatnonzero(~np.isclose(scores, current, rtol=0, atol=1e-9))
+        stats['scanned'] += len(batch)
+        stats['changed'] += len(changed)
+        if len(changed) and not dry_run:
+            collection.bulk_write([UpdateOne({'_id': batch[i]['_id']}, {'$set': {'score': float(scores[i])}})
+                                   for i in changed], ordered=False)
+            if on_change is not None:
+                on_change([batch[i]['_id'] for i in changed])
+        batch.clear()
+
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    elapsed = time.perf_counter() - started
+    stats['seconds'] = round(elapsed, 3)
+    print(f"Rescored {stats['scanned']} documents in {elapsed:.2f}s, {stats['changed']} changed"
+          f"{' (dry run)' if dry_run else ''}")
+    return stats
+
+
+if __name__ == '__main__':
+    from dinserter import get_client, get_collection
+    from top_lists import TopLists
+
+    parser = argparse.ArgumentParser(description='Recompute institution scores in place')
+    parser.add_argument('--db', default='shiksha_data')
+    parser.add_argument('--collection', default='institutions')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--salary-weight', type=float, default=DEFAULT_WEIGHTS['salary'])
+    parser.add_argument('--rating-weight', type=float, default=DEFAULT_WEIGHTS['rating'])
+    parser.add_argument('--demand-weight', type=float, default=DEFAULT_WEIGHTS['demand'])
+    parser.add_argument('--dry-run', action='store_true', help='count changes without writing')
+    parser.add_argument('--no-top-lists', action='store_true', help='skip refreshing top_lists')
+    args = parser.parse_args()
+
+    weights = {'salary': args.salary_weight, 'rating': args.rating_weight, 'demand': args.demand_weight}
+    collection = get_collection(args.db, args.collection)
+    top_lists = None if args.dry_run or args.no_top_lists else TopLists(collection)
+    try:
+        rescore(collection, args.batch_size, weights, args.dry_run,
+                on_change=top_lists.collect_ids if top_lists else None)
+        if top_lists:
+            top_lists.flush()
+    finally:
+        get_client().close()
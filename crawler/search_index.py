@@ -0,0 +1,90 @@
+import argparse
+import re
+import time
+import unicodedata
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+# Field holding the precomputed terms; index.js searches it with {search_terms: {$all: [...]}}
+SEARCH_FIELD = 'search_terms'
+# Keep in sync with normalizeSearch() in index.js
+MAX_PREFIX = 15
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def tokenize(text):
+    """Lower-cased, de-accented alphanumeric tokens: 'Pondichéry Univ.' -> ['pondichery', 'univ']."""
+    if not isinstance(text, str):
+        return []
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return [token for token in _NON_ALNUM.split(stripped.lower()) if token]
+
+
+def edge_ngrams(token, max_len=MAX_PREFIX):
+    return [token[:i] for i in range(1, min(len(token), max_len) + 1)]
+
+
+def searchable_text(doc):
+    location = doc.get('location') or {}
+    yield doc.get('name')
+    yield location.get('city')
+    yield location.get('state')
+    for course in doc.get('courses_offered') or []:
+        if isinstance(course, dict):
+            yield course.get('name')
+
+
+def search_terms(doc):
+    """Every prefix of every token in the name, city, state and course names, sorted."""
+    terms = set()
+    for text in searchable_text(doc):
+        for token in tokenize(text):
+            terms.update(edge_ngrams(token))
+    return sorted(terms)
+
+
+def add_search_terms(doc):
+    doc[SEARCH_FIELD] = search_terms(doc)
+    return doc
+
+
+def ensure_search_indexes(collection):
+    # Multikey term lookup followed by the score sort both API routes apply
+    collection.create_index([(SEARCH_FIELD, ASCENDING), ('score', DESCENDING)], name='search_terms_score')
+    collection.create_index([('courses_offered.name', ASCENDING), ('score', DESCENDING)], name='course_score')
+
+
+def backfill(collection, batch_size=1000):
+    """Compute search terms for documents loaded before the loader stored them (or after the rules change)."""
+    ensure_search_indexes(collection)
+    projection = {'name': 1, 'location': 1, 'courses_offered.name': 1, SEARCH_FIELD: 1}
+    ops, scanned, changed = [], 0, 0
+    started = time.perf_counter()
+    for doc in collection.find({}, projection).batch_size(batch_size):
+        scanned += 1
+        terms = search_terms(doc)
+        if doc.get(SEARCH_FIELD) != terms:
+            ops.append(UpdateOne({'_id': doc['_id']}, {'$set': {SEARCH_FIELD: terms}}))
+        if len(ops) >= batch_size:
+            changed += collection.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        changed += collection.bulk_write(ops, ordered=False).modified_count
+    print(f"Search terms: {scanned} documents scanned, {changed} updated in {time.perf_counter() - started:.2f}s")
+    return changed
+
+
+if __name__ == '__main__':
+    from dinserter import get_client, get_collection
+
+    parser = argparse.ArgumentParser(description='Build search terms and indexes for existing institutions')
+    parser.add_argument('--db', default='shiksha_data')
+    parser.add_argument('--collection', default='institutions')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+    try:
+        backfill(get_collection(args.db, args.collection), args.batch_size)
+    finally:
+        get_client().close()
@@ -0,0 +1,301 @@
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from models import SCHEMA_TYPES, Institution, ValidationError, field_kind
+from records import atomic_writer, batched, read_records
+from scoring import DEFAULT_WEIGHTS, weighted_score
+
+DEFAULT_BATCH_SIZE = 5000
+MANIFEST = 'manifest.json'
+FORMATS = ('arrow', 'parquet')
+
+# `type` is one of a fixed set; one shared dictionary keeps every batch's column identical
+TYPE_DICTIONARY = pa.array(SCHEMA_TYPES, pa.string())
+_TYPE_INDEX = {value: n for n, value in enumerate(SCHEMA_TYPES)}
+
+_SCALAR_TYPES = {
+    'id': pa.string(),
+    'text': pa.string(),
+    'type': pa.dictionary(pa.int8(), pa.string()),
+    'number': pa.float64(),
+    'count': pa.int64(),
+    'text_list': pa.list_(pa.string()),
+}
+
+
+def _id(value):
+    # ObjectIds become their hex string; records from files may have no _id
+    return None if value is None else str(value)
+
+
+def _columns(cls, prefix='', parent=None):
+    """(column name, arrow type, kind, getter) for every scalar field of ``cls``, with nested
+    structs flattened into ``<field>_<subfield>`` columns. Struct lists are left to child tables."""
+    columns = []
+    for name, coerce, _ in cls.FIELDS:
+        kind = field_kind(coerce)
+        column = f'{prefix}{name}'
+        if parent is None:
+            def getter(obj, name=name):
+                return getattr(obj, name)
+        else:
+            def getter(obj, name=name, parent=parent):
+                outer = parent(obj)
+                return None if outer is None else getattr(outer, name)
+        if kind == 'struct':
+            columns.extend(_columns(coerce.struct, f'{column}_', getter))
+        elif kind != 'struct_list':
+            columns.append((column, _SCALAR_TYPES[kind], kind, getter))
+    return columns
+
+
+INSTITUTION_COLUMNS = _columns(Institution)
+
+# Child table name -> (Institution attribute, columns of one list item)
+CHILD_TABLES = {
+    name: (name, _columns(coerce.struct_list))
+    for name, coerce, _ in Institution.FIELDS if field_kind(coerce) == 'struct_list'
+}
+
+# Every child row points back at its institution by position in the institutions table
+# (for zero-copy `take`) and by _id
+_PARENT_FIELDS = [('institution_row', pa.int64()), ('institution_id', pa.string()), ('position', pa.int32())]
+
+
+def _schema(columns, parent=False):
+    fields = [pa.field(name, arrow_type) for name, arrow_type, _, _ in columns]
+    if parent:
+        fields = [pa.field(name, arrow_type) for name, arrow_type in _PARENT_FIELDS] + fields
+    return pa.schema(fields)
+
+
+SCHEMAS = {'institutions': _schema(INSTITUTION_COLUMNS)}
+SCHEMAS.update((table, _schema(columns, parent=True)) for table, (_, columns) in CHILD_TABLES.items())
+
+
+def _array(values, arrow_type, kind):
+    if kind == 'id':
+        return pa.array([_id(value) for value in values], arrow_type)
+    if kind == 'type':
+        indices = pa.array([_TYPE_INDEX.get(value) for value in values], pa.int8())
+        return pa.DictionaryArray.from_arrays(indices, TYPE_DICTIONARY)
+    return pa.array(values, arrow_type)
+
+
+def _batch(table, columns, objects, parents=None):
+    arrays = []
+    if parents is not None:
+        arrays = [pa.array(values, arrow_type) for values, (_, arrow_type) in zip(parents, _PARENT_FIELDS)]
+    for _, arrow_type, kind, getter in columns:
+        arrays.append(_array([getter(obj) for obj in objects], arrow_type, kind))
+    return pa.record_batch(arrays, schema=SCHEMAS[table])
+
+
+def record_batches(institutions, first_row=0):
+    """{table: RecordBatch} for a list of validated Institution objects."""
+    batches = {'institutions': _batch('institutions', INSTITUTION_COLUMNS, institutions)}
+    for table, (attribute, columns) in CHILD_TABLES.items():
+        rows, ids, positions, items = [], [], [], []
+        for row, institution in enumerate(institutions, first_row):
+            for position, item in enumerate(getattr(institution, attribute) or ()):
+                rows.append(row)
+                ids.append(_id(institution._id))
+                positions.append(position)
+                items.append(item)
+        batches[table] = _batch(table, columns, items, (rows, ids, positions))
+    return batches
+
+
+class SnapshotWriter:
+    """Stream record batches into ``<table>.arrow`` (uncompressed Arrow IPC, memory-mappable)
+    and/or ``<table>.parquet`` (zstd) files under ``directory``.
+
+    Files are written under temporary names and renamed by ``close``; the manifest is written
+    last, so a directory with a manifest always holds a complete snapshot.
+    """
+
+    def __init__(self, directory, formats=FORMATS, compression='zstd'):
+        self.directory = directory
+        self.formats = formats
+        os.makedirs(directory, exist_ok=True)
+        self._writers = []
+        self._paths = []
+        self.rows = dict.fromkeys(SCHEMAS, 0)
+        self._arrow, self._parquet = {}, {}
+        for table, schema in SCHEMAS.items():
+            if 'arrow' in formats:
+                path = self._tmp(f'{table}.arrow')
+                sink = pa.OSFile(path, 'wb')
+                self._arrow[table] = pa.ipc.new_file(sink, schema)
+                self._writers.append((self._arrow[table], sink))
+            if 'parquet' in formats:
+                path = self._tmp(f'{table}.parquet')
+                self._parquet[table] = pq.ParquetWriter(path, schema, compression=compression)
+                self._writers.append((self._parquet[table], None))
+
+    def _tmp(self, name):
+        path = os.path.join(self.directory, name)
+        self._paths.append(path)
+        return f'{path}.tmp'
+
+    def write(self, batches):
+        for table, batch in batches.items():
+            if table in self._arrow:
+                self._arrow[table].write_batch(batch)
+            if table in self._parquet:
+                self._parquet[table].write_batch(batch)
+            self.rows[table] += batch.num_rows
+
+    def _close_files(self):
+        for writer, sink in self._writers:
+            writer.close()
+            if sink is not None:
+                sink.close()
+
+    def abort(self):
+        self._close_files()
+        for path in self._paths:
+            try:
+                os.remove(f'{path}.tmp')
+            except FileNotFoundError:
+                pass
+
+    def close(self, manifest):
+        self._close_files()
+        # A manifest from an earlier export would vouch for files that are about to change
+        try:
+            os.remove(os.path.join(self.directory, MANIFEST))
+        except FileNotFoundError:
+            pass
+        for path in self._paths:
+            os.replace(f'{path}.tmp', path)
+        manifest = dict(manifest, formats=list(self.formats), rows=self.rows)
+        with atomic_writer(os.path.join(self.directory, MANIFEST)) as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+
+def export(docs, directory, source, batch_size=DEFAULT_BATCH_SIZE, formats=FORMATS):
+    """Validate ``docs`` (any iterable, consumed in batches) and write them as a snapshot."""
+    started = time.perf_counter()
+    writer = SnapshotWriter(directory, formats)
+    rejected = 0
+    try:
+        for batch in batched(docs, batch_size):
+            institutions = []
+            for doc in batch:
+                try:
+                    institutions.append(Institution.from_dict(doc))
+                except ValidationError:
+                    rejected += 1
+            writer.write(record_batches(institutions, writer.rows['institutions']))
+    except BaseException:
+        writer.abort()
+        raise
+    manifest = writer.close({
+        'source': source,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'rejected': rejected,
+    })
+    elapsed = time.perf_counter() - started
+    count = manifest['rows']['institutions']
+    print(f"Exported {count} institutions to {directory} in {elapsed:.2f}s "
+          f"({count / elapsed:.0f} records/s, {rejected} rejected)")
+    return manifest
+
+
+class Snapshot:
+    """Read side of a snapshot directory. Arrow files are memory-mapped, so tables load without
+    copying or parsing and pages are read from disk only when a column is touched; Parquet is
+    used when a table was exported only in that format."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self._tables = {}
+
+    def table(self, name='institutions'):
+        if name not in self._tables:
+            path = os.path.join(self.directory, f'{name}.arrow')
+            if os.path.exists(path):
+                self._tables[name] = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+            else:
+                self._tables[name] = pq.read_table(os.path.join(self.directory, f'{name}.parquet'), memory_map=True)
+        return self._tables[name]
+
+    @property
+    def institutions(self):
+        return self.table('institutions')
+
+    def children(self, table, rows):
+        """Child rows (e.g. courses_offered) of the institutions at positions ``rows``."""
+        child = self.table(table)
+        return child.filter(pc.is_in(child['institution_row'], pa.array(rows, pa.int64())))
+
+    def scores(self, weights=DEFAULT_WEIGHTS):
+        """scoring.score_batch over the whole catalogue as one vectorized pass."""
+        table = self.institutions
+
+        def column(name):
+            return table[name].to_numpy(zero_copy_only=False).astype(np.float64)
+
+        return weighted_score(*(np.nan_to_num(column(name)) for name in
+                                ('placements_average_salary', 'placements_placement_rate', 'rating', 'demand')),
+                              weights)
+
+    def top_k(self, k=10, scores=None, mask=None):
+        """Row positions of the ``k`` highest ``scores`` (default: the stored score), optionally
+        among the rows where ``mask`` is true."""
+        values = np.nan_to_num(self.institutions['score'].to_numpy(zero_copy_only=False).astype(np.float64),
+                               nan=-np.inf) if scores is None else np.asarray(scores, dtype=np.float64)
+        if mask is not None:
+            values = np.where(mask, values, -np.inf)
+        k = min(k, len(values))
+        top = np.argpartition(-values, k - 1)[:k] if k else np.array([], dtype=np.int64)
+        top = top[np.argsort(-values[top], kind='stable')]
+        return top[np.isfinite(values[top])]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Columnar (Arrow/Parquet) snapshots of the institutions collection')
+    sub = parser.add_subparsers(dest='command', required=True)
+    export_parser = sub.add_parser('export', help='write a snapshot directory')
+    export_parser.add_argument('directory')
+    export_parser.add_argument('--source', help='.json/.ndjson records instead of MongoDB')
+    export_parser.add_argument('--db', default='shiksha_data')
+    export_parser.add_argument('--collection', default='institutions')
+    export_parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    export_parser.add_argument('--format', choices=('arrow', 'parquet', 'both'), default='both')
+    info_parser = sub.add_parser('info', help='load a snapshot and print its tables')
+    info_parser.add_argument('directory')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        formats = FORMATS if args.format == 'both' else (args.format,)
+        if args.source:
+            export(read_records(args.source), args.directory, args.source, args.batch_size, formats)
+        else:
+            from dinserter import get_client, get_collection
+
+            collection = get_collection(args.db, args.collection)
+            try:
+                cursor = collection.find({}, {'search_terms': 0}).batch_size(args.batch_size)
+                export(cursor, args.directory, f'{args.db}.{args.collection}', args.batch_size, formats)
+            finally:
+                get_client().close()
+    else:
+        started = time.perf_counter()
+        snapshot = Snapshot(args.directory)
+        tables = {name: snapshot.table(name) for name in snapshot.manifest['rows']}
+        print(f"Loaded in {(time.perf_counter() - started) * 1000:.1f}ms: {json.dumps(snapshot.manifest, indent=2)}")
+        for name, table in tables.items():
+            print(f"{name}: {table.num_rows} rows, {table.num_columns} columns, {table.nbytes / 1024 / 1024:.1f} MiB")
@@ -0,0 +1,62 @@
+import os
+import unittest
+
+from bench import FIXTURES_DIR, FixtureServer
+from fetcher import REQUIRED_FIELDS, Fetcher
+
+
+def _fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+class FetcherTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FixtureServer().__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        self.fetcher = Fetcher()
+        self.addCleanup(self.fetcher.close)
+        # Stands in for Chrome: records the URL and serves the complete page
+        self.browser_urls = []
+
+        def fetch_browser(url):
+            self.browser_urls.append(url)
+            return _fixture('institution_full.html')
+
+        self.fetcher.fetch_browser = fetch_browser
+
+    def test_complete_pages_take_the_http_path(self):
+        for page in ('institution_full.html', 'institution_jsonld.html'):
+            data, source = self.fetcher.fetch(self.server.url + page)
+            self.assertEqual(source, 'http')
+            self.assertTrue(data['official_website'])
+        self.assertEqual(self.browser_urls, [])
+        self.assertEqual(self.fetcher.stats['http_pages'], 2)
+
+    def test_missing_required_fields_fall_back_to_the_browser(self):
+        url = self.server.url + 'institution_partial.html'
+        data, source = self.fetcher.fetch(url)
+        self.assertEqual(source, 'browser')
+        self.assertEqual(self.browser_urls, [url])
+        self.assertEqual(self.fetcher.stats['browser_pages'], 1)
+        self.assertTrue(data['official_website'])
+
+    def test_http_errors_fall_back_to_the_browser(self):
+        data, source = self.fetcher.fetch(self.server.url + 'missing.html')
+        self.assertEqual(source, 'browser')
+        self.assertEqual(self.fetcher.stats['http_errors'], 1)
+        # No page was parsed on the fast path, so nothing was counted
+        self.assertEqual(sum(self.fetcher.field_hits.values()) + sum(self.fetcher.field_misses.values()), 0)
+
+    def test_counts_hits_and_misses_per_field(self):
+        for page in ('institution_full.html', 'institution_partial.html'):
+            self.fetcher.fetch(self.server.url + page)
+        missing = {'official_website', 'placements.average_salary'}
+        for field in REQUIRED_FIELDS:
+            self.assertEqual(self.fetcher.field_hits[field], 1 if field in missing else 2, field)
+            self.assertEqual(self.fetcher.field_misses[field], 1 if field in missing else 0, field)
+        self.assertIn('official_website: fast path 1/2 (50%)', self.fetcher.report())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import glob
+import os
+import tempfile
+import unittest
+
+from PIL import Image
+
+import image_updater
+from bench import FixtureServer
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+
+class ImageUpdaterTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        served = os.path.join(tmp.name, 'served')
+        os.makedirs(served)
+        for n, colour in enumerate(('red', 'blue')):
+            Image.new('RGB', (1200, 800), colour).save(os.path.join(served, f'{n}.jpg'))
+        with open(os.path.join(served, 'page.html'), 'w') as f:
+            f.write('<html></html>')
+        self.server = FixtureServer(served).__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        self.store = image_updater.ImageStore(os.path.join(tmp.name, 'store'))
+        self.addCleanup(self.store.close)
+        self.urls = [self.server.url + name for name in ('0.jpg', '1.jpg', '0.jpg', 'missing.jpg', 'page.html')]
+
+    def test_stores_originals_and_variants(self):
+        results, failed, stats = image_updater.process(self.urls, self.store, workers=1)
+        self.assertEqual((stats['valid'], stats['broken'], stats['requested']), (2, 2, 4))
+        self.assertEqual(failed, {})
+        for result in results.values():
+            if result['hash']:
+                self.assertTrue(os.path.exists(self.store.original_path(result['hash'])))
+                with Image.open(self.store.variant_path(result['hash'], 'thumb')) as thumb:
+                    self.assertLessEqual(thumb.size, image_updater.VARIANTS['thumb'])
+        self.assertEqual(glob.glob(os.path.join(self.store.root, '**', '*.tmp'), recursive=True), [])
+
+        _, _, cached = image_updater.process(self.urls, self.store, workers=1)
+        self.assertEqual((cached['requested'], cached['cached']), (0, 4))
+
+    @unittest.skipIf(mongomock is None, 'needs mongomock')
+    def test_update_collection_rewrites_shared_images(self):
+        collection = mongomock.MongoClient().db.institutions
+        collection.insert_many([{'name': str(n), 'image_url': url} for n, url in enumerate(self.urls)])
+        results, failed, _ = image_updater.process(self.urls, self.store, workers=1)
+        updates = image_updater.image_fields(results, failed, 'https://cdn.example.com/images', clear_broken=True)
+
+        self.assertEqual(image_updater.update_collection(collection, updates), 5)
+        self.assertTrue({'image_source_url', 'image_url'} <= set(collection.index_information()))
+        shared = list(collection.find({'image_source_url': self.urls[0]}))
+        self.assertEqual(len(shared), 2)
+        self.assertTrue(all(doc['image_url'].startswith('https://cdn.example.com/images/variants/') for doc in shared))
+        self.assertIsNone(collection.find_one({'image_source_url': self.server.url + 'missing.jpg'})['image_url'])
+        # A second pass finds the records by image_source_url and changes nothing
+        self.assertEqual(image_updater.update_collection(collection, updates), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
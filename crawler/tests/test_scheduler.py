@@ -0,0 +1,47 @@
+import asyncio
+import threading
+import unittest
+
+from bench import FixtureServer
+from fetcher import parse_with_embedded
+from scheduler import Scheduler
+
+PAGES = ['institution_full.html', 'institution_jsonld.html', 'institution_partial.html']
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FixtureServer().__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        self.urls = [self.server.url + page for page in PAGES]
+
+    def test_crawls_fixture_pages(self):
+        scheduler = Scheduler(rate=1000, burst=10)
+        results = asyncio.run(scheduler.run(self.urls + [self.server.url + 'missing.html']))
+        self.assertEqual(sorted(r['url'] for r in results), sorted(self.urls))
+        self.assertEqual(scheduler.stats['ok'], len(self.urls))
+        self.assertEqual(scheduler.stats['status_404'], 1)
+        self.assertEqual(scheduler.stats['retries'], 0)
+
+    def test_stats_are_per_run(self):
+        scheduler = Scheduler(rate=1000, burst=10)
+        asyncio.run(scheduler.run(self.urls))
+        first = scheduler.stats['pages_per_minute']
+        asyncio.run(scheduler.run(self.urls))
+        self.assertEqual(scheduler.stats['ok'], len(self.urls))
+        self.assertGreater(first, 0)
+
+    def test_parses_off_the_event_loop(self):
+        threads = []
+
+        def parse(text):
+            threads.append(threading.current_thread())
+            return parse_with_embedded(text)
+
+        asyncio.run(Scheduler(rate=1000, burst=10).run(self.urls, parse=parse))
+        self.assertEqual(len(threads), len(self.urls))
+        self.assertNotIn(threading.main_thread(), threads)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import multiprocessing
+import os
+import time
+import unittest
+import uuid
+
+from pymongo import MongoClient
+
+import dinserter
+from work_queue import DONE, WorkQueue, work
+
+# The queue relies on $$NOW in update pipelines, which needs a real mongod
+MONGO_URI = os.getenv('TEST_MONGO_URI')
+
+
+def _use(uri):
+    dinserter._client = MongoClient(uri)
+
+
+def _worker(uri, db_name):
+    _use(uri)
+    queue = WorkQueue(db_name)
+    work(queue, lambda url: {'url': url, 'pid': os.getpid()}, batch_size=3)
+
+
+@unittest.skipUnless(MONGO_URI, 'set TEST_MONGO_URI to a local mongod')
+class WorkQueueTest(unittest.TestCase):
+    def setUp(self):
+        _use(MONGO_URI)
+        self.db_name = f'test_work_queue_{uuid.uuid4().hex[:8]}'
+
+    def tearDown(self):
+        dinserter._client.drop_database(self.db_name)
+        dinserter._client.close()
+        dinserter._client = None
+
+    def test_local_processes_crawl_every_url_once(self):
+        urls = [f'http://example.test/{i}' for i in range(60)]
+        queue = WorkQueue(self.db_name)
+        queue.ensure_indexes()
+        self.assertEqual(queue.seed(urls), len(urls))
+
+        context = multiprocessing.get_context('spawn')
+        workers = [context.Process(target=_worker, args=(MONGO_URI, self.db_name)) for _ in range(4)]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join(60)
+            self.assertEqual(process.exitcode, 0)
+
+        self.assertEqual(queue.counts(), {DONE: len(urls)})
+        self.assertEqual(queue.queue.count_documents({'attempts': 1}), len(urls))
+        self.assertEqual(sorted(doc['_id'] for doc in queue.results.find()), sorted(urls))
+
+    def test_stuck_url_loses_its_lease(self):
+        stuck = WorkQueue(self.db_name, lease_seconds=1)
+        stuck.seed(['http://example.test/slow'])
+        self.assertEqual(stuck.claim(), ['http://example.test/slow'])
+        stuck.start_heartbeat(interval=0.2)
+        try:
+            time.sleep(2.5)
+            other = WorkQueue(self.db_name, lease_seconds=1)
+            self.assertEqual(other.claim(), ['http://example.test/slow'])
+        finally:
+            stuck.stop_heartbeat()
+        self.assertFalse(stuck.complete('http://example.test/slow', {}))
+
+    def test_progress_keeps_the_lease_until_the_maximum(self):
+        queue = WorkQueue(self.db_name, lease_seconds=1, max_lease_seconds=3)
+        queue.seed(['http://example.test/long'])
+        queue.claim()
+        other = WorkQueue(self.db_name, lease_seconds=1)
+        for _ in range(4):
+            time.sleep(0.5)
+            self.assertTrue(queue.progress('http://example.test/long'))
+            self.assertEqual(other.claim(), [])
+        time.sleep(2)
+        self.assertTrue(queue.progress('http://example.test/long'))
+        time.sleep(0.5)
+        self.assertEqual(other.claim(), ['http://example.test/long'])
+
+
+if __name__ == '__main__':
+    unittest.main()
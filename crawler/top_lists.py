@@ -0,0 +1,245 @@
+import argparse
+import heapq
+import time
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, DeleteOne, ReplaceOne
+
+from search_index import tokenize
+
+TOP_LISTS = 'top_lists'
+DEFAULT_K = 10
+
+# List dimension -> institution field; index.js reads `<dimension>:<normalized value>`
+DIMENSIONS = {
+    'course': 'courses_offered.name',
+    'city': 'location.city',
+    'state': 'location.state',
+    'field': 'field_taught',
+}
+
+# Fields copied into each list entry; enough for a college card, a few hundred bytes each
+SUMMARY_PROJECTION = {
+    'name': 1, 'type': 1, 'location': 1, 'established_year': 1, 'accreditation': 1,
+    'image_url': 1, 'image_thumb_url': 1, 'rating': 1, 'score': 1, 'placements': 1, 'field_taught': 1,
+}
+
+# Hand-picked lists, materialized like the others so /api/get-showcase is a point read
+CURATED_LISTS = {
+    'showcase': [
+        ObjectId('6845e51eb08f37b2f3cb7ff8'),  # RV College of Engineering
+        ObjectId('6845e51eb08f37b2f3cb7ffa'),  # BMS College of Engineering
+        ObjectId('6845e51db08f37b2f3cb7ff6'),  # MS Ramaiah Institute of Technology
+        ObjectId('6845e51fb08f37b2f3cb8006'),  # Dayananda Sagar College of Engineering
+        ObjectId('6845e520b08f37b2f3cb800e'),  # Bangalore Institute of Technology
+        ObjectId('6845e520b08f37b2f3cb8010'),  # BMS Institute of Technology and Management
+        ObjectId('6845e51fb08f37b2f3cb8002'),  # Nitte Meenakshi Institute of Technology
+    ],
+}
+
+# The overall top list behind /api/get-top-list with no filter
+ALL_KEY = 'all'
+
+
+def _values(doc, path):
+    # Every value at a dotted path, descending through lists (courses_offered.name, field_taught)
+    values = [doc]
+    for part in path.split('.'):
+        found = []
+        for value in values:
+            if isinstance(value, list):
+                found.extend(item.get(part) for item in value if isinstance(item, dict))
+            elif isinstance(value, dict):
+                found.append(value.get(part))
+        values = found
+    flat = []
+    for value in values:
+        flat.extend(value if isinstance(value, list) else [value])
+    return [value for value in flat if isinstance(value, str) and value.strip()]
+
+
+def list_key(dimension, value):
+    tokens = tokenize(value)
+    return f"{dimension}:{' '.join(tokens)}" if tokens else None
+
+
+def list_keys(doc):
+    """{key: raw value} for every list ``doc`` belongs to."""
+    keys = {ALL_KEY: None}
+    for dimension, path in DIMENSIONS.items():
+        for value in _values(doc, path):
+            key = list_key(dimension, value)
+            if key:
+                keys.setdefault(key, value)
+    return keys
+
+
+def _score(doc):
+    value = doc.get('score')
+    return value if isinstance(value, (int, float)) else float('-inf')
+
+
+def _summary(doc):
+    return {field: doc[field] for field in ('_id', *SUMMARY_PROJECTION) if field in doc}
+
+
+class TopLists:
+    """Top-``k`` institution summaries per course, city, state and field, kept in ``top_lists``.
+
+    ``rebuild`` computes every list in one pass over the collection. ``collect`` records the
+    lists a changed document touches (its current keys, plus any list it already appears
+    in), and ``flush`` re-queries only those with an indexed ``find().sort().limit()``;
+    past ``rebuild_threshold`` keys a full rebuild is cheaper and is used instead.
+    """
+
+    def __init__(self, institutions, k=DEFAULT_K, rebuild_threshold=2000):
+        self.institutions = institutions
+        self.lists = institutions.database[TOP_LISTS]
+        self.k = k
+        self.rebuild_threshold = rebuild_threshold
+        self._pending = {}
+        self._pending_names = set()
+        self._overflow = False
+
+    def ensure_indexes(self):
+        for dimension, path in DIMENSIONS.items():
+            self.institutions.create_index([(path, ASCENDING), ('score', DESCENDING)], name=f'{dimension}_score')
+        self.institutions.create_index([('score', DESCENDING)], name='score')
+        self.lists.create_index([('items.name', ASCENDING)], name='items_name')
+
+    def _write(self, lists, started):
+        ops = []
+        for key, (dimension, values, items) in lists.items():
+            ops.append(ReplaceOne({'_id': key}, {'dimension': dimension, 'values': sorted(values), 'items': items,
+                                                 'updated_at': started}, upsert=True))
+            if len(ops) >= 1000:
+                self.lists.bulk_write(ops, ordered=False)
+                ops = []
+        if ops:
+            self.lists.bulk_write(ops, ordered=False)
+
+    def _curated(self, name):
+        cursor = self.institutions.find({'_id': {'$in': CURATED_LISTS[name]}}, SUMMARY_PROJECTION)
+        return sorted((_summary(doc) for doc in cursor), key=_score, reverse=True)
+
+    def rebuild(self, batch_size=5000):
+        started = datetime.now(timezone.utc)
+        timer = time.perf_counter()
+        self.ensure_indexes()
+        heaps, values = {}, {}
+        # location.* is already covered by the summary; projecting both is a path collision
+        projection = dict(SUMMARY_PROJECTION, **{path: 1 for path in DIMENSIONS.values()
+                                                 if path.split('.')[0] not in SUMMARY_PROJECTION})
+        scanned = 0
+        for seq, doc in enumerate(self.institutions.find({}, projection).batch_size(batch_size)):
+            scanned += 1
+            entry = (_score(doc), -seq, _summary(doc))
+            for key, value in list_keys(doc).items():
+                heap = heaps.setdefault(key, [])
+                if value is not None:
+                    values.setdefault(key, set()).add(value)
+                if len(heap) < self.k:
+                    heapq.heappush(heap, entry)
+                elif entry[:2] > heap[0][:2]:
+                    heapq.heapreplace(heap, entry)
+
+        lists = {}
+        for key, heap in heaps.items():
+            items = [summary for _, _, summary in sorted(heap, key=lambda e: e[:2], reverse=True)]
+            lists[key] = (key.split(':', 1)[0], values.get(key, set()), items)
+        for name in CURATED_LISTS:
+            lists[name] = ('curated', set(), self._curated(name))
+        self._write(lists, started)
+        # Lists whose key no longer matches any institution were not rewritten above
+        removed = self.lists.delete_many({'updated_at': {'$lt': started}}).deleted_count
+        self._pending, self._pending_names, self._overflow = {}, set(), False
+        print(f"Top lists: rebuilt {len(lists)} lists ({removed} removed) from {scanned} institutions "
+              f"in {time.perf_counter() - timer:.2f}s")
+        return len(lists)
+
+    def collect(self, docs):
+        """Remember the lists affected by ``docs`` (loader records or changed documents)."""
+        if self._overflow:
+            return
+        for doc in docs:
+            for key, value in list_keys(doc).items():
+                values = self._pending.setdefault(key, set())
+                if value is not None:
+                    values.add(value)
+            if doc.get('name'):
+                self._pending_names.add(doc['name'])
+        if len(self._pending) > self.rebuild_threshold:
+            # Already past the point where flush() rebuilds; stop tracking keys
+            self.require_rebuild()
+
+    def require_rebuild(self):
+        """Make the next ``flush`` a full rebuild, for changes that were not collected."""
+        self._overflow = True
+        self._pending, self._pending_names = {}, set()
+
+    def collect_ids(self, ids, batch_size=1000):
+        if self._overflow:
+            return
+        projection = {'name': 1, **{path: 1 for path in DIMENSIONS.values()}}
+        for start in range(0, len(ids), batch_size):
+            self.collect(self.institutions.find({'_id': {'$in': ids[start:start + batch_size]}}, projection))
+
+    def _query(self, key, values):
+        if key == ALL_KEY:
+            query = {}
+        else:
+            query = {DIMENSIONS[key.split(':', 1)[0]]: {'$in': sorted(values)}}
+        cursor = self.institutions.find(query, SUMMARY_PROJECTION).sort([('score', DESCENDING), ('_id', ASCENDING)])
+        return [_summary(doc) for doc in cursor.limit(self.k)]
+
+    def flush(self):
+        """Recompute the collected lists; returns how many were rewritten or removed."""
+        if self._overflow:
+            return self.rebuild()
+        if not self._pending and not self._pending_names:
+            return 0
+        started = datetime.now(timezone.utc)
+        timer = time.perf_counter()
+        pending = self._pending
+        # A document can leave a list (new city, lower score); refresh every list it is already in
+        if self._pending_names:
+            for existing in self.lists.find({'items.name': {'$in': sorted(self._pending_names)}}, {'values': 1}):
+                pending.setdefault(existing['_id'], set())
+        for existing in self.lists.find({'_id': {'$in': list(pending)}}, {'values': 1}):
+            pending[existing['_id']].update(existing.get('values') or [])
+        self._pending, self._pending_names = {}, set()
+
+        if len(pending) > self.rebuild_threshold:
+            return self.rebuild()
+
+        lists, removed = {}, []
+        for key, values in pending.items():
+            if key in CURATED_LISTS:
+                lists[key] = ('curated', set(), self._curated(key))
+                continue
+            items = self._query(key, values)
+            if items:
+                lists[key] = (key.split(':', 1)[0], values, items)
+            else:
+                removed.append(DeleteOne({'_id': key}))
+        self._write(lists, started)
+        if removed:
+            self.lists.bulk_write(removed, ordered=False)
+        print(f"Top lists: refreshed {len(lists)} lists, removed {len(removed)} "
+              f"in {time.perf_counter() - timer:.2f}s")
+        return len(lists) + len(removed)
+
+
+if __name__ == '__main__':
+    from dinserter import get_client, get_collection
+
+    parser = argparse.ArgumentParser(description='Rebuild the materialized top-K lists in shiksha_data.top_lists')
+    parser.add_argument('--db', default='shiksha_data')
+    parser.add_argument('--collection', default='institutions')
+    parser.add_argument('-k', type=int, default=DEFAULT_K, help='entries per list')
+    args = parser.parse_args()
+    try:
+        TopLists(get_collection(args.db, args.collection), k=args.k).rebuild()
+    finally:
+        get_client().close()
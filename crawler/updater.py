@@ -1,17 +1,25 @@
-import json
+import argparse
 
-# Step 1: Load the JSON file
-with open("institution_data.json", "r") as f:
-    universities = json.load(f)  # This should be a list of university dictionaries
+from records import read_records, write_records
 
-# Step 2: Convert eligibility_criteria in each item
-for uni in universities:
-    criteria = uni.get("eligibility_criteria")
-    if isinstance(criteria, dict):  # Only convert if it's a dictionary
-        uni["eligibility_criteria"] = [
-            {"name": key, "required": value} for key, value in criteria.items()
-        ]
 
-# Step 3: Save the updated data back to the file (or another file)
-with open("universities_updated.json", "w") as f:
-    json.dump(universities, f, indent=2)
\ No newline at end of file
+# Convert eligibility_criteria from {course: requirement} into [{name, required}]
+def convert_eligibility(universities):
+    for uni in universities:
+        criteria = uni.get("eligibility_criteria")
+        if isinstance(criteria, dict):  # Only convert if it's a dictionary
+            uni["eligibility_criteria"] = [
+                {"name": key, "required": value} for key, value in criteria.items()
+            ]
+        yield uni
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert eligibility_criteria dicts into lists")
+    parser.add_argument("source", nargs="?", default="institution_data.json", help=".json array or .ndjson")
+    parser.add_argument("output", nargs="?", default="universities_updated.json", help=".json array or .ndjson")
+    args = parser.parse_args()
+
+    # Records are streamed one at a time and the output replaced only once complete
+    count = write_records(convert_eligibility(read_records(args.source)), args.output)
+    print(f"Converted {count} records into {args.output}")
@@ -0,0 +1,227 @@
+import argparse
+import os
+import socket
+import threading
+import time
+import uuid
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from dinserter import get_client
+
+PENDING, IN_FLIGHT, DONE, FAILED = 'pending', 'in_flight', 'done', 'failed'
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_LEASE_SECONDS = 3600
+
+# Lease times are read and written with the server's $$NOW in update pipelines, so the
+# workers' clocks never have to agree
+_NOW = '$$NOW'
+
+
+def _expired():
+    return {'$expr': {'$lt': ['$lease_expires', _NOW]}}
+
+
+# URL work queue shared by crawler processes on any number of machines.
+# Workers claim URLs atomically with find_one_and_update and hold them under a lease.
+# A heartbeat extends the leases of URLs that made progress within the last lease period,
+# up to max_lease_seconds after the claim; a dead or stuck worker's leases expire and are
+# claimed again.
+class WorkQueue:
+    def __init__(self, db_name='shiksha_data', collection_name='crawl_queue', results_name='crawl_results',
+                 worker_id=None, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=3,
+                 max_lease_seconds=DEFAULT_MAX_LEASE_SECONDS):
+        db = get_client()[db_name]
+        self.queue = db[collection_name]
+        self.results = db[results_name]
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}'
+        self.lease_ms = int(lease_seconds * 1000)
+        self.max_lease_ms = int(max_lease_seconds * 1000)
+        self.max_attempts = max_attempts
+        self._heartbeat = None
+        self._stop = threading.Event()
+
+    def ensure_indexes(self):
+        self.queue.create_index([('state', ASCENDING), ('lease_expires', ASCENDING)], name='claimable')
+
+    def seed(self, urls):
+        """Queue ``urls``; URLs already in the queue keep their state. Returns how many were new."""
+        ops = [UpdateOne({'_id': url}, {'$setOnInsert': {'state': PENDING, 'attempts': 0}}, upsert=True)
+               for url in dict.fromkeys(urls)]
+        if not ops:
+            return 0
+        try:
+            return self.queue.bulk_write(ops, ordered=False).upserted_count
+        except BulkWriteError as e:
+            return e.details['nUpserted']
+
+    def claim(self, batch_size=10):
+        """Atomically claim up to ``batch_size`` pending or lease-expired URLs.
+
+        An expired lease whose URL has already used up ``max_attempts`` is marked failed instead,
+        so a page that keeps killing its worker is not retried forever.
+        """
+        self.queue.update_many(
+            {'state': IN_FLIGHT, 'attempts': {'$gte': self.max_attempts}, **_expired()},
+            {'$set': {'state': FAILED, 'error': 'lease expired on the last attempt'},
+             '$unset': {'lease_expires': '', 'lease_owner': ''}},
+        )
+        claimed = []
+        for _ in range(batch_size):
+            doc = self.queue.find_one_and_update(
+                {'$or': [
+                    {'state': PENDING},
+                    {'state': IN_FLIGHT, 'attempts': {'$lt': self.max_attempts}, **_expired()},
+                ]},
+                [{'$set': {'state': IN_FLIGHT, 'lease_owner': {'$literal': self.worker_id},
+                           'lease_expires': {'$add': [_NOW, self.lease_ms]},
+                           'claimed_at': _NOW, 'progress_at': _NOW,
+                           'attempts': {'$add': [{'$ifNull': ['$attempts', 0]}, 1]}}}],
+                return_document=ReturnDocument.AFTER,
+            )
+            if doc is None:
+                break
+            claimed.append(doc['_id'])
+        return claimed
+
+    def _extend(self):
+        # Never past max_lease_seconds after the claim, however long the URL keeps progressing
+        return {'$set': {'lease_expires': {'$min': [{'$add': [_NOW, self.lease_ms]},
+                                                    {'$add': ['$claimed_at', self.max_lease_ms]}]}}}
+
+    def progress(self, url):
+        """Record progress on ``url`` and extend its lease; False if this worker no longer holds it."""
+        result = self.queue.update_one(
+            {'_id': url, 'state': IN_FLIGHT, 'lease_owner': self.worker_id},
+            [{'$set': {'progress_at': _NOW}}, self._extend()],
+        )
+        return bool(result.matched_count)
+
+    def renew(self):
+        """Extend the leases this worker holds on URLs that made progress within the last lease period.
+
+        A URL stuck in a fetch stops being renewed, so its lease runs out and another worker
+        can claim it.
+        """
+        return self.queue.update_many(
+            {'state': IN_FLIGHT, 'lease_owner': self.worker_id,
+             '$expr': {'$gt': ['$progress_at', {'$subtract': [_NOW, self.lease_ms]}]}},
+            [self._extend()],
+        ).modified_count
+
+    def start_heartbeat(self, interval=None):
+        interval = interval or self.lease_ms / 3000
+        self._stop.clear()
+
+        def beat():
+            while not self._stop.wait(interval):
+                try:
+                    self.renew()
+                except Exception as e:
+                    print(f"Heartbeat failed for {self.worker_id}: {e}")
+
+        self._heartbeat = threading.Thread(target=beat, name='lease-heartbeat', daemon=True)
+        self._heartbeat.start()
+
+    def stop_heartbeat(self):
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+
+    def complete(self, url, data):
+        # The lease_owner filter stops a worker whose lease was taken over from overwriting the new owner
+        lease = {'_id': url, 'state': IN_FLIGHT, 'lease_owner': self.worker_id}
+        if self.queue.find_one(lease, {'_id': 1}) is None:
+            return False
+        # Result before DONE: a crash in between leaves the URL in flight to be crawled again,
+        # never done without a result
+        self.results.replace_one({'_id': url}, {**data, '_id': url, 'fetched_by': self.worker_id}, upsert=True)
+        result = self.queue.update_one(
+            lease, [{'$set': {'state': DONE, 'finished_at': _NOW}}, {'$unset': ['lease_expires', 'error']}],
+        )
+        return bool(result.modified_count)
+
+    def fail(self, url, error):
+        doc = self.queue.find_one({'_id': url, 'lease_owner': self.worker_id}, {'attempts': 1})
+        if doc is None:
+            return
+        state = FAILED if doc.get('attempts', 0) >= self.max_attempts else PENDING
+        self.queue.update_one(
+            {'_id': url, 'state': IN_FLIGHT, 'lease_owner': self.worker_id},
+            {'$set': {'state': state, 'error': str(error)}, '$unset': {'lease_expires': '', 'lease_owner': ''}},
+        )
+
+    def counts(self):
+        return {row['_id']: row['count'] for row in self.queue.aggregate([{'$group': {'_id': '$state', 'count': {'$sum': 1}}}])}
+
+
+def work(queue, fetch, batch_size=10, idle_exit=True, poll_seconds=5):
+    """Claim and process batches until the queue is empty; ``fetch(url)`` returns a record or ``None``."""
+    queue.start_heartbeat()
+    processed = 0
+    started = time.perf_counter()
+    try:
+        while True:
+            urls = queue.claim(batch_size)
+            if not urls:
+                if idle_exit:
+                    break
+                time.sleep(poll_seconds)
+                continue
+            for url in urls:
+                # The lease may have run out while earlier URLs of the batch were fetched
+                if not queue.progress(url):
+                    continue
+                try:
+                    data = fetch(url)
+                    if data is None:
+                        raise RuntimeError('fetch failed')
+                except Exception as e:
+                    print(f"Error crawling {url}: {e}")
+                    queue.fail(url, e)
+                    continue
+                queue.complete(url, data)
+                processed += 1
+    finally:
+        queue.stop_heartbeat()
+    elapsed = time.perf_counter() - started
+    print(f"Worker {queue.worker_id} processed {processed} URLs in {elapsed:.1f}s "
+          f"({processed / elapsed * 60 if elapsed else 0:.0f} pages/min)")
+    return processed
+
+
+if __name__ == '__main__':
+    from main import load_urls
+
+    parser = argparse.ArgumentParser(description='Distributed crawl over a MongoDB work queue')
+    parser.add_argument('--db', default='shiksha_data')
+    parser.add_argument('--collection', default='crawl_queue')
+    commands = parser.add_subparsers(dest='command', required=True)
+    seed_cmd = commands.add_parser('seed', help='add URLs to the queue')
+    seed_cmd.add_argument('urls', nargs='*')
+    seed_cmd.add_argument('--url-file')
+    work_cmd = commands.add_parser('work', help='claim and crawl URLs until the queue is empty')
+    work_cmd.add_argument('--batch-size', type=int, default=10)
+    work_cmd.add_argument('--lease-seconds', type=int, default=DEFAULT_LEASE_SECONDS)
+    work_cmd.add_argument('--max-lease-seconds', type=int, default=DEFAULT_MAX_LEASE_SECONDS)
+    work_cmd.add_argument('--worker-id')
+    work_cmd.add_argument('--wait', action='store_true', help='keep polling when the queue is empty')
+    commands.add_parser('status', help='count URLs per state')
+    args = parser.parse_args()
+
+    if args.command == 'seed':
+        queue = WorkQueue(args.db, args.collection)
+        queue.ensure_indexes()
+        urls = list(args.urls) + (load_urls(args.url_file) if args.url_file else [])
+        print(f"Queued {queue.seed(urls)} new URLs")
+    elif args.command == 'work':
+        from fetcher import Fetcher
+
+        queue = WorkQueue(args.db, args.collection, worker_id=args.worker_id, lease_seconds=args.lease_seconds,
+                          max_lease_seconds=args.max_lease_seconds)
+        with Fetcher() as fetcher:
+            work(queue, lambda url: fetcher.fetch(url)[0], batch_size=args.batch_size, idle_exit=not args.wait)
+    else:
+        print(WorkQueue(args.db, args.collection).counts())
+    get_client().close()
@@ -25,6 +25,50 @@ app.use(async (req, res, next) => {
   next();
 });
 
+// Same normalization as crawler/search_index.py: the loader stores every prefix (up to
+// 15 characters) of these tokens from name, city, state and course names in `search_terms`,
+// indexed together with score, so a search is an index lookup instead of a regex scan.
+const MAX_PREFIX = 15;
+const tokenize = (text) =>
+  String(text)
+    .normalize("NFKD")
+    .replace(/[\u0300-\u036f]/g, "")
+    .toLowerCase()
+    .split(/[^a-z0-9]+/)
+    .filter(Boolean);
+const normalizeSearch = (text) =>
+  tokenize(text).map((token) => token.slice(0, MAX_PREFIX));
+// A query with no indexable tokens (punctuation only, non-Latin script) would match
+// nothing with $all: [], so it falls back to the old regex scan.
+const searchFilter = (text) => {
+  const terms = normalizeSearch(text);
+  if (terms.length) return { search_terms: { $all: terms } };
+  const regex = new RegExp(text, "i");
+  return {
+    $or: [
+      { name: regex },
+      { "location.city": regex },
+      { "location.state": regex },
+      { "courses_offered.name": { $regex: regex } },
+    ],
+  };
+};
+
+// Lists precomputed by crawler/top_lists.py, keyed "all", "showcase" or
+// "<course|city|state|field>:<tokens joined by spaces>". Returns null when the list
+// has not been built, so callers can fall back to querying institutions.
+const TOP_LIST_SIZE = 4;
+// Fields of a list item; keep in step with SUMMARY_PROJECTION in crawler/top_lists.py so
+// the fallback queries return the same shape as a list hit.
+const SUMMARY_FIELDS =
+  "name type location established_year accreditation image_url image_thumb_url rating score placements field_taught";
+const readTopList = async (key) => {
+  const list = await mongoose.connection.db
+    .collection("top_lists")
+    .findOne({ _id: key }, { projection: { items: 1 } });
+  return list ? list.items : null;
+};
+
 app.get("/", (req, res) => {
   res.send("Welcome to the Shiksha API!");
 });
@@ -194,16 +238,10 @@ app.get("/api/get-colleges", async (req, res) => {
 
   if (search) {
     console.log("Search query received:", search);
-    const regex = new RegExp(search, "i");
     try {
-      const colleges = await Institution.find({
-        $or: [
-          { name: regex },
-          { "location.city": regex },
-          { "location.state": regex },
-          { "courses_offered.name": { $regex: regex } },
-        ],
-      }).sort({ score: -1 });
+      const colleges = await Institution.find(searchFilter(search)).sort({
+        score: -1,
+      });
 
       console.log(
         "Data fetched from database:",
@@ -278,12 +316,22 @@ app.get("/api/get-top-list", async (req, res) => {
 
   try {
     if (!query) {
+      const key = course ? `course:${tokenize(course).join(" ")}` : "all";
+      const items = await readTopList(key);
+      if (items) {
+        const colleges = items.slice(0, TOP_LIST_SIZE);
+        console.log("Top list", key, "served:", colleges.length, "records.");
+        return res.status(200).send({ success: true, colleges });
+      }
+
       const regex = course ? new RegExp(course, "i") : /.*/;
       const colleges = await Institution.find({
         $or: [{ "courses_offered.name": { $regex: regex } }],
       })
+        .select(SUMMARY_FIELDS)
         .sort({ score: -1 })
-        .limit(4);
+        .limit(TOP_LIST_SIZE)
+        .lean();
       console.log(
         "Data fetched from database:",
         colleges.length,
@@ -292,17 +340,10 @@ app.get("/api/get-top-list", async (req, res) => {
       return res.status(200).send({ success: true, colleges });
     }
 
-    const regex = new RegExp(query, "i");
-    console.log("Regex for search:", regex);
+    const filter = searchFilter(query);
+    console.log("Filter for search:", filter);
 
-    const colleges = await Institution.find({
-      $or: [
-        { name: regex },
-        { "location.city": regex },
-        { "location.state": regex },
-        { "courses_offered.name": { $regex: regex } },
-      ],
-    })
+    const colleges = await Institution.find(filter)
       .sort({ score: -1 })
       .limit(4);
 
@@ -367,6 +408,7 @@ app.post("/api/submit-contact-form", async (req, res) => {
   }
 });
 app.get("/api/get-showcase", async (req, res) => {
+  // Fallback only; the same ids are CURATED_LISTS["showcase"] in crawler/top_lists.py
   const colleges_id = [
     "6845e51eb08f37b2f3cb7ff8", // RV College of Engineering
     "6845e51eb08f37b2f3cb7ffa", // BMS College of Engineering
@@ -378,8 +420,16 @@ app.get("/api/get-showcase", async (req, res) => {
   ].map(id => new mongoose.Types.ObjectId(id)); // convert to ObjectId
 
   try {
+    const items = await readTopList("showcase");
+    if (items && items.length) {
+      console.log("Showcase colleges served from top_lists:", items.length);
+      return res.status(200).send({ success: true, colleges: items });
+    }
+
     const colleges = await Institution.find({ _id: { $in: colleges_id } })
-      .sort({ score: -1 });
+      .select(SUMMARY_FIELDS)
+      .sort({ score: -1 })
+      .lean();
     console.log("Showcase colleges fetched:", colleges.length);
     res.status(200).send({ success: true, colleges });
   } catch (err) {